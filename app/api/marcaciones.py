@@ -1,12 +1,196 @@
 from fastapi import APIRouter, HTTPException, Response, Request
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
+from starlette.concurrency import iterate_in_threadpool, run_in_threadpool
 
-import traceback
+import hmac
+import json
+import logging
+import time
 
-from models.schemas import ReporteRequest
-from services.external_api import process_empleados_data
-from services.excel_service import generate_excel_report
+from models.schemas import IngestaStoreRequest, OpcionesReporte, ReporteCambiosRequest, ReporteRequest, ReporteStoreRequest
+from services.external_api import process_empleados_data, decodificar_json, decodificar_reporte
+from services.excel_service import cantidad_dias, generate_excel_report, resolver_compresion, MODO_STREAMING
+from services.excel_stream import stream_excel_report
+from services.descompresion import CuerpoSolicitud
+from services.ndjson_ingesta import generar_excel_desde_ndjson
+from services.report_cache import cache_reportes, clave_reporte
+from services.resumen_service import TIPO_RESUMEN, generate_summary_report, resolver_tipo_reporte
+from services.perfilado import (
+    generar_excel_perfilado, guardar_perfiles, limitador_perfilado, perfilar
+)
+from services.marcaciones_store import (
+    consultar_empleados, estadisticas_store, ingerir_empleados, validar_rango
+)
+from services.reporte_incremental import (
+    actualizar_reporte_incremental, almacen_incremental, crear_reporte_incremental
+)
+from services.report_jobs import gestor_trabajos, ESTADO_TERMINADO, ESTADO_FALLIDO
+from services.salidas_datos import (
+    FORMATO_CSV, FORMATO_XLSX, MEDIA_TYPES, generar_csv, generate_data_report, resolver_formato
+)
+from utils.metricas import (
+    Cronometro, dias_reporte, empleados_reporte, registrar_etapas, reportes_en_curso,
+    reportes_total, salida_bytes, solicitud_bytes, solicitud_descomprimida_bytes
+)
+from config import settings
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
+
+MEDIA_TYPE_XLSX = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+# Encabezado de respuesta con el perfil de compresión usado en el xlsx
+HEADER_PERFIL_COMPRESION = "X-Perfil-Compresion"
+
+# Encabezado con el token de perfilado que pide perfilar la solicitud, y el de
+# la respuesta con el id de los archivos del perfil (ver services.perfilado)
+HEADER_PERFILAR = "X-Perfilar"
+HEADER_PERFIL_ID = "X-Perfil-Id"
+
+# Encabezados de las respuestas de reportes incrementales
+HEADER_REPORTE_ID = "X-Reporte-Id"
+HEADER_REPORTE_VERSION = "X-Reporte-Version"
+
+# Etapas de la solicitud que se informan en Server-Timing, además de las del
+# renderizado (filas, estilos, guardado y pool, ver services.excel_service)
+ETAPA_LECTURA = "lectura"
+ETAPA_VALIDACION = "validacion"
+ETAPA_PROCESAMIENTO = "procesamiento"
+ETAPA_CLAVE = "clave"
+ETAPA_DATOS = "datos"
+ETAPA_PERFILADO = "perfilado"
+ETAPA_RESUMEN = "resumen"
+ETAPA_STORE = "store"
+ETAPA_TOTAL = "total"
+
+
+def _nombre_archivo(fecha_inicio, fecha_fin, extension="xlsx"):
+    """Nombre de archivo con fechas si están disponibles"""
+    filename = "marcaciones"
+    if fecha_inicio:
+        filename += f"_desde_{fecha_inicio}"
+    if fecha_fin:
+        filename += f"_hasta_{fecha_fin}"
+    filename += f".{extension}"
+    return filename
+
+
+def _esquema_en_linea(modelo) -> dict:
+    """Esquema JSON del modelo con sus $defs resueltos, para documentarlo en OpenAPI."""
+    esquema = modelo.model_json_schema()
+    definiciones = esquema.pop("$defs", {})
+
+    def resolver(nodo):
+        if isinstance(nodo, dict):
+            if "$ref" in nodo:
+                return resolver(definiciones[nodo["$ref"].split("/")[-1]])
+            return {clave: resolver(valor) for clave, valor in nodo.items()}
+        if isinstance(nodo, list):
+            return [resolver(valor) for valor in nodo]
+        return nodo
+
+    return resolver(esquema)
+
+
+def _etag_coincide(if_none_match: str, etag: str) -> bool:
+    """Indica si el encabezado If-None-Match incluye el ETag (comparación débil)."""
+    if not if_none_match:
+        return False
+    etiquetas = [e.strip() for e in if_none_match.split(",")]
+    return "*" in etiquetas or any(e.removeprefix("W/") == etag for e in etiquetas)
+
+
+async def _guardar_en_cache(bloques, clave: str):
+    """Reenvía los bloques del Excel en streaming y, al terminar, lo guarda en el caché."""
+    partes = []
+    tamano = 0
+    guardar = True
+    async for bloque in bloques:
+        if guardar:
+            tamano += len(bloque)
+            if cache_reportes.admite(tamano):
+                partes.append(bloque)
+            else:
+                guardar = False
+                partes.clear()
+        yield bloque
+
+    if guardar:
+        cache_reportes.guardar(clave, b"".join(partes))
+
+
+async def _medir_streaming(bloques, cronometro: Cronometro):
+    """
+    Reenvía los bloques de una respuesta en streaming y, al terminar, registra
+    sus métricas: el tiempo total incluye el envío completo del archivo.
+    """
+    inicio = time.perf_counter()
+    tamano = 0
+    try:
+        async for bloque in bloques:
+            tamano += len(bloque)
+            yield bloque
+        salida_bytes.observar(tamano)
+    finally:
+        cronometro.sumar(ETAPA_TOTAL, time.perf_counter() - inicio)
+        registrar_etapas(cronometro)
+        reportes_en_curso.sumar(-1)
+
+
+def _resultado_respuesta(respuesta: Response) -> str:
+    """Resultado de la solicitud para el contador reportes_total."""
+    if respuesta.status_code == 304:
+        return "no_modificado"
+    if respuesta.headers.get("x-cache") == "HIT":
+        return "cache"
+    if isinstance(respuesta, StreamingResponse):
+        return "streaming"
+    return "generado"
+
+
+def _perfil_compresion(compresion) -> str:
+    """Resuelve el perfil de compresión solicitado (422 si no es válido)."""
+    try:
+        return resolver_compresion(compresion)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+
+def _perfilado_autorizado(req: Request) -> bool:
+    """Indica si la solicitud pide ser perfilada con el token de perfilado correcto."""
+    token = settings.PERFILADO_TOKEN
+    recibido = req.headers.get(HEADER_PERFILAR)
+    return bool(token and recibido) and hmac.compare_digest(recibido, token)
+
+
+def _es_llamada_interna(req: Request) -> bool:
+    """Indica si la solicitud trae el token de los servicios internos de confianza."""
+    token = settings.INTERNAL_API_TOKEN
+    recibido = req.headers.get("x-internal-token")
+    return bool(token and recibido) and hmac.compare_digest(recibido, token)
+
+
+async def _leer_cuerpo(req: Request, medir: bool = False) -> bytes:
+    """
+    Lee el cuerpo completo, descomprimiéndolo si trae Content-Encoding gzip o zstd.
+
+    Args:
+        req: Solicitud
+        medir: Registrar los tamaños recibido y descomprimido en las métricas
+
+    Returns:
+        Cuerpo descomprimido
+    """
+    cuerpo_solicitud = CuerpoSolicitud(req)
+    cuerpo = await cuerpo_solicitud.leer()
+    if cuerpo_solicitud.comprimido:
+        logger.info("Cuerpo %s descomprimido: %d bytes recibidos, %d bytes descomprimidos",
+                    cuerpo_solicitud.codificacion, cuerpo_solicitud.bytes_recibidos, len(cuerpo))
+    if medir:
+        solicitud_bytes.observar(cuerpo_solicitud.bytes_recibidos)
+        solicitud_descomprimida_bytes.observar(len(cuerpo), codificacion=cuerpo_solicitud.codificacion)
+    return cuerpo
 
 
 @router.get("/ping")
@@ -15,84 +199,790 @@ async def ping():
     return {"status": "ok", "message": "Excel service is running"}
 
 
-@router.post("/marcaciones-excel")
-async def generar_reporte_excel(request: ReporteRequest, req: Request):
+@router.post(
+    "/marcaciones-excel",
+    openapi_extra={
+        "requestBody": {
+            "content": {"application/json": {"schema": _esquema_en_linea(ReporteRequest)}},
+            "required": True
+        }
+    }
+)
+async def generar_reporte_excel(req: Request):
     """
     Genera un reporte Excel a partir de los datos de empleados recibidos directamente.
+
+    El cuerpo se decodifica directamente desde los bytes a ReporteRequest. Los
+    servicios internos que envían X-Internal-Token omiten la validación por campo.
+    Con "formato" csv, json o parquet se devuelven los mismos datos calculados
+    sin el Excel (ver services.salidas_datos).
+
+    El cuerpo puede enviarse comprimido con Content-Encoding gzip (o zstd si
+    está instalado el paquete zstandard); se descomprime a medida que llega y
+    se rechaza con 413 si supera SOLICITUD_MAX_BYTES_DESCOMPRIMIDOS.
+
+    Toda respuesta, incluidos los errores HTTP, trae el encabezado Server-Timing
+    con la duración de cada etapa, y las métricas se acumulan para /metrics. En
+    las respuestas en streaming el encabezado cubre solo hasta el primer byte.
+
+    Con el encabezado X-Perfilar y el token PERFILADO_TOKEN la solicitud se
+    perfila con cProfile y tracemalloc (ver services.perfilado), con un límite
+    de un perfilado a la vez y uno por intervalo.
+    """
+    return await _atender_reporte(req, _generar_reporte)
+
+
+async def _atender_reporte(req: Request, flujo) -> Response:
+    """
+    Ejecuta el flujo de un endpoint de reportes con su cronómetro: agrega el
+    encabezado Server-Timing (también a los errores HTTP) y registra las
+    métricas de la solicitud.
+
+    Args:
+        req: Solicitud recibida
+        flujo: Corrutina flujo(req, cronometro) que arma la respuesta
     """
+    cronometro = Cronometro()
+    reportes_en_curso.sumar(1)
+    en_streaming = False
+    inicio = time.perf_counter()
+    try:
+        respuesta = await flujo(req, cronometro)
+    except HTTPException as e:
+        cronometro.sumar(ETAPA_TOTAL, time.perf_counter() - inicio)
+        e.headers = {**(e.headers or {}), "Server-Timing": cronometro.server_timing()}
+        reportes_total.incrementar(resultado="error")
+        raise
+    except RequestValidationError:
+        reportes_total.incrementar(resultado="error")
+        raise
+    else:
+        cronometro.sumar(ETAPA_TOTAL, time.perf_counter() - inicio)
+        respuesta.headers["Server-Timing"] = cronometro.server_timing()
+        reportes_total.incrementar(resultado=_resultado_respuesta(respuesta))
+
+        if isinstance(respuesta, StreamingResponse):
+            # Las métricas se registran cuando termina el envío
+            en_streaming = True
+            respuesta.body_iterator = _medir_streaming(respuesta.body_iterator, cronometro)
+        else:
+            if respuesta.status_code != 304:
+                salida_bytes.observar(len(respuesta.body))
+            registrar_etapas(cronometro)
+        return respuesta
+    finally:
+        if not en_streaming:
+            reportes_en_curso.sumar(-1)
+
+
+async def _generar_reporte(req: Request, cronometro: Cronometro) -> Response:
+    """Atiende /marcaciones-excel sumando al cronómetro cada etapa de la solicitud."""
+    perfilando = _perfilado_autorizado(req)
+    if perfilando and not limitador_perfilado.intentar():
+        logger.warning("Perfilado omitido: hay otro en curso o el intervalo mínimo no pasó")
+        perfilando = False
+    perfiles = []
+
     try:
         # Log para debugging
         content_length = req.headers.get("content-length", "desconocido")
-        print(
-            f"Recibiendo solicitud con Content-Length: {content_length} bytes")
+        logger.info(
+            "Recibiendo solicitud con Content-Length: %s bytes", content_length)
 
-        # Mostrar muestra de los datos recibidos
+        with cronometro.etapa(ETAPA_LECTURA):
+            cuerpo = await _leer_cuerpo(req, medir=True)
+
+        with cronometro.etapa(ETAPA_VALIDACION):
+            if perfilando:
+                request, perfil = perfilar(
+                    ETAPA_VALIDACION, decodificar_reporte, cuerpo, confiable=_es_llamada_interna(req))
+                perfiles.append(perfil)
+            else:
+                request = decodificar_reporte(cuerpo, confiable=_es_llamada_interna(req))
+
+        # Mostrar muestra de los datos recibidos (el modelo solo se formatea en DEBUG)
         if request.empleados_data:
-            muestra_empleado = request.empleados_data[0]
-            print(f"Empleados: {muestra_empleado}")
+            logger.debug("Empleados: %s", request.empleados_data[0])
 
         # Procesar los datos recibidos
-        print("Procesando datos recibidos...")
+        logger.debug("Procesando datos recibidos...")
         try:
-            empleados_data = await process_empleados_data(
-                [empleado.model_dump() for empleado in request.empleados_data],
-                request.fecha_inicio,
-                request.fecha_fin
-            )
-            print(
-                f"Datos procesados correctamente. {len(empleados_data)} empleados listos.")
+            with cronometro.etapa(ETAPA_PROCESAMIENTO):
+                empleados_data = await process_empleados_data(
+                    request.empleados_data,
+                    request.fecha_inicio,
+                    request.fecha_fin
+                )
+            logger.debug(
+                "Datos procesados correctamente. %d empleados listos.", len(empleados_data))
         except Exception as proc_error:
-            print(f"Error procesando datos: {str(proc_error)}")
-            traceback.print_exc()
+            logger.exception("Error procesando datos: %s", proc_error)
             raise HTTPException(
                 status_code=422,
                 detail=f"Error al procesar los datos de empleados: {str(proc_error)}"
             )
 
-        # Generar el Excel
-        print("Generando Excel...")
-        try:
-            excel_bytes = await generate_excel_report(
-                empleados_data,
-                request.fecha_inicio,
-                request.fecha_fin
-            )
-            print(
-                f"Excel generado correctamente. Tamaño: {len(excel_bytes) / 1024:.2f} KB")
-        except Exception as excel_error:
-            print(f"Error generando Excel: {str(excel_error)}")
-            traceback.print_exc()
+        return await _responder_reporte(req, request, empleados_data, cronometro, perfilando, perfiles)
+
+    except (HTTPException, RequestValidationError):
+        # Reenviar excepciones HTTP y errores de validación ya creados
+        raise
+    except Exception as e:
+        logger.exception("Error no manejado: %s", e)
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error al generar el reporte Excel: {str(e)}"
+        )
+    finally:
+        if perfilando:
+            limitador_perfilado.terminar()
+
+
+async def _responder_reporte(req: Request, request: ReporteRequest, empleados_data, cronometro: Cronometro, perfilando: bool = False, perfiles: list = None) -> Response:
+    """
+    Arma la respuesta de un reporte (xlsx, resumen o salida de datos) a partir
+    de los empleados ya procesados, con ETag, caché y streaming. La comparten
+    /marcaciones-excel y /marcaciones-excel/store.
+    """
+    empleados_reporte.observar(len(empleados_data))
+    dias_reporte.observar(cantidad_dias(request.fecha_inicio, request.fecha_fin))
+
+    try:
+        formato = resolver_formato(request.formato)
+    except ValueError as formato_error:
+        raise HTTPException(status_code=422, detail=str(formato_error))
+
+    try:
+        tipo = resolver_tipo_reporte(request.tipo_reporte)
+    except ValueError as tipo_error:
+        raise HTTPException(status_code=422, detail=str(tipo_error))
+
+    if tipo == TIPO_RESUMEN:
+        if formato != FORMATO_XLSX:
             raise HTTPException(
-                status_code=500,
-                detail=f"Error al generar el Excel: {str(excel_error)}"
+                status_code=422, detail="El resumen solo se genera en formato xlsx")
+        return await _responder_resumen(req, request, empleados_data, cronometro)
+
+    if formato != FORMATO_XLSX:
+        if perfilando:
+            logger.info("El perfilado solo se aplica a reportes xlsx; se omite")
+        return await _responder_datos(req, request, empleados_data, formato, cronometro)
+
+    respuesta_streaming = request.respuesta_streaming
+    if respuesta_streaming is None:
+        respuesta_streaming = settings.EXCEL_RESPUESTA_STREAMING
+
+    # La respuesta en streaming usa el writer de streaming por defecto, por
+    # lo que sus bytes (y su ETag) son distintos a los de la respuesta normal
+    modo = request.modo_escritura
+    if respuesta_streaming:
+        modo = modo or MODO_STREAMING
+    compresion = _perfil_compresion(request.compresion)
+
+    # El Excel es determinista: el hash de la solicitud identifica sus bytes
+    with cronometro.etapa(ETAPA_CLAVE):
+        clave = await run_in_threadpool(
+            clave_reporte, empleados_data, request.fecha_inicio, request.fecha_fin, modo,
+            request.backend, None, compresion, None, bool(respuesta_streaming))
+    etag = f'"{clave}"'
+    headers = {
+        "Content-Disposition": f"attachment; filename={_nombre_archivo(request.fecha_inicio, request.fecha_fin)}",
+        "ETag": etag,
+        HEADER_PERFIL_COMPRESION: compresion
+    }
+
+    if perfilando:
+        # Una solicitud perfilada siempre renderiza: sin 304, caché ni streaming
+        return await _responder_perfilado(request, empleados_data, modo, bool(respuesta_streaming),
+                                          compresion, clave, headers, perfiles, cronometro)
+
+    if _etag_coincide(req.headers.get("if-none-match"), etag):
+        logger.debug("ETag vigente, respondiendo 304")
+        return Response(status_code=304, headers={"ETag": etag})
+
+    excel_cacheado = cache_reportes.obtener(clave)
+    if excel_cacheado is not None:
+        logger.info("Reporte servido desde caché (%s)", clave[:12])
+        return Response(
+            content=excel_cacheado,
+            media_type=MEDIA_TYPE_XLSX,
+            headers={**headers, "X-Cache": "HIT"}
+        )
+    headers["X-Cache"] = "MISS"
+
+    if respuesta_streaming:
+        # Enviar el archivo a medida que se genera
+        logger.debug("Generando Excel en streaming...")
+        return StreamingResponse(
+            _guardar_en_cache(
+                stream_excel_report(
+                    empleados_data,
+                    request.fecha_inicio,
+                    request.fecha_fin,
+                    modo,
+                    request.backend,
+                    compresion,
+                    cronometro
+                ),
+                clave
+            ),
+            media_type=MEDIA_TYPE_XLSX,
+            headers=headers
+        )
+
+    # Generar el Excel
+    logger.debug("Generando Excel...")
+    try:
+        excel_bytes = await generate_excel_report(
+            empleados_data,
+            request.fecha_inicio,
+            request.fecha_fin,
+            modo,
+            backend=request.backend,
+            compresion=compresion,
+            cronometro=cronometro
+        )
+        logger.debug(
+            "Excel generado correctamente. Tamaño: %.2f KB", len(excel_bytes) / 1024)
+        cache_reportes.guardar(clave, excel_bytes)
+    except Exception as excel_error:
+        logger.exception("Error generando Excel: %s", excel_error)
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error al generar el Excel: {str(excel_error)}"
+        )
+
+    # Retornar el archivo Excel
+    response = Response(
+        content=excel_bytes,
+        media_type=MEDIA_TYPE_XLSX,
+        headers=headers
+    )
+
+    logger.debug("Respondiendo con el Excel generado")
+    return response
+
+
+async def _responder_perfilado(request: ReporteRequest, empleados_data, modo, streaming: bool, compresion: str, clave: str, headers: dict, perfiles: list, cronometro: Cronometro) -> Response:
+    """
+    Genera el Excel bajo cProfile y tracemalloc y guarda los perfiles de la
+    solicitud; el id de los archivos va en el encabezado X-Perfil-Id.
+
+    Se renderiza con el modo ya resuelto y, si la solicitud pide respuesta en
+    streaming, con los mismos bytes que esa respuesta: lo que se guarda en la
+    caché corresponde siempre a su clave y ETag.
+    """
+    try:
+        with cronometro.etapa(ETAPA_PERFILADO):
+            excel_bytes, perfil = await generar_excel_perfilado(
+                empleados_data, request.fecha_inicio, request.fecha_fin,
+                modo, request.backend, compresion, streaming)
+        cache_reportes.guardar(clave, excel_bytes)
+    except Exception as excel_error:
+        logger.exception("Error generando Excel perfilado: %s", excel_error)
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error al generar el Excel: {str(excel_error)}"
+        )
+
+    perfil_id = await run_in_threadpool(guardar_perfiles, perfiles + [perfil], {
+        "empleados": len(empleados_data),
+        "fecha_inicio": request.fecha_inicio,
+        "fecha_fin": request.fecha_fin,
+        "modo": modo,
+        "streaming": streaming,
+        "backend": request.backend,
+        "compresion": compresion,
+        "tamano_bytes": len(excel_bytes),
+        "etapas_ms": {etapa: round(segundos * 1000, 1)
+                      for etapa, segundos in cronometro.duraciones.items()}
+    })
+    return Response(
+        content=excel_bytes,
+        media_type=MEDIA_TYPE_XLSX,
+        headers={**headers, "X-Cache": "MISS", HEADER_PERFIL_ID: perfil_id}
+    )
+
+
+async def _responder_resumen(req: Request, request: ReporteRequest, empleados_data, cronometro: Cronometro) -> Response:
+    """Responde el resumen por mes (ver services.resumen_service), con ETag y caché."""
+    compresion = _perfil_compresion(request.compresion)
+    with cronometro.etapa(ETAPA_CLAVE):
+        clave = await run_in_threadpool(
+            clave_reporte, empleados_data, request.fecha_inicio, request.fecha_fin,
+            None, None, None, compresion, TIPO_RESUMEN)
+    etag = f'"{clave}"'
+
+    if _etag_coincide(req.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag": etag})
+
+    headers = {
+        "Content-Disposition": f"attachment; filename=resumen_{_nombre_archivo(request.fecha_inicio, request.fecha_fin)}",
+        "ETag": etag,
+        HEADER_PERFIL_COMPRESION: compresion
+    }
+
+    cacheado = cache_reportes.obtener(clave)
+    if cacheado is not None:
+        logger.info("Resumen servido desde caché (%s)", clave[:12])
+        return Response(content=cacheado, media_type=MEDIA_TYPE_XLSX,
+                        headers={**headers, "X-Cache": "HIT"})
+    headers["X-Cache"] = "MISS"
+
+    try:
+        with cronometro.etapa(ETAPA_RESUMEN):
+            excel_bytes = await generate_summary_report(
+                empleados_data, request.fecha_inicio, request.fecha_fin, compresion=compresion)
+        cache_reportes.guardar(clave, excel_bytes)
+    except Exception as resumen_error:
+        logger.exception("Error generando el resumen: %s", resumen_error)
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error al generar el resumen: {str(resumen_error)}"
+        )
+
+    return Response(content=excel_bytes, media_type=MEDIA_TYPE_XLSX, headers=headers)
+
+
+async def _responder_datos(req: Request, request: ReporteRequest, empleados_data, formato: str, cronometro: Cronometro) -> Response:
+    """Responde el reporte como CSV (en streaming), JSON o Parquet, con ETag y caché."""
+    with cronometro.etapa(ETAPA_CLAVE):
+        clave = await run_in_threadpool(
+            clave_reporte, empleados_data, request.fecha_inicio, request.fecha_fin,
+            None, None, formato)
+    etag = f'"{clave}"'
+
+    if _etag_coincide(req.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag": etag})
+
+    headers = {
+        "Content-Disposition": f"attachment; filename={_nombre_archivo(request.fecha_inicio, request.fecha_fin, formato)}",
+        "ETag": etag
+    }
+
+    cacheado = cache_reportes.obtener(clave)
+    if cacheado is not None:
+        logger.info("Reporte %s servido desde caché (%s)", formato, clave[:12])
+        return Response(
+            content=cacheado,
+            media_type=MEDIA_TYPES[formato],
+            headers={**headers, "X-Cache": "HIT"}
+        )
+    headers["X-Cache"] = "MISS"
+
+    if formato == FORMATO_CSV:
+        # El CSV se envía a medida que se arman las filas
+        return StreamingResponse(
+            _guardar_en_cache(
+                iterate_in_threadpool(generar_csv(
+                    empleados_data, request.fecha_inicio, request.fecha_fin)),
+                clave
+            ),
+            media_type=MEDIA_TYPES[formato],
+            headers=headers
+        )
+
+    try:
+        with cronometro.etapa(ETAPA_DATOS):
+            datos = await generate_data_report(
+                empleados_data, request.fecha_inicio, request.fecha_fin, formato)
+        cache_reportes.guardar(clave, datos)
+    except Exception as datos_error:
+        logger.exception("Error generando el reporte %s: %s", formato, datos_error)
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error al generar el reporte {formato}: {str(datos_error)}"
+        )
+
+    return Response(content=datos, media_type=MEDIA_TYPES[formato], headers=headers)
+
+
+@router.get("/marcaciones-excel/cache")
+async def estadisticas_cache():
+    """Contadores de aciertos, fallos y expulsiones del caché de reportes."""
+    return cache_reportes.estadisticas()
+
+
+@router.post(
+    "/marcaciones-excel/trabajos",
+    status_code=202,
+    openapi_extra={
+        "requestBody": {
+            "content": {"application/json": {"schema": _esquema_en_linea(ReporteRequest)}},
+            "required": True
+        }
+    }
+)
+async def crear_trabajo_reporte(req: Request):
+    """
+    Encola la generación de un reporte Excel y devuelve el id del trabajo.
+
+    Acepta el mismo cuerpo que /marcaciones-excel. El avance se consulta en
+    /marcaciones-excel/trabajos/{id} y el archivo, una vez terminado, se descarga
+    desde /marcaciones-excel/trabajos/{id}/archivo.
+    """
+    request = decodificar_reporte(await _leer_cuerpo(req), confiable=_es_llamada_interna(req))
+
+    if (request.formato or FORMATO_XLSX) != FORMATO_XLSX:
+        raise HTTPException(
+            status_code=422, detail="La API de trabajos solo genera reportes xlsx")
+    try:
+        tipo = resolver_tipo_reporte(request.tipo_reporte)
+    except ValueError as tipo_error:
+        raise HTTPException(status_code=422, detail=str(tipo_error))
+
+    try:
+        empleados_data = await process_empleados_data(
+            request.empleados_data,
+            request.fecha_inicio,
+            request.fecha_fin
+        )
+    except Exception as proc_error:
+        logger.exception("Error procesando datos: %s", proc_error)
+        raise HTTPException(
+            status_code=422,
+            detail=f"Error al procesar los datos de empleados: {str(proc_error)}"
+        )
+
+    nombre_archivo = _nombre_archivo(request.fecha_inicio, request.fecha_fin)
+    if tipo == TIPO_RESUMEN:
+        nombre_archivo = f"resumen_{nombre_archivo}"
+
+    trabajo = await gestor_trabajos.enviar(
+        empleados_data,
+        request.fecha_inicio,
+        request.fecha_fin,
+        request.modo_escritura,
+        nombre_archivo,
+        request.backend,
+        _perfil_compresion(request.compresion),
+        tipo
+    )
+
+    estado_url = str(req.url_for("estado_trabajo_reporte", trabajo_id=trabajo.id))
+    return JSONResponse(
+        status_code=202,
+        content={
+            "id": trabajo.id,
+            "estado": trabajo.estado,
+            "estado_url": estado_url,
+            "archivo_url": str(req.url_for("descargar_trabajo_reporte", trabajo_id=trabajo.id))
+        },
+        headers={"Location": estado_url}
+    )
+
+
+def _trabajo_o_404(trabajo_id: str):
+    trabajo = gestor_trabajos.obtener(trabajo_id)
+    if trabajo is None:
+        raise HTTPException(
+            status_code=404, detail="El trabajo no existe o ya expiró")
+    return trabajo
+
+
+@router.get("/marcaciones-excel/trabajos/{trabajo_id}")
+async def estado_trabajo_reporte(trabajo_id: str):
+    """Estado (queued, running, done o failed), avance por empleados y tiempos del trabajo."""
+    return _trabajo_o_404(trabajo_id).a_dict()
+
+
+@router.get("/marcaciones-excel/trabajos/{trabajo_id}/archivo")
+async def descargar_trabajo_reporte(trabajo_id: str):
+    """Descarga el Excel de un trabajo terminado (409 si aún no está listo)."""
+    trabajo = _trabajo_o_404(trabajo_id)
+
+    if trabajo.estado == ESTADO_FALLIDO:
+        raise HTTPException(
+            status_code=409, detail=f"El trabajo falló: {trabajo.error}")
+    if trabajo.estado != ESTADO_TERMINADO:
+        raise HTTPException(
+            status_code=409, detail=f"El trabajo aún no termina (estado: {trabajo.estado})")
+
+    return FileResponse(
+        trabajo.ruta_archivo,
+        media_type=MEDIA_TYPE_XLSX,
+        filename=trabajo.nombre_archivo,
+        headers={HEADER_PERFIL_COMPRESION: trabajo.compresion}
+    )
+
+
+@router.post(
+    "/marcaciones-store/empleados",
+    openapi_extra={
+        "requestBody": {
+            "content": {"application/json": {"schema": _esquema_en_linea(IngestaStoreRequest)}},
+            "required": True
+        }
+    }
+)
+async def ingerir_marcaciones_store(req: Request):
+    """
+    Guarda empleados y marcaciones en el almacén local (SQLite).
+
+    Las marcaciones se insertan o reemplazan por emp_code y fecha, así que se
+    pueden enviar solo las nuevas o corregidas. Los reportes se generan luego
+    con /marcaciones-excel/store, sin volver a enviar los datos.
+    """
+    ingesta = decodificar_json(await _leer_cuerpo(req), IngestaStoreRequest)
+    if not ingesta.empleados_data:
+        raise HTTPException(
+            status_code=400, detail="No se proporcionaron datos de empleados")
+    return await ingerir_empleados(ingesta.empleados_data)
+
+
+@router.get("/marcaciones-store")
+async def estado_marcaciones_store():
+    """Empleados y marcaciones guardados en el almacén local."""
+    return await run_in_threadpool(estadisticas_store)
+
+
+@router.post(
+    "/marcaciones-excel/store",
+    openapi_extra={
+        "requestBody": {
+            "content": {"application/json": {"schema": _esquema_en_linea(ReporteStoreRequest)}},
+            "required": True
+        }
+    }
+)
+async def generar_reporte_excel_store(req: Request):
+    """
+    Genera el reporte con los datos del almacén local.
+
+    El cuerpo lleva solo fecha_inicio, fecha_fin, los filtros opcionales
+    (emp_codes, dept_name, gerencia) y las mismas opciones de salida que
+    /marcaciones-excel, con la misma respuesta (ETag, caché, formatos y
+    resumen). Las marcaciones del rango se leen con una consulta por rango
+    sobre el índice (emp_code, fecha).
+    """
+    return await _atender_reporte(req, _generar_reporte_store)
+
+
+async def _generar_reporte_store(req: Request, cronometro: Cronometro) -> Response:
+    """Atiende /marcaciones-excel/store sumando al cronómetro cada etapa."""
+    try:
+        with cronometro.etapa(ETAPA_LECTURA):
+            cuerpo = await _leer_cuerpo(req, medir=True)
+
+        with cronometro.etapa(ETAPA_VALIDACION):
+            consulta = decodificar_json(cuerpo, ReporteStoreRequest)
+            try:
+                fecha_inicio, fecha_fin = validar_rango(consulta.fecha_inicio, consulta.fecha_fin)
+            except ValueError as rango_error:
+                raise HTTPException(status_code=422, detail=str(rango_error))
+
+        with cronometro.etapa(ETAPA_STORE):
+            empleados_data = await consultar_empleados(
+                fecha_inicio, fecha_fin, consulta.emp_codes, consulta.dept_name, consulta.gerencia)
+
+        if not empleados_data:
+            raise HTTPException(
+                status_code=404, detail="No hay empleados en el almacén para los filtros indicados")
+
+        request = ReporteRequest.model_construct(
+            empleados_data=empleados_data,
+            fecha_inicio=fecha_inicio,
+            fecha_fin=fecha_fin,
+            **consulta.model_dump(include=set(OpcionesReporte.model_fields))
+        )
+        return await _responder_reporte(req, request, empleados_data, cronometro)
+
+    except (HTTPException, RequestValidationError):
+        raise
+    except Exception as e:
+        logger.exception("Error no manejado: %s", e)
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error al generar el reporte Excel: {str(e)}"
+        )
+
+
+@router.post(
+    "/marcaciones-excel/incrementales",
+    status_code=201,
+    openapi_extra={
+        "requestBody": {
+            "content": {"application/json": {"schema": _esquema_en_linea(ReporteRequest)}},
+            "required": True
+        }
+    }
+)
+async def crear_reporte_incremental_excel(req: Request):
+    """
+    Genera el reporte Excel y conserva su estado calculado para actualizarlo
+    después con solo los cambios.
+
+    Acepta el mismo cuerpo que /marcaciones-excel (solo reportes detallados en
+    xlsx). Devuelve el Excel con el id del reporte en X-Reporte-Id; las
+    actualizaciones se envían a /marcaciones-excel/incrementales/{id}. El
+    rango de fechas queda fijo.
+    """
+    request = decodificar_reporte(await _leer_cuerpo(req), confiable=_es_llamada_interna(req))
+
+    if (request.formato or FORMATO_XLSX) != FORMATO_XLSX:
+        raise HTTPException(
+            status_code=422, detail="Los reportes incrementales solo se generan en xlsx")
+    if request.tipo_reporte == TIPO_RESUMEN:
+        raise HTTPException(
+            status_code=422, detail="Los reportes incrementales solo admiten el reporte detallado")
+
+    try:
+        empleados_data = await process_empleados_data(
+            request.empleados_data,
+            request.fecha_inicio,
+            request.fecha_fin
+        )
+    except Exception as proc_error:
+        logger.exception("Error procesando datos: %s", proc_error)
+        raise HTTPException(
+            status_code=422,
+            detail=f"Error al procesar los datos de empleados: {str(proc_error)}"
+        )
+
+    try:
+        reporte, excel_bytes = await crear_reporte_incremental(
+            empleados_data,
+            request.fecha_inicio,
+            request.fecha_fin,
+            _perfil_compresion(request.compresion)
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+    return _respuesta_incremental(req, reporte, excel_bytes, status_code=201)
+
+
+def _reporte_incremental_o_404(reporte_id: str):
+    reporte = almacen_incremental.obtener(reporte_id)
+    if reporte is None:
+        raise HTTPException(
+            status_code=404, detail="El reporte incremental no existe o ya expiró")
+    return reporte
+
+
+def _respuesta_incremental(req: Request, reporte, excel_bytes: bytes, status_code: int = 200, headers: dict = None) -> Response:
+    """Excel de un reporte incremental con su id, versión y la URL de actualización."""
+    return Response(
+        content=excel_bytes,
+        status_code=status_code,
+        media_type=MEDIA_TYPE_XLSX,
+        headers={
+            "Content-Disposition": f"attachment; filename={_nombre_archivo(reporte.fecha_inicio, reporte.fecha_fin)}",
+            "Location": str(req.url_for("actualizar_reporte_incremental_excel", reporte_id=reporte.id)),
+            HEADER_PERFIL_COMPRESION: reporte.compresion,
+            HEADER_REPORTE_ID: reporte.id,
+            HEADER_REPORTE_VERSION: str(reporte.version),
+            **(headers or {})
+        }
+    )
+
+
+@router.post(
+    "/marcaciones-excel/incrementales/{reporte_id}",
+    openapi_extra={
+        "requestBody": {
+            "content": {"application/json": {"schema": _esquema_en_linea(ReporteCambiosRequest)}},
+            "required": True
+        }
+    }
+)
+async def actualizar_reporte_incremental_excel(reporte_id: str, req: Request):
+    """
+    Aplica cambios a un reporte incremental y devuelve el Excel actualizado.
+
+    El cuerpo lleva solo los empleados que cambiaron, cada uno con sus
+    marcaciones nuevas o corregidas (identificadas por emp_code y fecha) y los
+    campos que cambiaron; los emp_code nuevos se agregan al final. Solo se
+    recalculan las filas de esos empleados.
+    """
+    reporte = _reporte_incremental_o_404(reporte_id)
+    cambios = decodificar_json(await _leer_cuerpo(req), ReporteCambiosRequest)
+
+    if not cambios.empleados_data:
+        raise HTTPException(
+            status_code=400, detail="No se proporcionaron cambios de empleados")
+
+    excel_bytes, actualizados = await actualizar_reporte_incremental(
+        reporte, cambios.empleados_data)
+
+    return _respuesta_incremental(req, reporte, excel_bytes, headers={
+        "X-Empleados-Actualizados": str(actualizados)
+    })
+
+
+@router.get("/marcaciones-excel/incrementales/{reporte_id}")
+async def estado_reporte_incremental(reporte_id: str):
+    """Versión, empleados y hojas de un reporte incremental."""
+    return _reporte_incremental_o_404(reporte_id).a_dict()
+
+
+@router.delete("/marcaciones-excel/incrementales/{reporte_id}", status_code=204)
+async def eliminar_reporte_incremental(reporte_id: str):
+    """Descarta el estado de un reporte incremental."""
+    if not almacen_incremental.eliminar(reporte_id):
+        raise HTTPException(
+            status_code=404, detail="El reporte incremental no existe o ya expiró")
+    return Response(status_code=204)
+
+
+@router.post("/marcaciones-excel/ndjson")
+async def generar_reporte_excel_ndjson(req: Request):
+    """
+    Genera el reporte Excel a partir de un cuerpo NDJSON (application/x-ndjson).
+
+    La primera línea lleva fecha_inicio y fecha_fin; cada línea siguiente es un
+    empleado con sus marcaciones. Los empleados se validan y se escriben en el
+    Excel a medida que llegan (con varios meses, por fragmentos de empleados;
+    con EXCEL_BACKEND nativo y varios meses se reciben todos antes de
+    escribir). Las líneas inválidas no detienen el reporte: se informan en los
+    encabezados X-Lineas-Invalidas y X-Lineas-Invalidas-Detalle.
+    """
+    try:
+        content_length = req.headers.get("content-length", "desconocido")
+        logger.info(
+            "Recibiendo solicitud NDJSON con Content-Length: %s bytes", content_length)
+
+        cuerpo_solicitud = CuerpoSolicitud(req)
+        resultado = await generar_excel_desde_ndjson(cuerpo_solicitud)
+        if cuerpo_solicitud.comprimido:
+            logger.info("Cuerpo NDJSON %s descomprimido: %d bytes recibidos, %d bytes descomprimidos",
+                        cuerpo_solicitud.codificacion, cuerpo_solicitud.bytes_recibidos,
+                        cuerpo_solicitud.bytes_descomprimidos)
+
+        if resultado.errores:
+            logger.warning(
+                "Se omitieron %d líneas inválidas del NDJSON", len(resultado.errores))
+
+        if resultado.empleados_validos == 0:
+            raise HTTPException(
+                status_code=422 if resultado.errores else 400,
+                detail={
+                    "mensaje": "No se proporcionaron datos de empleados válidos",
+                    "errores": resultado.errores[:settings.NDJSON_MAX_ERRORES_DETALLE]
+                }
             )
 
-        # Nombre de archivo con fechas si están disponibles
-        filename = "marcaciones"
-        if request.fecha_inicio:
-            filename += f"_desde_{request.fecha_inicio}"
-        if request.fecha_fin:
-            filename += f"_hasta_{request.fecha_fin}"
-        filename += ".xlsx"
-
-        # Retornar el archivo Excel
-        response = Response(
-            content=excel_bytes,
-            media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        logger.info("Excel generado desde NDJSON: %d empleados, %.2f KB",
+                    resultado.empleados_validos, len(resultado.excel_bytes) / 1024)
+
+        encabezado = resultado.encabezado
+        return Response(
+            content=resultado.excel_bytes,
+            media_type=MEDIA_TYPE_XLSX,
             headers={
-                "Content-Disposition": f"attachment; filename={filename}"
+                "Content-Disposition": f"attachment; filename={_nombre_archivo(encabezado.fecha_inicio, encabezado.fecha_fin)}",
+                HEADER_PERFIL_COMPRESION: resolver_compresion(None),
+                "X-Empleados-Procesados": str(resultado.empleados_validos),
+                "X-Lineas-Invalidas": str(len(resultado.errores)),
+                "X-Lineas-Invalidas-Detalle": json.dumps(
+                    resultado.errores[:settings.NDJSON_MAX_ERRORES_DETALLE])
             }
         )
 
-        print("Respondiendo con el Excel generado")
-        return response
-
     except HTTPException:
-        # Reenviar excepciones HTTP ya creadas
         raise
     except Exception as e:
-        print(f"Error no manejado: {str(e)}")
-        traceback.print_exc()
+        logger.exception("Error no manejado: %s", e)
         raise HTTPException(
             status_code=500,
             detail=f"Error al generar el reporte Excel: {str(e)}"
@@ -1,4 +1,7 @@
 from pydantic_settings import BaseSettings
+import os
+import tempfile
+from typing import Optional
 
 class Settings(BaseSettings):
     
@@ -8,5 +11,85 @@ class Settings(BaseSettings):
     
     EXCEL_OUTPUT_FILE: str = "marcaciones_personal.xlsx"
     EXCEL_SHEET_TITLE: str = "FEBRERO 2025"
+
+    # Modo de escritura del Excel: "normal", "streaming" o "auto"
+    EXCEL_MODO_ESCRITURA: str = "auto"
+    # En modo "auto" se usa streaming cuando empleados x columnas supera este valor
+    EXCEL_UMBRAL_STREAMING_CELDAS: int = 200_000
+    # Motor que escribe el xlsx: "openpyxl" o "nativo" (XML directo, mismo contenido)
+    EXCEL_BACKEND: str = "openpyxl"
+    # Perfil de compresión del xlsx: "stored" (sin comprimir), "fast", "default" o "max"
+    EXCEL_COMPRESION: str = "default"
+
+    # Pool de procesos para el renderizado (0 workers = renderizar en hilos)
+    EXCEL_POOL_WORKERS: int = 2
+    # Cantidad de reportes que atiende cada proceso antes de reciclarse (0 = sin límite)
+    EXCEL_POOL_MAX_TAREAS_POR_WORKER: int = 50
+
+    # Enviar el Excel al cliente a medida que se genera (se puede pedir por solicitud)
+    EXCEL_RESPUESTA_STREAMING: bool = False
+    # Tamaño de cada bloque enviado y cuántos bloques pueden esperar en memoria
+    EXCEL_STREAM_TAMANO_BLOQUE: int = 64 * 1024
+    EXCEL_STREAM_BLOQUES_EN_COLA: int = 8
+
+    # Rangos de fechas distintos cuyo layout y encabezado se mantienen en caché
+    EXCEL_CACHE_LAYOUTS: int = 32
+
+    # Caché de reportes generados (clave = hash de la solicitud, también usado como ETag).
+    # Con EXCEL_CACHE_MAX_REPORTES en 0 no se guarda nada, pero el ETag se mantiene
+    EXCEL_CACHE_MAX_REPORTES: int = 64
+    EXCEL_CACHE_MAX_MB: int = 256
+    EXCEL_CACHE_TTL_SEGUNDOS: int = 3600
+
+    # API de trabajos asíncronos: reportes generados en segundo plano y
+    # guardados en disco hasta que expiran
+    JOBS_WORKERS: int = 2
+    JOBS_MAX_EN_COLA: int = 100
+    JOBS_DIRECTORIO: str = os.path.join(tempfile.gettempdir(), "madrid_excel_trabajos")
+    JOBS_TTL_SEGUNDOS: int = 3600
+    JOBS_INTERVALO_LIMPIEZA_SEGUNDOS: int = 60
+
+    # Reportes incrementales: estado calculado que se conserva en memoria para
+    # actualizarlo con solo los cambios. El TTL se renueva con cada actualización
+    INCREMENTAL_MAX_REPORTES: int = 8
+    INCREMENTAL_TTL_SEGUNDOS: int = 2 * 24 * 3600
+
+    # Almacén local de marcaciones (archivo SQLite): los reportes pueden
+    # generarse con los datos guardados en lugar de enviarlos en cada solicitud
+    STORE_RUTA: str = "marcaciones.db"
+
+    # Empleados por fragmento al renderizar en paralelo reportes grandes (modo
+    # streaming) y hojas mensuales. Cambiarlo cambia los bytes del archivo
+    EXCEL_EMPLEADOS_POR_FRAGMENTO: int = 500
+
+    # Empleados por lote en el cálculo vectorizado de asistencia
+    ASISTENCIA_LOTE_EMPLEADOS: int = 1000
+
+    # Ingesta NDJSON: tamaño máximo de una línea y empleados validados en espera
+    NDJSON_MAX_BYTES_LINEA: int = 5 * 1024 * 1024
+    NDJSON_EMPLEADOS_EN_COLA: int = 256
+    # Cantidad máxima de errores por línea que se detallan en la respuesta
+    NDJSON_MAX_ERRORES_DETALLE: int = 20
+
+    # Cuerpos comprimidos (Content-Encoding gzip o zstd): tamaño máximo una vez
+    # descomprimidos; al superarlo la solicitud se rechaza con 413
+    SOLICITUD_MAX_BYTES_DESCOMPRIMIDOS: int = 512 * 1024 * 1024
+
+    # Nivel de log de la aplicación (DEBUG muestra el detalle por empleado)
+    LOG_LEVEL: str = "INFO"
+    LOG_FORMAT: str = "%(asctime)s %(levelname)s [%(name)s] %(message)s"
+
+    # Token de servicios internos de confianza: con él se omite la validación por campo
+    INTERNAL_API_TOKEN: Optional[str] = None
+
+    # Perfilado bajo demanda (cProfile y tracemalloc) de una solicitud que envía
+    # el encabezado X-Perfilar con este token; sin token configurado no se perfila
+    PERFILADO_TOKEN: Optional[str] = None
+    PERFILADO_DIRECTORIO: str = os.path.join(tempfile.gettempdir(), "madrid_excel_perfiles")
+    # Como máximo un perfilado a la vez y uno cada este intervalo
+    PERFILADO_INTERVALO_SEGUNDOS: int = 60
+    # Funciones (por tiempo acumulado) y sitios de asignación que van al resumen
+    PERFILADO_FUNCIONES_RESUMEN: int = 40
+    PERFILADO_TOP_ASIGNACIONES: int = 25
     
 settings = Settings()
\ No newline at end of file
@@ -1,13 +1,37 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 
 from api import marcaciones
 from config import settings
+from services.marcaciones_store import cerrar_store
+from services.render_pool import iniciar_pool, cerrar_pool
+from services.report_jobs import gestor_trabajos
+from utils.logger import configurar_logging, detener_logging
+from utils.metricas import registro
+
+configurar_logging()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Arrancar el pool de renderizado antes de aceptar solicitudes
+    iniciar_pool()
+    gestor_trabajos.iniciar()
+    yield
+    await gestor_trabajos.detener()
+    cerrar_pool()
+    cerrar_store()
+    detener_logging()
+
 
 app = FastAPI(
     title=settings.APP_TITLE,
     version=settings.APP_VERSION,
-    description=settings.APP_DESCRIPTION
+    description=settings.APP_DESCRIPTION,
+    lifespan=lifespan
 )
 
 app.add_middleware(
@@ -24,4 +48,10 @@ def read_root():
     return {"message": "API de Control de Marcaciones. Accede a /docs para más información."}
 
 
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+def metricas():
+    """Métricas de los reportes en el formato de texto de Prometheus."""
+    return PlainTextResponse(registro.exponer(), media_type="text/plain; version=0.0.4")
+
+
 app.include_router(marcaciones.router, prefix="/api", tags=["marcaciones"])
@@ -1,7 +1,9 @@
-from pydantic import BaseModel, Field
-from typing import List, Optional, Union
+from pydantic import BaseModel, Field, PrivateAttr, model_validator
+from typing import List, Literal, Optional, Union
 from datetime import datetime
 
+from utils.fechas import normalizar_fecha
+
 
 class Marcacion(BaseModel):
     """Modelo para una marcación de asistencia."""
@@ -15,6 +17,25 @@ class Marcacion(BaseModel):
     ingreso_tarde: Optional[bool] = None
     salida_temprano: Optional[bool] = None
 
+    # Fecha normalizada a 'YYYY-MM-DD'; "" indica que aún no se calculó
+    _fecha_iso: Optional[str] = PrivateAttr(default="")
+
+    @model_validator(mode="after")
+    def _normalizar_fecha(self) -> "Marcacion":
+        self._fecha_iso = normalizar_fecha(self.fecha)
+        return self
+
+    @property
+    def fecha_iso(self) -> Optional[str]:
+        """Fecha de la marcación como 'YYYY-MM-DD', o None si no se pudo interpretar."""
+        # Se lee el almacenamiento privado directamente: el acceso por
+        # atributo pasa por BaseModel.__getattr__, que es mucho más lento
+        privado = self.__pydantic_private__
+        if privado["_fecha_iso"] == "":
+            # Modelos creados con model_construct no pasan por el validador
+            privado["_fecha_iso"] = normalizar_fecha(self.fecha)
+        return privado["_fecha_iso"]
+
 
 class EmpleadoMarcaciones(BaseModel):
     """Modelo para un empleado con sus marcaciones."""
@@ -38,13 +59,58 @@ class EmpleadoMarcaciones(BaseModel):
     gerencia: Optional[str] = None
 
 
-class ReporteRequest(BaseModel):
+class OpcionesReporte(BaseModel):
+    """Opciones de salida del reporte, comunes a todas las solicitudes."""
+    modo_escritura: Optional[Literal["normal", "streaming", "auto"]] = None
+    respuesta_streaming: Optional[bool] = None
+    backend: Optional[Literal["openpyxl", "nativo"]] = None
+    formato: Optional[Literal["xlsx", "csv", "json", "parquet"]] = None
+    compresion: Optional[Literal["stored", "fast", "default", "max"]] = None
+    tipo_reporte: Optional[Literal["detalle", "resumen"]] = None
+
+
+class ReporteRequest(OpcionesReporte):
     """Modelo para la solicitud de generación de reporte."""
     empleados_data: List[EmpleadoMarcaciones]
     fecha_inicio: Optional[str] = None
     fecha_fin: Optional[str] = None
 
 
+class ReporteStoreRequest(OpcionesReporte):
+    """
+    Solicitud de reporte con los datos del almacén local: solo el rango y los
+    filtros de empleados (sin filtros entran todos).
+    """
+    fecha_inicio: str
+    fecha_fin: str
+    emp_codes: Optional[List[str]] = None
+    dept_name: Optional[str] = None
+    gerencia: Optional[str] = None
+
+
+class IngestaStoreRequest(BaseModel):
+    """
+    Empleados y marcaciones a guardar en el almacén local. Las marcaciones se
+    identifican por emp_code y fecha; de un empleado ya guardado solo se
+    actualizan los campos enviados.
+    """
+    empleados_data: List[EmpleadoMarcaciones]
+
+
+class ReporteCambiosRequest(BaseModel):
+    """
+    Cambios para un reporte incremental. Cada empleado lleva solo sus
+    marcaciones nuevas o corregidas (una por fecha) y los campos que cambiaron.
+    """
+    empleados_data: List[EmpleadoMarcaciones]
+
+
+class ReporteNdjsonEncabezado(BaseModel):
+    """Primera línea de una solicitud NDJSON: el rango de fechas del reporte."""
+    fecha_inicio: Optional[str] = None
+    fecha_fin: Optional[str] = None
+
+
 class ResponseEmpleados(BaseModel):
     """Modelo para la respuesta con lista de empleados."""
     empleados: List[EmpleadoMarcaciones]
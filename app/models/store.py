@@ -0,0 +1,58 @@
+from sqlalchemy import (
+    JSON, Boolean, Column, ForeignKey, Index, Integer, MetaData, String, Table
+)
+
+# Tablas del almacén local de marcaciones (ver services.marcaciones_store)
+metadata = MetaData()
+
+empleados = Table(
+    "empleados",
+    metadata,
+    # Orden de alta: es el orden de los empleados en el reporte
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    Column("emp_code", String, nullable=False, unique=True),
+    Column("first_name", String),
+    Column("last_name", String),
+    Column("hire_date", String),
+    Column("fecha_cese", String),
+    Column("is_unactive", Boolean),
+    Column("position_name", String),
+    Column("dept_name", String),
+    Column("hora_ingreso", String),
+    Column("hora_salida", String),
+    Column("dias_labores", String),
+    Column("dias_descanso", String),
+    Column("dias_remoto", JSON),
+    Column("cantidad_tardanzas", Integer),
+    Column("cantidad_tolerancias", Integer),
+    Column("cantidad_faltas", Integer),
+    Column("gerencia", String),
+    Index("ix_empleados_dept_name", "dept_name"),
+    Index("ix_empleados_gerencia", "gerencia"),
+)
+
+# Una marcación por empleado y fecha. Sin rowid, la tabla se guarda ordenada
+# por su clave (emp_code, fecha) y el rango de un empleado es contiguo: las
+# consultas por fecha deben partir de emp_code para no recorrer la tabla
+marcaciones = Table(
+    "marcaciones",
+    metadata,
+    Column("emp_code", String, ForeignKey("empleados.emp_code"), primary_key=True),
+    # Fecha normalizada 'YYYY-MM-DD'
+    Column("fecha", String, primary_key=True),
+    Column("hora_ingreso", String),
+    Column("hora_salida", String),
+    Column("diferencia_ingreso", Integer),
+    Column("diferencia_salida", Integer),
+    Column("marco_ingreso", Boolean),
+    Column("marco_salida", Boolean),
+    Column("ingreso_tarde", Boolean),
+    Column("salida_temprano", Boolean),
+    sqlite_with_rowid=False,
+)
+
+# Campos del empleado que se guardan tal cual vienen en EmpleadoMarcaciones
+CAMPOS_EMPLEADO = tuple(
+    columna.name for columna in empleados.columns if columna.name not in ("id", "emp_code"))
+CAMPOS_MARCACION = tuple(
+    columna.name for columna in marcaciones.columns if columna.name not in ("emp_code", "fecha"))
@@ -0,0 +1,322 @@
+import logging
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Dict, FrozenSet, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from models.schemas import EmpleadoMarcaciones, Marcacion
+from utils.fechas import formatear_timestamp
+
+logger = logging.getLogger(__name__)
+
+# Minutos de tardanza tolerados antes de considerarse tardanza
+MARGEN_TOLERANCIA = 5
+
+# Clasificación de las celdas TAR/EXT de cada día
+CLASE_SIN_MARCA = 0
+CLASE_ROJO = 1
+CLASE_AMARILLO = 2
+CLASE_VERDE = 3
+CLASE_TELETRABAJO = 4
+
+ESTADO_ACTIVO = "Activo"
+ESTADO_INACTIVO = "Inactivo"
+ESTADO_CESADO = "Cesado"
+
+# Jornada que se asume cuando el empleado no informa dias_labores
+DIAS_LABORES_POR_DEFECTO = "lun-vier"
+
+# Horario de un empleado: (días laborables, días de teletrabajo)
+PatronHorario = Tuple[FrozenSet[str], FrozenSet[str]]
+
+# Horario sin días laborables ni de teletrabajo (empleados que fallaron)
+PATRON_VACIO: PatronHorario = (frozenset(), frozenset())
+
+
+@dataclass
+class MatrizAsistencia:
+    """
+    Asistencia de un lote de empleados en matrices densas empleados × días.
+
+    Las columnas siguen el orden de layout.todas_fechas. Las matrices de
+    diferencias valen 0 donde no hay marcación.
+    """
+    empleados: List[EmpleadoMarcaciones]
+    # Marcación vigente (la última recibida) de cada empleado y día, o None
+    marcaciones: List[List[Optional[Marcacion]]]
+    presente: np.ndarray
+    teletrabajo: np.ndarray
+    ingreso_nm: np.ndarray
+    salida_nm: np.ndarray
+    diferencia_ingreso: np.ndarray
+    diferencia_salida: np.ndarray
+    clase_tardanza: np.ndarray
+    clase_extension: np.ndarray
+    # Días laborables sin marcación ni teletrabajo (los que cuentan como falta)
+    sin_marcar: np.ndarray
+    # Totales por empleado
+    estados: List[str]
+    fallidos: np.ndarray
+    cantidad_tardanzas: np.ndarray
+    cantidad_tolerancias: np.ndarray
+    dias_sin_marcar: np.ndarray
+    # True si cantidad_faltas sale de los días sin marcar y no del JSON
+    faltas_calculadas: np.ndarray
+    cantidad_faltas: np.ndarray
+    total_tardanza: np.ndarray
+    total_ausencia: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.empleados)
+
+
+def _entero(valor: Any) -> int:
+    """Convierte una diferencia de minutos a entero; lo no numérico cuenta como 0."""
+    try:
+        return int(valor)
+    except (ValueError, TypeError):
+        return 0
+
+
+def _numero(valor: Any):
+    """Valor usado en los totales: solo cuentan diferencias numéricas."""
+    return valor if isinstance(valor, (int, float)) else 0
+
+
+def _faltas_informadas(valor: Any) -> int:
+    """Cantidad de faltas enviada en el JSON, normalizada a número."""
+    if isinstance(valor, str):
+        try:
+            return int(valor)
+        except (ValueError, TypeError):
+            return 0
+    if not isinstance(valor, (int, float)):
+        return 0
+    return valor
+
+
+def estado_empleado(empleado: EmpleadoMarcaciones) -> str:
+    """Estado del empleado: cesado si tiene fecha de cese válida, si no inactivo o activo."""
+    if formatear_timestamp(empleado.fecha_cese) is not None:
+        return ESTADO_CESADO
+    if empleado.is_unactive:
+        return ESTADO_INACTIVO
+    return ESTADO_ACTIVO
+
+
+def _marcaciones_por_dia(empleado: EmpleadoMarcaciones, dia_por_fecha: dict) -> dict:
+    """Índice de día -> última marcación de esa fecha dentro del rango del reporte."""
+    por_dia = {}
+    for marcacion in empleado.marcaciones:
+        fecha_marca = marcacion.fecha_iso
+        if fecha_marca is None:
+            logger.debug("Error al parsear fecha: %s", marcacion.fecha)
+            continue
+        dia = dia_por_fecha.get(fecha_marca)
+        if dia is not None:
+            por_dia[dia] = marcacion
+    return por_dia
+
+
+def patron_horario(empleado: EmpleadoMarcaciones) -> PatronHorario:
+    """Días laborables y de teletrabajo del empleado, como conjuntos de nombres de día."""
+    return (frozenset((empleado.dias_labores or DIAS_LABORES_POR_DEFECTO).split("-")),
+            frozenset(empleado.dias_remoto))
+
+
+@lru_cache(maxsize=256)
+def _mascara_dias(dias_rango: Tuple[str, ...], nombres: FrozenSet[str]) -> np.ndarray:
+    """
+    Máscara de los días del rango cuyo día de la semana está en `nombres`.
+
+    Se guarda por (rango, conjunto de días), así que cada horario se compila
+    una sola vez aunque lo compartan muchos empleados, lotes y solicitudes.
+    """
+    mascara = np.fromiter((dia in nombres for dia in dias_rango), dtype=bool, count=len(dias_rango))
+    mascara.flags.writeable = False
+    return mascara
+
+
+def mascaras_horarios(patrones: Sequence[PatronHorario], todas_fechas: Sequence[Tuple[str, str]]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Compila los horarios de un lote en máscaras por día del rango.
+
+    Args:
+        patrones: Horarios distintos del lote, en el orden de sus índices
+        todas_fechas: Fechas del reporte como (fecha ISO, día de la semana)
+
+    Returns:
+        Tupla (laborable, teletrabajo) de matrices horarios × días
+    """
+    dias_rango = tuple(dia for _, dia in todas_fechas)
+    laborable = np.zeros((len(patrones), len(dias_rango)), dtype=bool)
+    teletrabajo = np.zeros((len(patrones), len(dias_rango)), dtype=bool)
+    for p, (labores, remotos) in enumerate(patrones):
+        laborable[p] = _mascara_dias(dias_rango, labores)
+        teletrabajo[p] = _mascara_dias(dias_rango, remotos)
+    return laborable, teletrabajo
+
+
+def calcular_asistencia(empleados: Sequence[EmpleadoMarcaciones], todas_fechas: Sequence[Tuple[str, str]]) -> MatrizAsistencia:
+    """
+    Carga un lote de empleados en matrices y calcula toda la clasificación
+    (tardanza, tolerancia, extensión, teletrabajo, faltas y totales) con
+    operaciones de NumPy sobre el lote completo.
+
+    Args:
+        empleados: Empleados del lote, en el orden del reporte
+        todas_fechas: Fechas del reporte como (fecha ISO, día de la semana)
+
+    Returns:
+        Matriz de asistencia del lote
+    """
+    n_empleados = len(empleados)
+    n_dias = len(todas_fechas)
+    dia_por_fecha = {fecha: i for i, (fecha, _) in enumerate(todas_fechas)}
+
+    # Los empleados comparten unos pocos horarios: cada uno se compila una vez
+    # en máscaras por día y cada empleado solo guarda el índice de su horario
+    indice_patron: Dict[PatronHorario, int] = {PATRON_VACIO: 0}
+    patron_empleado = np.zeros(n_empleados, dtype=np.intp)
+
+    # Celdas con marcación, acumuladas en listas planas y volcadas a las
+    # matrices de una sola vez
+    celdas_empleado: List[int] = []
+    celdas_dia: List[int] = []
+    celdas_ingreso_nm: List[bool] = []
+    celdas_salida_nm: List[bool] = []
+    celdas_dif_ingreso: List[int] = []
+    celdas_dif_salida: List[int] = []
+
+    marcaciones: List[List[Optional[Marcacion]]] = []
+    fallidos = np.zeros(n_empleados, dtype=bool)
+    activos = np.zeros(n_empleados, dtype=bool)
+    faltas_informadas = np.zeros(n_empleados, dtype=np.int64)
+    estados = []
+
+    # Diferencias de todas las marcaciones (también las de fuera del rango)
+    totales_empleado: List[int] = []
+    totales_ingreso: List[Any] = []
+    totales_salida: List[Any] = []
+
+    # Única pasada en Python: extraer los datos de los modelos
+    for e, empleado in enumerate(empleados):
+        try:
+            patron = patron_horario(empleado)
+            por_dia = _marcaciones_por_dia(empleado, dia_por_fecha)
+            ingresos = [_numero(m.diferencia_ingreso) for m in empleado.marcaciones]
+            salidas = [_numero(m.diferencia_salida) for m in empleado.marcaciones]
+            estado = estado_empleado(empleado)
+            faltas = _faltas_informadas(empleado.cantidad_faltas)
+        except Exception as ex:
+            logger.exception("Error procesando empleado %s: %s",
+                             getattr(empleado, "emp_code", e), ex)
+            fallidos[e] = True
+            estados.append(ESTADO_ACTIVO)
+            marcaciones.append([None] * n_dias)
+            continue
+
+        fila = [None] * n_dias
+        for dia, marcacion in por_dia.items():
+            fila[dia] = marcacion
+            celdas_empleado.append(e)
+            celdas_dia.append(dia)
+            celdas_ingreso_nm.append(marcacion.hora_ingreso is None)
+            celdas_salida_nm.append(marcacion.hora_salida is None)
+            celdas_dif_ingreso.append(_entero(marcacion.diferencia_ingreso))
+            celdas_dif_salida.append(_entero(marcacion.diferencia_salida))
+
+        totales_empleado.extend([e] * len(ingresos))
+        totales_ingreso.extend(ingresos)
+        totales_salida.extend(salidas)
+
+        patron_empleado[e] = indice_patron.setdefault(patron, len(indice_patron))
+        marcaciones.append(fila)
+        estados.append(estado)
+        activos[e] = estado == ESTADO_ACTIVO
+        faltas_informadas[e] = faltas
+
+    celdas = (np.asarray(celdas_empleado, dtype=np.intp),
+              np.asarray(celdas_dia, dtype=np.intp))
+
+    presente = np.zeros((n_empleados, n_dias), dtype=bool)
+    presente[celdas] = True
+    ingreso_nm = np.zeros((n_empleados, n_dias), dtype=bool)
+    ingreso_nm[celdas] = celdas_ingreso_nm
+    salida_nm = np.zeros((n_empleados, n_dias), dtype=bool)
+    salida_nm[celdas] = celdas_salida_nm
+    diferencia_ingreso = np.zeros((n_empleados, n_dias), dtype=np.int64)
+    diferencia_ingreso[celdas] = celdas_dif_ingreso
+    diferencia_salida = np.zeros((n_empleados, n_dias), dtype=np.int64)
+    diferencia_salida[celdas] = celdas_dif_salida
+    laborable_patron, teletrabajo_patron = mascaras_horarios(list(indice_patron), todas_fechas)
+    laborable = laborable_patron[patron_empleado]
+    teletrabajo = teletrabajo_patron[patron_empleado]
+
+    # Clasificación por celda
+    tardanza = presente & (diferencia_ingreso > MARGEN_TOLERANCIA)
+    tolerancia = presente & (diferencia_ingreso > 0) & ~tardanza
+    neutro = np.where(teletrabajo, CLASE_TELETRABAJO, CLASE_VERDE).astype(np.uint8)
+
+    clase_tardanza = np.where(tardanza, CLASE_ROJO,
+                              np.where(tolerancia, CLASE_AMARILLO, neutro)).astype(np.uint8)
+    clase_tardanza[~presente] = CLASE_SIN_MARCA
+
+    ausencia = presente & (diferencia_salida < 0)
+    clase_extension = np.where(ausencia, CLASE_ROJO, neutro).astype(np.uint8)
+    clase_extension[~presente] = CLASE_SIN_MARCA
+
+    # Faltas: días laborables sin marcación ni teletrabajo, solo para activos
+    # que no informaron faltas
+    sin_marcar = laborable & ~presente & ~teletrabajo
+    dias_sin_marcar = sin_marcar.sum(axis=1)
+    faltas_calculadas = activos & (faltas_informadas == 0)
+    cantidad_faltas = np.where(faltas_calculadas, dias_sin_marcar, faltas_informadas)
+
+    # Totales sobre todas las marcaciones del empleado
+    total_tardanza, total_ausencia = _totales(
+        n_empleados, totales_empleado, totales_ingreso, totales_salida)
+
+    return MatrizAsistencia(
+        empleados=list(empleados),
+        marcaciones=marcaciones,
+        presente=presente,
+        teletrabajo=teletrabajo,
+        ingreso_nm=ingreso_nm,
+        salida_nm=salida_nm,
+        diferencia_ingreso=diferencia_ingreso,
+        diferencia_salida=diferencia_salida,
+        clase_tardanza=clase_tardanza,
+        clase_extension=clase_extension,
+        sin_marcar=sin_marcar,
+        estados=estados,
+        fallidos=fallidos,
+        cantidad_tardanzas=tardanza.sum(axis=1),
+        cantidad_tolerancias=tolerancia.sum(axis=1),
+        dias_sin_marcar=dias_sin_marcar,
+        faltas_calculadas=faltas_calculadas,
+        cantidad_faltas=cantidad_faltas,
+        total_tardanza=total_tardanza,
+        total_ausencia=total_ausencia,
+    )
+
+
+def _totales(n_empleados: int, empleado_idx: List[int], ingresos: List[Any], salidas: List[Any]) -> Tuple[np.ndarray, np.ndarray]:
+    """Suma por empleado los minutos de tardanza (> 0) y de salida temprana (< 0)."""
+    if not empleado_idx:
+        vacio = np.zeros(n_empleados, dtype=np.int64)
+        return vacio, vacio.copy()
+
+    idx = np.asarray(empleado_idx, dtype=np.intp)
+    ingresos_arr = np.asarray(ingresos)
+    salidas_arr = np.asarray(salidas)
+
+    def sumar(valores: np.ndarray) -> np.ndarray:
+        suma = np.bincount(idx, weights=valores, minlength=n_empleados)
+        # Con diferencias enteras el total también es entero
+        return suma.astype(np.int64) if valores.dtype.kind in "iub" else suma
+
+    return (sumar(np.where(ingresos_arr > 0, ingresos_arr, 0)),
+            sumar(np.where(salidas_arr < 0, salidas_arr, 0)))
+
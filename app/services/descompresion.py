@@ -0,0 +1,161 @@
+import zlib
+from typing import AsyncIterator, List, Optional
+
+from fastapi import HTTPException, Request
+
+from config import settings
+
+try:
+    import zstandard
+except ImportError:  # zstd es opcional: sin el paquete solo se acepta gzip
+    zstandard = None
+
+CODIFICACION_IDENTIDAD = "identity"
+CODIFICACION_GZIP = "gzip"
+CODIFICACION_ZSTD = "zstd"
+
+# Tamaño máximo de cada bloque descomprimido que se entrega
+BYTES_POR_BLOQUE = 1024 * 1024
+
+# Máxima expansión posible de zstd: un bloque RLE de 4 bytes (cabecera y el
+# byte repetido) produce hasta 128 KB
+ZSTD_EXPANSION_MAXIMA = 32 * 1024
+
+
+def codificaciones_soportadas() -> List[str]:
+    """Valores de Content-Encoding aceptados en el cuerpo de las solicitudes."""
+    codificaciones = [CODIFICACION_GZIP]
+    if zstandard is not None:
+        codificaciones.append(CODIFICACION_ZSTD)
+    return codificaciones
+
+
+def _error_limite(max_bytes: int) -> HTTPException:
+    return HTTPException(
+        status_code=413,
+        detail=f"El cuerpo descomprimido supera el máximo de {max_bytes} bytes"
+    )
+
+
+def _error_datos(codificacion: str) -> HTTPException:
+    return HTTPException(
+        status_code=400,
+        detail=f"El cuerpo no es un contenido {codificacion} válido"
+    )
+
+
+class CuerpoSolicitud:
+    """
+    Cuerpo de una solicitud, descomprimido a medida que llega según su
+    Content-Encoding (gzip, o zstd si el paquete zstandard está instalado).
+
+    Cada paso de la descompresión produce como mucho lo que falta para llegar
+    a max_bytes (o BYTES_POR_BLOQUE, si es mayor) y se corta con 413 apenas se
+    pasa del límite, así un cuerpo pequeño muy comprimido no puede agotar la
+    memoria. Un cuerpo truncado o corrupto se rechaza con 400. Los cuerpos sin
+    comprimir se leen como antes.
+    """
+
+    def __init__(self, req: Request, max_bytes: Optional[int] = None):
+        """
+        Args:
+            req: Solicitud cuyo cuerpo se lee
+            max_bytes: Tamaño máximo del cuerpo descomprimido
+                (SOLICITUD_MAX_BYTES_DESCOMPRIMIDOS si no se indica)
+
+        Raises:
+            HTTPException: 415 si la codificación no está soportada
+        """
+        codificacion = req.headers.get("content-encoding", "").strip().lower()
+        self.codificacion = codificacion or CODIFICACION_IDENTIDAD
+        if self.codificacion != CODIFICACION_IDENTIDAD and self.codificacion not in codificaciones_soportadas():
+            raise HTTPException(
+                status_code=415,
+                detail=f"Content-Encoding no soportado: {self.codificacion}. "
+                       f"Se acepta: {', '.join(codificaciones_soportadas())}"
+            )
+        self.max_bytes = max_bytes if max_bytes is not None else settings.SOLICITUD_MAX_BYTES_DESCOMPRIMIDOS
+        self.bytes_recibidos = 0
+        self.bytes_descomprimidos = 0
+        self._req = req
+
+    @property
+    def comprimido(self) -> bool:
+        return self.codificacion != CODIFICACION_IDENTIDAD
+
+    async def _recibir(self) -> AsyncIterator[bytes]:
+        async for chunk in self._req.stream():
+            self.bytes_recibidos += len(chunk)
+            yield chunk
+
+    async def _gzip(self) -> AsyncIterator[bytes]:
+        descompresor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        async for pendiente in self._recibir():
+            while True:
+                # Un cuerpo gzip puede tener varios miembros concatenados
+                if descompresor.eof and pendiente:
+                    descompresor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+                try:
+                    bloque = descompresor.decompress(
+                        pendiente, min(BYTES_POR_BLOQUE, self.max_bytes - self.bytes_descomprimidos + 1))
+                except zlib.error:
+                    raise _error_datos(CODIFICACION_GZIP)
+                pendiente = descompresor.unused_data if descompresor.eof else descompresor.unconsumed_tail
+                if not bloque and not pendiente:
+                    break
+                self.bytes_descomprimidos += len(bloque)
+                if self.bytes_descomprimidos > self.max_bytes:
+                    raise _error_limite(self.max_bytes)
+                if bloque:
+                    yield bloque
+        if self.bytes_recibidos and not descompresor.eof:
+            raise _error_datos(CODIFICACION_GZIP)
+
+    async def _zstd(self) -> AsyncIterator[bytes]:
+        descompresor = zstandard.ZstdDecompressor().decompressobj()
+        async for chunk in self._recibir():
+            pendiente = memoryview(chunk)
+            while pendiente:
+                # Un cuerpo zstd puede tener varios frames concatenados
+                if descompresor.eof:
+                    descompresor = zstandard.ZstdDecompressor().decompressobj()
+                # decompress no acepta un tamaño máximo de salida: se le entrega
+                # solo la entrada que, aun con la expansión máxima, no puede
+                # producir más de lo que falta para el límite
+                porcion = max(self.max_bytes - self.bytes_descomprimidos,
+                              BYTES_POR_BLOQUE) // ZSTD_EXPANSION_MAXIMA
+                try:
+                    bloque = descompresor.decompress(pendiente[:porcion])
+                except zstandard.ZstdError:
+                    raise _error_datos(CODIFICACION_ZSTD)
+                pendiente = pendiente[porcion:]
+                if descompresor.eof and descompresor.unused_data:
+                    pendiente = memoryview(descompresor.unused_data + pendiente)
+                self.bytes_descomprimidos += len(bloque)
+                if self.bytes_descomprimidos > self.max_bytes:
+                    raise _error_limite(self.max_bytes)
+                if bloque:
+                    yield bloque
+        if self.bytes_recibidos and not descompresor.eof:
+            raise _error_datos(CODIFICACION_ZSTD)
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        """Bloques del cuerpo ya descomprimidos, a medida que llegan."""
+        if self.codificacion == CODIFICACION_GZIP:
+            bloques = self._gzip()
+        elif self.codificacion == CODIFICACION_ZSTD:
+            bloques = self._zstd()
+        else:
+            bloques = self._recibir()
+        async for bloque in bloques:
+            if not self.comprimido:
+                self.bytes_descomprimidos += len(bloque)
+            yield bloque
+
+    async def leer(self) -> bytes:
+        """Lee el cuerpo completo descomprimido."""
+        if not self.comprimido:
+            cuerpo = await self._req.body()
+            self.bytes_recibidos = self.bytes_descomprimidos = len(cuerpo)
+            return cuerpo
+        return b"".join([bloque async for bloque in self])
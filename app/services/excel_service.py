@@ -1,16 +1,46 @@
 from config import settings
 from utils.formatters import formatear_dias_teletrabajo
+from utils.fechas import formatear_timestamp
+from services.asistencia_engine import (
+    MatrizAsistencia, calcular_asistencia, MARGEN_TOLERANCIA,
+    CLASE_SIN_MARCA, CLASE_ROJO, CLASE_AMARILLO, CLASE_VERDE, CLASE_TELETRABAJO
+)
+from services.render_pool import ejecutar_en_pool
+from utils.metricas import Cronometro
+from models.schemas import EmpleadoMarcaciones
+from pydantic import ValidationError
 import openpyxl
 from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
+from openpyxl.styles.cell_style import StyleArray
 from openpyxl.utils import get_column_letter
-from datetime import datetime, timedelta
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.drawing.spreadsheet_drawing import SpreadsheetDrawing
+from openpyxl.worksheet._writer import WorksheetWriter
+from openpyxl.packaging.relationship import RelationshipList
+from openpyxl.xml.functions import xmlfile
+from openpyxl.writer.excel import ExcelWriter
+from datetime import date, datetime, timedelta
+from functools import lru_cache, partial
+from zipfile import ZipFile, ZipInfo, ZIP_DEFLATED, ZIP_STORED
+import asyncio
 import sys
 import io
 import os
-from typing import List, Dict, Any, Optional
+import pickle
+import shutil
+import time
+import zlib
+from copy import copy
+from dataclasses import dataclass, field
+from collections.abc import Sized
+from itertools import islice
+import logging
+from typing import BinaryIO, Callable, Iterable, Iterator, List, Dict, Any, Optional, Tuple
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+logger = logging.getLogger(__name__)
+
 
 COLOR_ROJO = PatternFill(start_color="FF0000",
                          end_color="FF0000", fill_type="solid")
@@ -30,7 +60,11 @@ COLOR_AMARILLO = PatternFill(
     # Amarillo para tolerancia
     start_color="FFFF00", end_color="FFFF00", fill_type="solid")
 
-MARGEN_TOLERANCIA = 5
+# Nombres en español para los encabezados de fecha (independiente del locale)
+MESES = ("", "ENERO", "FEBRERO", "MARZO", "ABRIL", "MAYO", "JUNIO", "JULIO",
+         "AGOSTO", "SEPTIEMBRE", "OCTUBRE", "NOVIEMBRE", "DICIEMBRE")
+NOMBRES_DIAS = ("LUNES", "MARTES", "MIÉRCOLES",
+                "JUEVES", "VIERNES", "SÁBADO", "DOMINGO")
 
 DIAS_SEMANA_MAP = {
     0: "lun",  # Lunes
@@ -42,662 +76,1386 @@ DIAS_SEMANA_MAP = {
     6: "dom"   # Domingo
 }
 
+ENCABEZADOS = [
+    "N.", "DNI", "TRABAJADOR", "FECHA INGRESO", "FECHA DE CESE", "CARGO",
+    "AREA", "GERENCIA", "ESTADO", "REGISTRO", "DIAS DE LABORES", "DSO",
+    "HORARIO OFICIAL", "DÍAS DE TELETRABAJO JD 2025"
+]
+
+# Columnas de cantidades y totales, a continuación de las columnas de fechas
+ENCABEZADOS_TOTALES = [
+    "CANT. TARDANZAS", "CANT. TOLERANCIAS", "CANT. FALTAS",
+    "TOTAL DE MINUTOS DE TARDANZA", "TOTAL DE MINUTOS DE AUSENCIA"
+]
+
+# Subcolumnas de cada fecha
+COLUMNAS_FECHA = ["ING", "TAR", "SALIDA", "EXT"]
+
+MODO_NORMAL = "normal"
+MODO_STREAMING = "streaming"
+MODO_AUTO = "auto"
+MODOS_ESCRITURA = (MODO_NORMAL, MODO_STREAMING, MODO_AUTO)
+
+# Motor que escribe el xlsx: openpyxl o el escritor XML directo (xlsx_nativo)
+BACKEND_OPENPYXL = "openpyxl"
+BACKEND_NATIVO = "nativo"
+BACKENDS = (BACKEND_OPENPYXL, BACKEND_NATIVO)
+
+# Perfiles de compresión del zip: perfil -> (método, nivel de deflate). Con
+# nivel None se usa el nivel por defecto de zlib
+COMPRESION_SIN = "stored"
+COMPRESION_RAPIDA = "fast"
+COMPRESION_NORMAL = "default"
+COMPRESION_MAXIMA = "max"
+PERFILES_COMPRESION = {
+    COMPRESION_SIN: (ZIP_STORED, None),
+    COMPRESION_RAPIDA: (ZIP_DEFLATED, 1),
+    COMPRESION_NORMAL: (ZIP_DEFLATED, None),
+    COMPRESION_MAXIMA: (ZIP_DEFLATED, 9),
+}
+
+# Etapas del renderizado que se miden con un Cronometro (ver utils.metricas):
+# armado de filas, volcado de celdas con estilo, escritura del zip y, cuando
+# el reporte se genera en el pool, la espera y el envío entre procesos
+ETAPA_FILAS = "filas"
+ETAPA_ESTILOS = "estilos"
+ETAPA_GUARDADO = "guardado"
+ETAPA_POOL = "pool"
+
+# Rangos de hasta esta cantidad de días van en una sola hoja; los más largos
+# se dividen en una hoja por mes calendario
+MAX_DIAS_POR_HOJA = 31
+
+# Fechas fijas del documento y de las entradas del zip: el mismo reporte debe
+# producir siempre los mismos bytes (ver ETag en la API)
+FECHA_DOCUMENTO = datetime(2025, 1, 1)
+FECHA_ENTRADAS_ZIP = (2025, 1, 1, 0, 0, 0)
+
+# Las filas 2 a 6 del encabezado se combinan hasta esta columna, por lo que el
+# borde de la tabla nunca es más angosto que ella.
+COLUMNA_MINIMA_BORDE = 50
+
+ALINEACION_CENTRO = Alignment(horizontal='center', vertical='center')
+
+THIN_BORDER = Border(
+    left=Side(style='thin', color='000000'),
+    right=Side(style='thin', color='000000'),
+    top=Side(style='thin', color='000000'),
+    bottom=Side(style='thin', color='000000')
+)
+
+FUENTE_BLANCA_NEGRITA = Font(color="FFFFFF", bold=True)
+FUENTE_NEGRITA = Font(bold=True)
+
+# Paleta fija de estilos combinados: nombre -> (relleno, fuente, alineación, borde).
+# Cada celda se escribe una sola vez con uno de estos estilos ya completos.
+ESTILOS = {
+    "titulo": (None, Font(size=14, bold=True), Alignment(horizontal='left'), None),
+    "subtitulo": (None, None, Alignment(horizontal='left'), None),
+    "encabezado": (COLOR_ENCABEZADO, FUENTE_BLANCA_NEGRITA, ALINEACION_CENTRO, THIN_BORDER),
+    # Celdas cubiertas por un rango combinado del encabezado
+    "encabezado_combinado": (COLOR_ENCABEZADO, FUENTE_BLANCA_NEGRITA, None, THIN_BORDER),
+    "plano": (None, None, None, THIN_BORDER),
+    "centrado": (None, None, ALINEACION_CENTRO, THIN_BORDER),
+    "teletrabajo": (COLOR_TELETRABAJO, None, ALINEACION_CENTRO, THIN_BORDER),
+    "nm": (COLOR_GRIS_CLARO, FUENTE_NEGRITA, ALINEACION_CENTRO, THIN_BORDER),
+    "rojo": (COLOR_ROJO, FUENTE_BLANCA_NEGRITA, ALINEACION_CENTRO, THIN_BORDER),
+    "amarillo": (COLOR_AMARILLO, FUENTE_NEGRITA, ALINEACION_CENTRO, THIN_BORDER),
+    "verde": (COLOR_VERDE, FUENTE_BLANCA_NEGRITA, ALINEACION_CENTRO, THIN_BORDER),
+}
+
+# Estilo de las celdas TAR/EXT según la clase calculada por el motor de asistencia
+ESTILO_POR_CLASE = {
+    CLASE_SIN_MARCA: "centrado",
+    CLASE_ROJO: "rojo",
+    CLASE_AMARILLO: "amarillo",
+    CLASE_VERDE: "verde",
+    CLASE_TELETRABAJO: "teletrabajo",
+}
+
+# Especificación de una celda antes de escribirla: (valor, nombre del estilo)
+CeldaSpec = Tuple[Any, Optional[str]]
+
+
+@dataclass
+class LayoutReporte:
+    """Distribución de columnas y fechas de un reporte para un rango dado."""
+    usar_fechas_dinamicas: bool
+    fechas_dias: List[Tuple[str, str]]
+    todas_fechas: List[Tuple[str, str]]
+    dia_semana_map: Dict[str, str]
+    fecha_col_map: Dict[str, int]
+    col_cant_tardanzas: int
+    col_cant_tolerancias: int
+    col_cant_faltas: int
+    col_total_tardanza: int
+    col_total_ausencia: int
+    total_columnas: int
+    columna_max_borde: int
+    # Fila de datos vacía con el estilo por defecto de cada columna
+    fila_base: List[CeldaSpec] = field(default_factory=list)
+    # Filas 1 a 10 ya armadas y rangos combinados del encabezado
+    filas_encabezado: Dict[int, List[CeldaSpec]] = field(default_factory=dict)
+    rangos_combinados: List[str] = field(default_factory=list)
+
+    def __post_init__(self):
+        if not self.fila_base:
+            primera_col_fecha = len(ENCABEZADOS) + 1
+            self.fila_base = [
+                (None, "centrado" if primera_col_fecha <= col <= self.total_columnas else "plano")
+                for col in range(1, self.columna_max_borde + 1)
+            ]
+        if not self.filas_encabezado:
+            self.filas_encabezado, self.rangos_combinados = _construir_encabezado(
+                self)
+
 
-async def generate_excel_report(empleados_data: List[Dict[str, Any]], fecha_inicio: Optional[str] = None, fecha_fin: Optional[str] = None) -> bytes:
+def registrar_paleta(wb: openpyxl.Workbook) -> Dict[str, StyleArray]:
     """
-    Genera un archivo Excel con las marcaciones de los empleados y lo devuelve como bytes.
+    Registra los estilos de ESTILOS en el workbook, siempre en el mismo orden.
+
+    Args:
+        wb: Workbook donde se escribirá el reporte
+
+    Returns:
+        Diccionario nombre -> StyleArray listo para asignarse a una celda
+    """
+    paleta = {}
+    for nombre, (relleno, fuente, alineacion, borde) in ESTILOS.items():
+        estilo = StyleArray()
+        if relleno is not None:
+            estilo.fillId = wb._fills.add(relleno)
+        if fuente is not None:
+            estilo.fontId = wb._fonts.add(fuente)
+        if alineacion is not None:
+            estilo.alignmentId = wb._alignments.add(alineacion)
+        if borde is not None:
+            estilo.borderId = wb._borders.add(borde)
+        wb._cell_styles.add(estilo)
+        paleta[nombre] = estilo
+    return paleta
+
+
+def _resolver_rango(fecha_inicio: Optional[str], fecha_fin: Optional[str]) -> Tuple[bool, Optional[datetime], Optional[datetime]]:
+    """
+    Valida el rango de fechas solicitado (sin límite de días).
+
+    Returns:
+        Tupla (usar_fechas_dinamicas, fecha_inicio_dt, fecha_fin_dt)
+    """
+    if not (fecha_inicio and fecha_fin):
+        logger.info(
+            "No se proporcionaron fechas completas. Usando fechas por defecto.")
+        return False, None, None
+
+    try:
+        fecha_inicio_dt = datetime.strptime(fecha_inicio, "%Y-%m-%d")
+        fecha_fin_dt = datetime.strptime(fecha_fin, "%Y-%m-%d")
+    except ValueError as e:
+        logger.warning(
+            "Error al parsear fechas: %s. Usando fechas por defecto.", e)
+        return False, None, None
+
+    if fecha_fin_dt < fecha_inicio_dt:
+        logger.warning(
+            "Fecha de fin anterior a fecha de inicio. Invirtiendo el rango.")
+        fecha_inicio_dt, fecha_fin_dt = fecha_fin_dt, fecha_inicio_dt
+
+    logger.debug("Generando reporte para %d días",
+                 (fecha_fin_dt - fecha_inicio_dt).days + 1)
+    return True, fecha_inicio_dt, fecha_fin_dt
+
+
+# Hoja del reporte: (título, fecha inicial, fecha final); las fechas son None
+# para el rango por defecto
+HojaReporte = Tuple[str, Optional[date], Optional[date]]
+
+
+def planificar_hojas(fecha_inicio: Optional[str] = None, fecha_fin: Optional[str] = None) -> List[HojaReporte]:
+    """
+    Divide el rango del reporte en hojas.
+
+    Un rango de hasta MAX_DIAS_POR_HOJA días va en una sola hoja; uno más largo
+    se divide en una hoja por mes calendario (el primer y el último mes pueden
+    quedar incompletos). El layout de cada hoja se obtiene con layout_hoja.
 
     Args:
-        empleados_data: Lista de datos de empleados con sus marcaciones
         fecha_inicio: Fecha inicial en formato YYYY-MM-DD
         fecha_fin: Fecha final en formato YYYY-MM-DD
 
     Returns:
-        Bytes del archivo Excel generado
+        Lista de hojas (título, fecha inicial, fecha final), en orden
     """
-    try:
-        print(f"Generando Excel con {len(empleados_data)} empleados...")
-        print(f"Rango de fechas: {fecha_inicio} a {fecha_fin}")
-        print(f"Margen de tolerancia configurado: {MARGEN_TOLERANCIA} minutos")
-
-        if fecha_inicio and fecha_fin:
-            try:
-                fecha_inicio_dt = datetime.strptime(fecha_inicio, "%Y-%m-%d")
-                fecha_fin_dt = datetime.strptime(fecha_fin, "%Y-%m-%d")
-
-                if fecha_fin_dt < fecha_inicio_dt:
-                    print(
-                        "Advertencia: Fecha de fin anterior a fecha de inicio. Invirtiendo el rango.")
-                    fecha_inicio_dt, fecha_fin_dt = fecha_fin_dt, fecha_inicio_dt
-
-                delta_dias = (fecha_fin_dt - fecha_inicio_dt).days + 1
-                if delta_dias > 31:
-                    print(
-                        f"Advertencia: El rango de {delta_dias} días es muy amplio. Limitando a 31 días.")
-                    fecha_fin_dt = fecha_inicio_dt + timedelta(days=30)
-
-                print(
-                    f"Generando reporte para {(fecha_fin_dt - fecha_inicio_dt).days + 1} días")
-                usar_fechas_dinamicas = True
-            except ValueError as e:
-                print(
-                    f"Error al parsear fechas: {str(e)}. Usando fechas por defecto.")
-                usar_fechas_dinamicas = False
-        else:
-            print("No se proporcionaron fechas completas. Usando fechas por defecto.")
-            usar_fechas_dinamicas = False
-
-        wb = openpyxl.Workbook()
-        ws = wb.active
-        ws.title = settings.EXCEL_SHEET_TITLE
-
-        ws.merge_cells('A1:Z1')
-        ws['A1'] = "REPORTE DE CONTROL DE MARCACIONES Y ASISTENCIA DEL PERSONAL"
-        ws['A1'].font = Font(size=14, bold=True)
-        ws['A1'].alignment = Alignment(horizontal='left')
-
-        subtitulos = [
-            "Gestión del Talento Humano",
-            "MADRID INGENIEROS SAC",
-            "Horario General: 08:30 AM - 6:30 PM",
-            "Horario Área de Ventas: 09:00AM - 07:00PM",
-            "Horario Practicantes Pre (08:30AM - 03:30PM)"
+    usar_fechas_dinamicas, fecha_inicio_dt, fecha_fin_dt = _resolver_rango(
+        fecha_inicio, fecha_fin)
+
+    if not usar_fechas_dinamicas:
+        return [(settings.EXCEL_SHEET_TITLE, None, None)]
+
+    inicio, fin = fecha_inicio_dt.date(), fecha_fin_dt.date()
+    if (fin - inicio).days + 1 <= MAX_DIAS_POR_HOJA:
+        return [(settings.EXCEL_SHEET_TITLE, inicio, fin)]
+
+    hojas = []
+    inicio_mes = inicio
+    while inicio_mes <= fin:
+        siguiente_mes = date(inicio_mes.year + inicio_mes.month // 12,
+                             inicio_mes.month % 12 + 1, 1)
+        fin_mes = min(siguiente_mes - timedelta(days=1), fin)
+        hojas.append(
+            (f"{MESES[inicio_mes.month]} {inicio_mes.year}", inicio_mes, fin_mes))
+        inicio_mes = siguiente_mes
+
+    logger.info("El rango de %d días se divide en %d hojas mensuales",
+                (fin - inicio).days + 1, len(hojas))
+    return hojas
+
+
+def layout_hoja(hoja: HojaReporte) -> LayoutReporte:
+    """
+    Layout (fechas, columnas y encabezado ya armado) de una hoja del reporte,
+    tomado de un caché LRU por rango.
+    """
+    _, fecha_inicio, fecha_fin = hoja
+    return _layout_para_rango(fecha_inicio, fecha_fin)
+
+
+def cantidad_dias(fecha_inicio: Optional[str] = None, fecha_fin: Optional[str] = None) -> int:
+    """Cantidad de días que cubre el reporte, sumando los de todas sus hojas."""
+    return sum(len(layout_hoja(hoja).todas_fechas)
+               for hoja in planificar_hojas(fecha_inicio, fecha_fin))
+
+
+def layout_rango(fecha_inicio: Optional[str] = None, fecha_fin: Optional[str] = None) -> LayoutReporte:
+    """
+    Layout de todo el rango solicitado en una sola tabla, sin dividirlo en
+    hojas mensuales (lo usan las salidas de datos, que no tienen hojas).
+    """
+    usar_fechas_dinamicas, fecha_inicio_dt, fecha_fin_dt = _resolver_rango(
+        fecha_inicio, fecha_fin)
+    if not usar_fechas_dinamicas:
+        return _layout_para_rango(None, None)
+    return _layout_para_rango(fecha_inicio_dt.date(), fecha_fin_dt.date())
+
+
+@lru_cache(maxsize=settings.EXCEL_CACHE_LAYOUTS)
+def _layout_para_rango(fecha_inicio: Optional[date], fecha_fin: Optional[date]) -> LayoutReporte:
+    """
+    Construye el layout de un rango ya normalizado (None, None para las fechas
+    por defecto). El resultado se comparte entre solicitudes y no se modifica.
+    """
+    fechas_dias = []
+    fecha_col_map = {}
+    dia_semana_map = {}  # Para mapear fecha ISO con el día de la semana
+
+    # Crear mapeo de fechas a días de la semana
+    todas_fechas = []
+
+    if fecha_inicio is not None:
+        fecha_actual = fecha_inicio
+        while fecha_actual <= fecha_fin:
+            fecha_iso = fecha_actual.isoformat()
+
+            # Guardar el día de la semana de cada fecha
+            dia_semana = DIAS_SEMANA_MAP[fecha_actual.weekday()]
+            dia_semana_map[fecha_iso] = dia_semana
+            todas_fechas.append((fecha_iso, dia_semana))
+
+            fecha_mostrar = f"{fecha_actual.day:02d} {MESES[fecha_actual.month]} {fecha_actual.year}"
+            fechas_dias.append(
+                (fecha_mostrar, NOMBRES_DIAS[fecha_actual.weekday()]))
+
+            fecha_col_map[fecha_iso] = len(ENCABEZADOS) + 1 + 4 * (len(todas_fechas) - 1)
+            fecha_actual += timedelta(days=1)
+    else:
+        fechas_dias = [
+            ("03 FEBRERO 2025", "LUNES"), ("04 FEBRERO 2025",
+                                           "MARTES"), ("05 FEBRERO 2025", "MIÉRCOLES"),
+            ("06 FEBRERO 2025", "JUEVES"), ("07 FEBRERO 2025",
+                                            "VIERNES"), ("08 FEBRERO 2025", "SÁBADO"),
+            ("09 FEBRERO 2025", "DOMINGO"), ("10 FEBRERO 2025",
+                                             "LUNES"), ("11 FEBRERO 2025", "MARTES"),
+            ("12 FEBRERO 2025", "MIÉRCOLES"), ("13 FEBRERO 2025",
+                                               "JUEVES"), ("14 FEBRERO 2025", "VIERNES")
+        ]
+
+        # Para fechas estáticas, mapear manualmente
+        dias_mapeo = [
+            ("2025-02-03", "lun"), ("2025-02-04", "mar"), ("2025-02-05", "mie"),
+            ("2025-02-06", "jue"), ("2025-02-07",
+                                    "vier"), ("2025-02-08", "sab"),
+            ("2025-02-09", "dom"), ("2025-02-10", "lun"), ("2025-02-11", "mar"),
+            ("2025-02-12", "mie"), ("2025-02-13", "jue"), ("2025-02-14", "vier")
         ]
-        for idx, texto in enumerate(subtitulos, start=2):
-            ws.merge_cells(start_row=idx, start_column=1,
-                           end_row=idx, end_column=50)
-            ws.cell(row=idx, column=1, value=texto).alignment = Alignment(
-                horizontal='left')
-
-        encabezados = [
-            "N.", "DNI", "TRABAJADOR", "FECHA INGRESO", "FECHA DE CESE", "CARGO",
-            "AREA", "GERENCIA", "ESTADO", "REGISTRO", "DIAS DE LABORES", "DSO",
-            "HORARIO OFICIAL", "DÍAS DE TELETRABAJO JD 2025"
+        todas_fechas = dias_mapeo
+        for i, (fecha, dia) in enumerate(dias_mapeo):
+            dia_semana_map[fecha] = dia
+            fecha_col_map[fecha] = len(ENCABEZADOS) + 1 + 4 * i
+
+    # Las columnas de fechas empiezan después de los 14 encabezados fijos
+    col = len(ENCABEZADOS) + 1 + 4 * len(fechas_dias)
+
+    return LayoutReporte(
+        usar_fechas_dinamicas=fecha_inicio is not None,
+        fechas_dias=fechas_dias,
+        todas_fechas=todas_fechas,
+        dia_semana_map=dia_semana_map,
+        fecha_col_map=fecha_col_map,
+        col_cant_tardanzas=col,
+        col_cant_tolerancias=col + 1,
+        col_cant_faltas=col + 2,
+        col_total_tardanza=col + 3,
+        col_total_ausencia=col + 4,
+        total_columnas=col + 4,
+        columna_max_borde=max(col + 4, COLUMNA_MINIMA_BORDE)
+    )
+
+
+def _construir_encabezado(layout: LayoutReporte) -> Tuple[Dict[int, List[CeldaSpec]], List[str]]:
+    """
+    Arma las filas 1 a 10 del reporte (título, subtítulos y encabezados de columnas).
+
+    Returns:
+        Tupla (filas, rangos combinados) donde filas mapea fila -> lista de celdas
+    """
+    filas = {fila: [] for fila in range(1, 8)}
+    rangos_combinados = ['A1:Z1']
+
+    filas[1] = [
+        ("REPORTE DE CONTROL DE MARCACIONES Y ASISTENCIA DEL PERSONAL", "titulo")]
+
+    subtitulos = [
+        "Gestión del Talento Humano",
+        "MADRID INGENIEROS SAC",
+        "Horario General: 08:30 AM - 6:30 PM",
+        "Horario Área de Ventas: 09:00AM - 07:00PM",
+        "Horario Practicantes Pre (08:30AM - 03:30PM)"
+    ]
+    for idx, texto in enumerate(subtitulos, start=2):
+        rangos_combinados.append(
+            f"A{idx}:{get_column_letter(COLUMNA_MINIMA_BORDE)}{idx}")
+        filas[idx] = [(texto, "subtitulo")]
+
+    # Todas las celdas de encabezado llevan fondo azul y fuente blanca en negrita;
+    # las que quedan fuera de la tabla solo llevan el borde
+    for fila in range(8, 11):
+        filas[fila] = [
+            (None, "encabezado_combinado" if col <= layout.total_columnas else "plano")
+            for col in range(1, layout.columna_max_borde + 1)
         ]
-        col = 1
-        for encabezado in encabezados:
-            ws.merge_cells(start_row=8, start_column=col,
-                           end_row=10, end_column=col)
-            ws.cell(row=8, column=col, value=encabezado).alignment = Alignment(
-                horizontal='center', vertical='center')
-            col += 1
-
-        fechas_dias = []
-        fecha_col_map = {}
-        dia_semana_map = {}  # Para mapear fecha ISO con el día de la semana
-        # Diccionario para rastrear las columnas que son TAR o EXT
-        columnas_tardanza_extension = {}
-
-        # Crear mapeo de fechas a días de la semana
-        todas_fechas = []
-
-        if usar_fechas_dinamicas:
-            fecha_actual = fecha_inicio_dt
-            while fecha_actual <= fecha_fin_dt:
-                dias_semana = ["LUNES", "MARTES", "MIÉRCOLES",
-                               "JUEVES", "VIERNES", "SÁBADO", "DOMINGO"]
-                dia_nombre = dias_semana[fecha_actual.weekday()]
-                fecha_iso = fecha_actual.strftime("%Y-%m-%d")
-
-                # Guardar el día de la semana de cada fecha
-                dia_semana = DIAS_SEMANA_MAP[fecha_actual.weekday()]
-                dia_semana_map[fecha_iso] = dia_semana
-                todas_fechas.append((fecha_iso, dia_semana))
-
-                fecha_mostrar = fecha_actual.strftime("%d %B %Y").upper()
-                mes_espanol = {
-                    "JANUARY": "ENERO", "FEBRUARY": "FEBRERO", "MARCH": "MARZO",
-                    "APRIL": "ABRIL", "MAY": "MAYO", "JUNE": "JUNIO",
-                    "JULY": "JULIO", "AUGUST": "AGOSTO", "SEPTEMBER": "SEPTIEMBRE",
-                    "OCTOBER": "OCTUBRE", "NOVEMBER": "NOVIEMBRE", "DECEMBER": "DICIEMBRE"
-                }
-
-                for eng, esp in mes_espanol.items():
-                    fecha_mostrar = fecha_mostrar.replace(eng, esp)
-
-                fechas_dias.append((fecha_mostrar, dia_nombre))
-                fecha_actual += timedelta(days=1)
+
+    def _encabezado(fila, col, valor):
+        filas[fila][col - 1] = (valor, "encabezado")
+
+    for col, encabezado in enumerate(ENCABEZADOS, start=1):
+        rangos_combinados.append(
+            f"{get_column_letter(col)}8:{get_column_letter(col)}10")
+        _encabezado(8, col, encabezado)
+
+    for (fecha, dia), col in zip(layout.fechas_dias, layout.fecha_col_map.values()):
+        letra_inicio = get_column_letter(col)
+        letra_fin = get_column_letter(col + 3)
+        rangos_combinados.append(f"{letra_inicio}8:{letra_fin}8")
+        _encabezado(8, col, fecha)
+        rangos_combinados.append(f"{letra_inicio}9:{letra_fin}9")
+        _encabezado(9, col, dia)
+
+        for j, sub in enumerate(COLUMNAS_FECHA):
+            _encabezado(10, col + j, sub)
+
+    # Encabezados de las columnas de cantidades y totales
+    for col, titulo in enumerate(ENCABEZADOS_TOTALES, start=layout.col_cant_tardanzas):
+        letra = get_column_letter(col)
+        rangos_combinados.append(f"{letra}8:{letra}10")
+        _encabezado(8, col, titulo)
+
+    return filas, rangos_combinados
+
+
+def datos_empleado(idx: int, empleado: EmpleadoMarcaciones, estado: str) -> List[CeldaSpec]:
+    """
+    Celdas de identificación del empleado (columnas N. a ESTADO), comunes al
+    reporte detallado y al resumen.
+
+    Args:
+        idx: Número correlativo del empleado en el reporte
+        empleado: Datos del empleado
+        estado: Estado calculado por el motor de asistencia
+
+    Returns:
+        Lista de nueve celdas con su estilo
+    """
+    first_name = empleado.first_name or ""
+    last_name = empleado.last_name or ""
+    nombre_completo = f"{first_name} {last_name}".strip()
+
+    return [
+        (idx, "plano"),
+        (empleado.emp_code, "plano"),
+        (nombre_completo if nombre_completo else "-", "plano"),
+        (formatear_timestamp(empleado.hire_date) or "-", "plano"),
+        (formatear_timestamp(empleado.fecha_cese) or "-", "plano"),
+        (empleado.position_name, "plano"),
+        (empleado.dept_name, "plano"),
+        (empleado.gerencia, "plano"),
+        (estado, "plano"),
+    ]
+
+
+def _construir_fila_empleado(idx: int, matriz: MatrizAsistencia, i: int, layout: LayoutReporte) -> List[CeldaSpec]:
+    """
+    Arma la fila de un empleado a partir de la clasificación ya calculada.
+
+    Args:
+        idx: Número correlativo del empleado en el reporte
+        matriz: Asistencia calculada del lote al que pertenece el empleado
+        i: Posición del empleado dentro del lote
+        layout: Distribución de columnas del reporte
+
+    Returns:
+        Lista de celdas de la fila, una por columna y con su estilo final
+    """
+    empleado = matriz.empleados[i]
+    fila = list(layout.fila_base)
+
+    identificacion = datos_empleado(idx, empleado, matriz.estados[i])
+    fila[:len(identificacion)] = identificacion
+    nombre_completo = identificacion[2][0]
+
+    # El esquema no trae el registro del empleado
+    fila[9] = ("-", "plano")
+
+    dias_labores = empleado.dias_labores
+    if dias_labores == "lun-vier":
+        fila[10] = ("LUNES A VIERNES", "plano")
+    else:
+        fila[10] = (dias_labores.upper() if dias_labores else "-", "plano")
+
+    dias_descanso = empleado.dias_descanso
+    if dias_descanso == "sab-dom":
+        fila[11] = ("S Y D", "plano")
+    else:
+        fila[11] = (dias_descanso.upper() if dias_descanso else "-", "plano")
+
+    if empleado.hora_ingreso and empleado.hora_salida:
+        horario = f"{empleado.hora_ingreso}AM - {empleado.hora_salida}PM"
+        fila[12] = (horario, "plano")
+    else:
+        fila[12] = ("-", "plano")
+
+    # Agregar los días de teletrabajo formateados
+    fila[13] = (formatear_dias_teletrabajo(empleado.dias_remoto), "plano")
+
+    # Celdas de cada día: solo se traduce la clasificación del motor a estilos
+    marcaciones = matriz.marcaciones[i]
+    teletrabajo = matriz.teletrabajo[i].tolist()
+    ingreso_nm = matriz.ingreso_nm[i].tolist()
+    salida_nm = matriz.salida_nm[i].tolist()
+    diferencia_ingreso = matriz.diferencia_ingreso[i].tolist()
+    diferencia_salida = matriz.diferencia_salida[i].tolist()
+    clase_tardanza = matriz.clase_tardanza[i].tolist()
+    clase_extension = matriz.clase_extension[i].tolist()
+
+    for dia, col_inicio in enumerate(layout.fecha_col_map.values()):
+        # Posición de la columna ING de esta fecha dentro de la fila
+        pos = col_inicio - 1
+        marcacion = marcaciones[dia]
+
+        if marcacion is None:
+            # Sin marcación: los días de teletrabajo llevan fondo gris claro
+            if teletrabajo[dia]:
+                fila[pos:pos + 4] = [(None, "teletrabajo")] * 4
+            continue
+
+        estilo_dia = "teletrabajo" if teletrabajo[dia] else "centrado"
+
+        # Si la hora es null se escribe "NM" con fondo gris
+        fila[pos] = ("NM", "nm") if ingreso_nm[dia] else (
+            marcacion.hora_ingreso, estilo_dia)
+        fila[pos + 1] = (str(diferencia_ingreso[dia]),
+                         ESTILO_POR_CLASE[clase_tardanza[dia]])
+        fila[pos + 2] = ("NM", "nm") if salida_nm[dia] else (
+            marcacion.hora_salida, estilo_dia)
+        fila[pos + 3] = (str(diferencia_salida[dia]),
+                         ESTILO_POR_CLASE[clase_extension[dia]])
+
+    # Las cantidades de tardanzas y tolerancias vienen del JSON (el esquema
+    # las inicializa en 0); las faltas se completan con los días sin marcar
+    cant_faltas = matriz.cantidad_faltas[i].item()
+    logger.debug("Empleado: %s, cantidad_faltas: %s, días sin marcar: %d",
+                 nombre_completo, empleado.cantidad_faltas, matriz.dias_sin_marcar[i])
+
+    fila[layout.col_cant_tardanzas - 1] = (empleado.cantidad_tardanzas, "centrado")
+    fila[layout.col_cant_tolerancias - 1] = (empleado.cantidad_tolerancias, "centrado")
+    fila[layout.col_cant_faltas - 1] = (cant_faltas, "centrado")
+
+    # Columnas de totales: rojo si hay minutos en contra, verde si no
+    total_tardanza = matriz.total_tardanza[i].item()
+    total_ausencia = matriz.total_ausencia[i].item()
+    fila[layout.col_total_tardanza - 1] = (
+        total_tardanza, "rojo" if total_tardanza > 0 else "verde")
+    fila[layout.col_total_ausencia - 1] = (
+        total_ausencia, "rojo" if total_ausencia < 0 else "verde")
+
+    return fila
+
+
+def _como_empleado(empleado: Any) -> Optional[EmpleadoMarcaciones]:
+    """
+    Devuelve el empleado como modelo; los diccionarios se validan una sola vez.
+
+    Returns:
+        Modelo del empleado, o None si no tiene emp_code o no es válido
+    """
+    if isinstance(empleado, dict):
+        if not empleado.get("emp_code"):
+            return None
+        try:
+            return EmpleadoMarcaciones.model_validate(empleado)
+        except ValidationError as e:
+            logger.warning("Empleado %s inválido: %s",
+                           empleado.get("emp_code"), e)
+            return None
+
+    if isinstance(empleado, EmpleadoMarcaciones) and empleado.emp_code:
+        return empleado
+    return None
+
+
+def asistencia_empleados(empleados_data: Iterable[Any], layout: LayoutReporte, progreso: Optional[Callable[[int], None]] = None, inicio: int = 0) -> Iterator[Tuple[int, MatrizAsistencia, int]]:
+    """
+    Recorre en orden los empleados válidos del reporte con su asistencia ya
+    calculada.
+
+    Args:
+        empleados_data: Empleados del reporte
+        layout: Distribución de columnas del reporte
+        progreso: Función opcional que recibe la cantidad de empleados ya procesados
+        inicio: Empleados que preceden a estos en el reporte (para la columna N.
+            cuando el reporte se renderiza por fragmentos)
+
+    Yields:
+        Tupla (número correlativo, matriz del lote, posición en el lote)
+    """
+    empleados_validos = (
+        e for e in map(_como_empleado, empleados_data) if e is not None)
+
+    # La clasificación se calcula por lotes para no retener todo el reporte
+    # en memoria cuando los empleados llegan como flujo
+    idx = inicio
+    for lote in _en_lotes(empleados_validos, settings.ASISTENCIA_LOTE_EMPLEADOS):
+        matriz = calcular_asistencia(lote, layout.todas_fechas)
+        for i in range(len(matriz)):
+            idx += 1
+            if progreso is not None:
+                progreso(idx)
+            yield idx, matriz, i
+
+
+def fila_empleado(idx: int, matriz: MatrizAsistencia, i: int, layout: LayoutReporte) -> Optional[List[CeldaSpec]]:
+    """
+    Fila del empleado tal como va en el reporte, o None si no pudo procesarse.
+    """
+    if matriz.fallidos[i]:
+        return None
+    try:
+        return _construir_fila_empleado(idx, matriz, i, layout)
+    except Exception as e:
+        logger.exception("Error procesando empleado %d: %s", idx, e)
+        return None
+
+
+def _filas_empleados(empleados_data: Iterable[Any], layout: LayoutReporte, progreso: Optional[Callable[[int], None]] = None, inicio: int = 0):
+    """
+    Genera, en orden, las filas de los empleados válidos del reporte.
+
+    Args:
+        empleados_data: Empleados del reporte
+        layout: Distribución de columnas del reporte
+        progreso: Función opcional que recibe la cantidad de empleados ya procesados
+        inicio: Empleados que preceden a estos en el reporte (para la columna N.
+            cuando el reporte se renderiza por fragmentos)
+
+    Yields:
+        Lista de celdas de cada empleado
+    """
+    for idx, matriz, i in asistencia_empleados(empleados_data, layout, progreso, inicio):
+        fila = fila_empleado(idx, matriz, i, layout)
+        # Los empleados que no pudieron procesarse quedan como fila vacía
+        yield fila if fila is not None else list(layout.fila_base)
+
+
+def _en_lotes(elementos: Iterable[Any], tamano: int) -> Iterator[List[Any]]:
+    """Agrupa un iterable en listas de hasta `tamano` elementos."""
+    iterador = iter(elementos)
+    while True:
+        lote = list(islice(iterador, max(tamano, 1)))
+        if not lote:
+            return
+        yield lote
+
+
+# Ancho de las columnas fijas (A a N)
+ANCHOS_ENCABEZADOS = (5, 12, 25, 15, 15, 20, 15, 10, 12, 12, 18, 10, 20, 20)
+
+
+def anchos_columnas(layout: LayoutReporte) -> List[Tuple[int, int]]:
+    """Ancho de las columnas fijas, de fechas y de totales, como (columna, ancho)."""
+    anchos = list(enumerate(ANCHOS_ENCABEZADOS, start=1))
+
+    # Columnas de fechas
+    anchos.extend((idx, 10) for idx in range(
+        len(ENCABEZADOS) + 1, layout.col_cant_tardanzas))
+
+    # Columnas de cantidades y totales
+    anchos.extend((idx, 15) for idx in range(
+        layout.col_cant_tardanzas, layout.total_columnas + 1))
+    return anchos
+
+
+def _configurar_anchos(ws, layout: LayoutReporte) -> None:
+    """Configura el ancho de las columnas fijas, de fechas y de totales."""
+    for idx, ancho in anchos_columnas(layout):
+        ws.column_dimensions[get_column_letter(idx)].width = ancho
+
+
+def resolver_modo_escritura(modo: Optional[str], cantidad_empleados: Optional[int], layout: LayoutReporte) -> str:
+    """
+    Decide si el reporte se escribe en memoria o en modo streaming.
+
+    Args:
+        modo: Modo solicitado ("normal", "streaming" o "auto"); None usa la configuración
+        cantidad_empleados: Cantidad de empleados a incluir en el reporte, o None
+            si llegan como flujo (se usa streaming)
+        layout: Distribución de columnas del reporte
+
+    Returns:
+        "normal" o "streaming"
+    """
+    modo = modo or settings.EXCEL_MODO_ESCRITURA
+    if modo not in MODOS_ESCRITURA:
+        raise ValueError(f"Modo de escritura no soportado: {modo}")
+
+    if modo == MODO_AUTO:
+        if cantidad_empleados is None:
+            return MODO_STREAMING
+        celdas = cantidad_empleados * layout.total_columnas
+        return MODO_STREAMING if celdas > settings.EXCEL_UMBRAL_STREAMING_CELDAS else MODO_NORMAL
+
+    return modo
+
+
+def resolver_backend(backend: Optional[str]) -> str:
+    """
+    Valida el motor de escritura solicitado.
+
+    Args:
+        backend: Motor solicitado ("openpyxl" o "nativo"); None usa la configuración
+
+    Returns:
+        "openpyxl" o "nativo"
+    """
+    backend = backend or settings.EXCEL_BACKEND
+    if backend not in BACKENDS:
+        raise ValueError(f"Backend de escritura no soportado: {backend}")
+    return backend
+
+
+def resolver_compresion(compresion: Optional[str]) -> str:
+    """
+    Valida el perfil de compresión solicitado.
+
+    Args:
+        compresion: Perfil solicitado ("stored", "fast", "default" o "max");
+            None usa la configuración
+
+    Returns:
+        Perfil validado
+    """
+    compresion = compresion or settings.EXCEL_COMPRESION
+    if compresion not in PERFILES_COMPRESION:
+        raise ValueError(f"Perfil de compresión no soportado: {compresion}")
+    return compresion
+
+
+def _escribir_normal(empleados_data: List[EmpleadoMarcaciones], layout: LayoutReporte, progreso: Optional[Callable[[int], None]] = None, cronometro: Optional[Cronometro] = None) -> openpyxl.Workbook:
+    """
+    Escribe el reporte en un workbook completo en memoria.
+
+    Con un cronómetro, el armado de las filas se suma a la etapa "filas" y el
+    volcado de celdas con su estilo a la etapa "estilos".
+    """
+    cronometro = cronometro or Cronometro()
+    filas = cronometro.medir_iterador(
+        _filas_empleados(empleados_data, layout, progreso), ETAPA_FILAS)
+    with cronometro.etapa(ETAPA_ESTILOS, excluir=(ETAPA_FILAS,)):
+        return _libro_normal(filas, layout)
+
+
+def _libro_normal(filas_empleados: Iterable[List[CeldaSpec]], layout: LayoutReporte) -> openpyxl.Workbook:
+    """Vuelca el encabezado y las filas ya armadas, con su estilo, en un workbook nuevo."""
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = settings.EXCEL_SHEET_TITLE
+    paleta = registrar_paleta(wb)
+
+    for rango in layout.rangos_combinados:
+        ws.merge_cells(rango)
+
+    def _escribir_fila(fila_idx, fila):
+        for col, (valor, estilo) in enumerate(fila, 1):
+            celda = ws.cell(row=fila_idx, column=col)
+            if valor is not None:
+                celda.value = valor
+            celda._style = copy(paleta[estilo])
+
+    for fila_idx, fila in layout.filas_encabezado.items():
+        _escribir_fila(fila_idx, fila)
+
+    fila_actual = 11
+    for fila in filas_empleados:
+        _escribir_fila(fila_actual, fila)
+        fila_actual += 1
+
+    _configurar_anchos(ws, layout)
+    return wb
+
+
+def _escribir_streaming(empleados_data: Iterable[EmpleadoMarcaciones], layout: LayoutReporte, progreso: Optional[Callable[[int], None]] = None, cronometro: Optional[Cronometro] = None) -> Tuple[openpyxl.Workbook, Iterator[List[WriteOnlyCell]]]:
+    """
+    Prepara el reporte en un workbook de solo escritura.
+
+    Las filas no se agregan aquí: se devuelven como un generador que
+    _guardar_streaming consume mientras escribe la hoja dentro del zip, de modo
+    que cada fila se arma, se comprime y se libera antes de pasar a la siguiente.
+    Con un cronómetro, el generador suma el armado de cada fila a la etapa
+    "filas" y la creación de sus celdas con estilo a "estilos".
+
+    Returns:
+        Tupla (workbook, generador de filas de la hoja)
+    """
+    cronometro = cronometro or Cronometro()
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet(title=settings.EXCEL_SHEET_TITLE)
+    paleta = registrar_paleta(wb)
+
+    # En modo solo escritura los anchos deben definirse antes de la primera fila
+    _configurar_anchos(ws, layout)
+
+    for rango in layout.rangos_combinados:
+        ws.merged_cells.add(rango)
+
+    def _filas():
+        for fila in layout.filas_encabezado.values():
+            yield _celdas_solo_escritura(ws, paleta, fila)
+
+        filas = _filas_empleados(empleados_data, layout, progreso)
+        for fila in cronometro.medir_iterador(filas, ETAPA_FILAS):
+            with cronometro.etapa(ETAPA_ESTILOS):
+                celdas = _celdas_solo_escritura(ws, paleta, fila)
+            yield celdas
+
+    return wb, _filas()
+
+
+def _celdas_solo_escritura(ws, paleta: Dict[str, StyleArray], fila: List[CeldaSpec]) -> List[WriteOnlyCell]:
+    """Convierte una fila armada en celdas de una hoja de solo escritura."""
+    celdas = []
+    for valor, estilo in fila:
+        celda = WriteOnlyCell(ws, value=valor)
+        celda._style = copy(paleta[estilo])
+        celdas.append(celda)
+    return celdas
+
+
+class _ExcelWriterFilasDiferidas(ExcelWriter):
+    """
+    ExcelWriter que escribe las filas de la hoja de solo escritura directamente
+    en su entrada del zip, en lugar de pasar por un archivo temporal.
+    """
+
+    def __init__(self, workbook, archive, filas):
+        super().__init__(workbook, archive)
+        self._filas = filas
+
+    def write_worksheet(self, ws):
+        ws._drawing = SpreadsheetDrawing()
+        ws._drawing.charts = ws._charts
+        ws._drawing.images = ws._images
+
+        with self._archive.open(ws.path[1:], "w") as destino:
+            _volcar_hoja(ws, self._filas, destino)
+
+        ws._rels = ws._writer._rels
+        self.manifest.append(ws)
+
+
+class _ExcelWriterHojasComprimidas(ExcelWriter):
+    """
+    ExcelWriter que copia al zip hojas ya serializadas y comprimidas: para cada
+    hoja del workbook, en el mismo orden, la lista de sus fragmentos.
+    """
+
+    def __init__(self, workbook, archive, hojas):
+        super().__init__(workbook, archive)
+        self._hojas = hojas
+
+    def write_worksheet(self, ws):
+        ws._drawing = SpreadsheetDrawing()
+        ws._drawing.charts = ws._charts
+        ws._drawing.images = ws._images
+
+        self._archive.escribir_comprimido(ws.path[1:], self._hojas[ws._id - 1])
+
+        ws._rels = RelationshipList()
+        self.manifest.append(ws)
+
+
+def _volcar_hoja(ws, filas: Iterable[List[WriteOnlyCell]], destino: BinaryIO) -> None:
+    """Escribe el XML de una hoja de solo escritura, fila por fila, en el destino."""
+    ws._writer = WorksheetWriter(ws, out=destino)
+    ws._writer.write_top()
+    for fila in filas:
+        ws.append(fila)
+    ws.close()
+
+
+class _EscritorFilas(WorksheetWriter):
+    """WorksheetWriter que solo escribe elementos <row>, sin el resto de la hoja."""
+
+    def __init__(self, ws):
+        self.ws = ws
+
+
+@dataclass
+class FragmentoHoja:
+    """
+    Parte del XML de una hoja comprimida con deflate.
+
+    Salvo el último, los fragmentos terminan con un Z_SYNC_FLUSH, así que una
+    hoja se arma concatenando sus fragmentos comprimidos tal cual.
+    """
+    datos: bytes
+    crc: int
+    tamano: int
+
+
+class _CompresorHoja:
+    """
+    Flujo de escritura que comprime XML a medida que llega, con los mismos
+    parámetros que usa zipfile para el perfil de compresión indicado (con
+    "stored" el XML se guarda tal cual).
+    """
+
+    def __init__(self, compresion: str = COMPRESION_NORMAL):
+        metodo, nivel = PERFILES_COMPRESION[compresion]
+        self._compresor = None
+        if metodo == ZIP_DEFLATED:
+            self._compresor = zlib.compressobj(
+                zlib.Z_DEFAULT_COMPRESSION if nivel is None else nivel, zlib.DEFLATED, -15)
+        self._partes = []
+        self._crc = 0
+        self._tamano = 0
+
+    def write(self, datos) -> int:
+        self._crc = zlib.crc32(datos, self._crc)
+        self._tamano += len(datos)
+        self._partes.append(bytes(datos) if self._compresor is None
+                            else self._compresor.compress(datos))
+        return len(datos)
+
+    def flush(self) -> None:
+        pass
+
+    def resultado(self, final: bool = False) -> FragmentoHoja:
+        """Cierra el fragmento; solo el último de la hoja lleva final=True."""
+        if self._compresor is not None:
+            self._partes.append(self._compresor.flush(
+                zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH))
+        return FragmentoHoja(b"".join(self._partes), self._crc, self._tamano)
+
+
+def _comprimir(datos: bytes, final: bool = False, compresion: str = COMPRESION_NORMAL) -> FragmentoHoja:
+    compresor = _CompresorHoja(compresion)
+    compresor.write(datos)
+    return compresor.resultado(final)
+
+
+def _combinar_crc(crc_inicial: int, crc_siguiente: int, tamano_siguiente: int) -> int:
+    """
+    CRC32 de la concatenación de dos bloques a partir de los CRC de cada uno.
+
+    CRC32 es afín sobre GF(2), por lo que crc(A + B) = crc(B) xor crc(0ⁿ, crc(A))
+    xor crc(0ⁿ), con n = len(B).
+    """
+    ceros = bytes(min(tamano_siguiente, 1 << 16))
+    desde_inicial, desde_cero = crc_inicial, 0
+    restantes = tamano_siguiente
+    while restantes:
+        bloque = ceros[:min(restantes, len(ceros))]
+        desde_inicial = zlib.crc32(bloque, desde_inicial)
+        desde_cero = zlib.crc32(bloque, desde_cero)
+        restantes -= len(bloque)
+    return crc_siguiente ^ desde_inicial ^ desde_cero
+
+
+class _SinCompresion:
+    """Compresor nulo: los datos ya llegan comprimidos."""
+
+    def compress(self, datos):
+        return datos
+
+    def flush(self):
+        return b""
+
+
+class _ZipDeterminista(ZipFile):
+    """
+    ZipFile que graba todas sus entradas con la misma fecha, para que el mismo
+    reporte produzca siempre los mismos bytes (writestr usaría la hora actual).
+    """
+
+    def writestr(self, zinfo_or_arcname, data, compress_type=None, compresslevel=None):
+        if not isinstance(zinfo_or_arcname, ZipInfo):
+            zinfo = ZipInfo(zinfo_or_arcname, date_time=FECHA_ENTRADAS_ZIP)
+            zinfo.compress_type = self.compression
+            zinfo._compresslevel = self.compresslevel
+            zinfo.external_attr = 0o600 << 16
+            zinfo_or_arcname = zinfo
+        super().writestr(zinfo_or_arcname, data, compress_type, compresslevel)
+
+    def write(self, filename, arcname=None, compress_type=None, compresslevel=None):
+        # La hoja del modo normal se copia desde un archivo temporal; write
+        # tomaría la fecha de modificación de ese archivo
+        zinfo = ZipInfo(arcname or os.path.basename(filename),
+                        date_time=FECHA_ENTRADAS_ZIP)
+        zinfo.compress_type = self.compression if compress_type is None else compress_type
+        zinfo._compresslevel = self.compresslevel if compresslevel is None else compresslevel
+        zinfo.external_attr = 0o600 << 16
+        zinfo.file_size = os.path.getsize(filename)
+        with open(filename, "rb") as origen, self.open(zinfo, "w") as destino:
+            shutil.copyfileobj(origen, destino, 1024 * 8)
+
+    def escribir_comprimido(self, nombre: str, fragmentos: List[FragmentoHoja]) -> None:
+        """Agrega una entrada cuyo contenido ya viene comprimido en fragmentos (ver FragmentoHoja)."""
+        crc = 0
+        tamano = 0
+        for fragmento in fragmentos:
+            crc = _combinar_crc(crc, fragmento.crc, fragmento.tamano)
+            tamano += fragmento.tamano
+
+        zinfo = ZipInfo(nombre, date_time=FECHA_ENTRADAS_ZIP)
+        zinfo.compress_type = self.compression
+        zinfo.external_attr = 0o600 << 16
+        # Con el tamaño real zipfile decide si la entrada necesita ZIP64
+        zinfo.file_size = tamano
+        with self.open(zinfo, "w") as destino:
+            destino._compressor = _SinCompresion()
+            for fragmento in fragmentos:
+                destino.write(fragmento.datos)
+            # El encabezado debe llevar el CRC y el tamaño del XML sin comprimir
+            destino._crc = crc
+            destino._file_size = tamano
+
+
+def abrir_zip(destino: BinaryIO, compresion: str = COMPRESION_NORMAL) -> "_ZipDeterminista":
+    """Abre el zip de salida con el método y nivel del perfil de compresión."""
+    metodo, nivel = PERFILES_COMPRESION[compresion]
+    return _ZipDeterminista(destino, 'w', metodo, allowZip64=True, compresslevel=nivel)
+
+
+def _preparar_guardado(wb: openpyxl.Workbook, destino: BinaryIO, compresion: str = COMPRESION_NORMAL) -> ZipFile:
+    """Fija las fechas del documento y abre el zip de salida."""
+    wb.properties.created = FECHA_DOCUMENTO
+    wb.properties.modified = FECHA_DOCUMENTO
+    return abrir_zip(destino, compresion)
+
+
+def _guardar_normal(wb: openpyxl.Workbook, destino: BinaryIO, compresion: str = COMPRESION_NORMAL) -> None:
+    """Guarda un workbook completo (equivale a wb.save, con salida determinista)."""
+    ExcelWriter(wb, _preparar_guardado(wb, destino, compresion)).save()
+
+
+def _guardar_streaming(wb: openpyxl.Workbook, filas: Iterator[List[WriteOnlyCell]], destino: BinaryIO, compresion: str = COMPRESION_NORMAL) -> None:
+    """
+    Guarda un workbook de solo escritura generando sus filas sobre la marcha.
+
+    El destino puede no admitir seek (por ejemplo, un canal hacia la respuesta
+    HTTP): zipfile usa entonces descriptores de datos y escribe de corrido.
+    """
+    _ExcelWriterFilasDiferidas(
+        wb, _preparar_guardado(wb, destino, compresion), filas).save()
+
+
+def escribir_excel(destino: BinaryIO, empleados_data: Iterable[EmpleadoMarcaciones], fecha_inicio: Optional[str] = None, fecha_fin: Optional[str] = None, modo: Optional[str] = None, progreso: Optional[Callable[[int], None]] = None, backend: Optional[str] = None, compresion: Optional[str] = None, cronometro: Optional[Cronometro] = None) -> None:
+    """
+    Construye el archivo Excel y lo escribe en el destino indicado.
+
+    Args:
+        destino: Archivo o flujo binario donde se escribe el xlsx
+        empleados_data: Datos de empleados con sus marcaciones. Puede ser un
+            iterador que los vaya entregando a medida que llegan; en ese caso el
+            reporte se escribe en modo streaming (con varias hojas, por
+            fragmentos; el backend nativo con varias hojas lo lee completo)
+        fecha_inicio: Fecha inicial en formato YYYY-MM-DD
+        fecha_fin: Fecha final en formato YYYY-MM-DD
+        modo: Modo de escritura ("normal", "streaming" o "auto")
+        progreso: Función opcional que recibe la cantidad de empleados ya procesados
+        backend: Motor de escritura ("openpyxl" o "nativo"); None usa la configuración
+        compresion: Perfil de compresión del zip ("stored", "fast", "default" o
+            "max"); None usa la configuración
+        cronometro: Cronómetro opcional donde se suman las etapas "filas",
+            "estilos" y "guardado"
+    """
+    cronometro = cronometro or Cronometro()
+    cantidad_empleados = len(empleados_data) if isinstance(
+        empleados_data, Sized) else None
+    logger.info("Generando Excel con %s empleados. Rango de fechas: %s a %s",
+                "un flujo de" if cantidad_empleados is None else cantidad_empleados,
+                fecha_inicio, fecha_fin)
+    logger.debug("Margen de tolerancia configurado: %d minutos",
+                 MARGEN_TOLERANCIA)
+
+    hojas = planificar_hojas(fecha_inicio, fecha_fin)
+    layout = layout_hoja(hojas[0])
+    compresion = resolver_compresion(compresion)
+
+    if resolver_backend(backend) == BACKEND_NATIVO:
+        # El escritor nativo siempre escribe fila por fila; el modo solo se valida
+        from services.xlsx_nativo import escribir_xlsx_nativo
+        resolver_modo_escritura(modo, cantidad_empleados, layout)
+        if len(hojas) > 1:
+            empleados_data = _empleados_validos(empleados_data)
+        escribir_xlsx_nativo(destino, empleados_data, hojas, progreso, compresion, cronometro)
+        return
+
+    if len(hojas) > 1:
+        # Varias hojas mensuales: siempre por fragmentos (el modo solo se valida)
+        resolver_modo_escritura(modo, cantidad_empleados, layout)
+        _escribir_fragmentado(destino, empleados_data, hojas, progreso, compresion, cronometro)
+        return
+
+    if cantidad_empleados is None and modo == MODO_NORMAL:
+        raise ValueError(
+            "El modo normal requiere la lista completa de empleados")
+    modo = resolver_modo_escritura(modo, cantidad_empleados, layout)
+    logger.debug("Modo de escritura: %s", modo)
+
+    if modo == MODO_STREAMING:
+        # Las filas se generan mientras se guarda: su tiempo no cuenta como guardado
+        wb, filas = _escribir_streaming(empleados_data, layout, progreso, cronometro)
+        with cronometro.etapa(ETAPA_GUARDADO, excluir=(ETAPA_FILAS, ETAPA_ESTILOS)):
+            _guardar_streaming(wb, filas, destino, compresion)
+    else:
+        wb = _escribir_normal(empleados_data, layout, progreso, cronometro)
+        with cronometro.etapa(ETAPA_GUARDADO):
+            _guardar_normal(wb, destino, compresion)
+
+
+def _empleados_validos(empleados_data: Iterable[Any]) -> List[EmpleadoMarcaciones]:
+    """Valida una sola vez los empleados que comparten todas las hojas del reporte."""
+    return [e for e in map(_como_empleado, empleados_data) if e is not None]
+
+
+def _fragmentos_empleados(empleados: List[EmpleadoMarcaciones]) -> List[Tuple[int, List[EmpleadoMarcaciones]]]:
+    """
+    Divide los empleados en fragmentos de EXCEL_EMPLEADOS_POR_FRAGMENTO.
+
+    Returns:
+        Lista de (empleados que preceden al fragmento, empleados del fragmento)
+    """
+    tamano = max(settings.EXCEL_EMPLEADOS_POR_FRAGMENTO, 1)
+    return [(inicio, empleados[inicio:inicio + tamano])
+            for inicio in range(0, len(empleados), tamano)]
+
+
+def _lotes_empleados(empleados_data: Iterable[Any]) -> Iterator[Tuple[int, List[EmpleadoMarcaciones]]]:
+    """
+    Como _fragmentos_empleados, pero valida y agrupa los empleados a medida que
+    llegan: cada fragmento se entrega apenas se completa.
+
+    Yields:
+        Tuplas (empleados que preceden al fragmento, empleados del fragmento)
+    """
+    tamano = max(settings.EXCEL_EMPLEADOS_POR_FRAGMENTO, 1)
+    validos = (e for e in map(_como_empleado, empleados_data) if e is not None)
+    inicio = 0
+    while True:
+        lote = list(islice(validos, tamano))
+        if not lote:
+            return
+        yield inicio, lote
+        inicio += len(lote)
+
+
+def _renderizar_filas(empleados: List[EmpleadoMarcaciones], hoja: HojaReporte, inicio: int, progreso: Optional[Callable[[int], None]] = None, compresion: str = COMPRESION_NORMAL) -> FragmentoHoja:
+    """
+    Escribe como XML comprimido las filas de un fragmento de empleados de una hoja.
+
+    Las filas son independientes entre sí: solo necesitan la posición del
+    fragmento para numerar la columna N. y ubicarse en la hoja.
+    """
+    layout = layout_hoja(hoja)
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet()
+    # Misma paleta y en el mismo orden que el workbook final, así los índices
+    # de estilo de las celdas coinciden con los de styles.xml
+    paleta = registrar_paleta(wb)
+    escritor = _EscritorFilas(ws)
+
+    compresor = _CompresorHoja(compresion)
+    fila_idx = len(layout.filas_encabezado) + 1 + inicio
+    with xmlfile(compresor) as xf:
+        for fila in _filas_empleados(empleados, layout, progreso, inicio):
+            celdas = ws._values_to_row(
+                _celdas_solo_escritura(ws, paleta, fila), fila_idx)
+            escritor.write_row(xf, celdas, fila_idx)
+            fila_idx += 1
+    return compresor.resultado()
+
+
+def renderizar_fragmento(empleados_serializados: bytes, hoja: HojaReporte, inicio: int, compresion: str = COMPRESION_NORMAL) -> FragmentoHoja:
+    """
+    Renderiza un fragmento de filas dentro del pool de procesos.
+
+    Args:
+        empleados_serializados: Empleados del fragmento, serializados con pickle
+            una sola vez para todas las hojas del reporte
+        hoja: Título y rango de fechas de la hoja
+        inicio: Empleados que preceden al fragmento en el reporte
+        compresion: Perfil de compresión del reporte
+
+    Returns:
+        Filas del fragmento como XML comprimido
+    """
+    return _renderizar_filas(pickle.loads(empleados_serializados), hoja, inicio, compresion=compresion)
+
+
+def _extremos_hoja(hoja: HojaReporte) -> Tuple[bytes, bytes]:
+    """XML de la hoja antes y después de las filas de empleados."""
+    wb, filas = _escribir_streaming([], layout_hoja(hoja))
+    salida = io.BytesIO()
+    _volcar_hoja(wb.worksheets[0], filas, salida)
+    xml = salida.getvalue()
+    corte = xml.rindex(b"</sheetData>")
+    return xml[:corte], xml[corte:]
+
+
+def _ensamblar_hojas(destino: BinaryIO, hojas: List[HojaReporte], filas_por_hoja: List[List[FragmentoHoja]], compresion: str = COMPRESION_NORMAL) -> None:
+    """Arma el workbook a partir de los fragmentos de filas ya comprimidos de cada hoja."""
+    fragmentos_por_hoja = []
+    for hoja, filas in zip(hojas, filas_por_hoja):
+        encabezado, cierre = _extremos_hoja(hoja)
+        fragmentos_por_hoja.append(
+            [_comprimir(encabezado, compresion=compresion)] + filas
+            + [_comprimir(cierre, final=True, compresion=compresion)])
+
+    wb = openpyxl.Workbook(write_only=True)
+    registrar_paleta(wb)
+    for titulo, _, _ in hojas:
+        wb.create_sheet(title=titulo)
+    _ExcelWriterHojasComprimidas(
+        wb, _preparar_guardado(wb, destino, compresion), fragmentos_por_hoja).save()
+
+
+def _escribir_fragmentado(destino: BinaryIO, empleados_data: Iterable[Any], hojas: List[HojaReporte], progreso: Optional[Callable[[int], None]] = None, compresion: str = COMPRESION_NORMAL, cronometro: Optional[Cronometro] = None) -> None:
+    """
+    Escribe el reporte por fragmentos, uno tras otro, en este proceso.
+
+    Produce los mismos bytes que _generar_fragmentado. Los fragmentos ya salen
+    con su estilo y comprimidos, por lo que todo su renderizado se suma a
+    "filas". Sin progreso, cada fragmento se renderiza para todas las hojas
+    apenas llegan sus empleados y luego se descarta: con un flujo (NDJSON) solo
+    se conservan las filas comprimidas, no los empleados.
+    """
+    cronometro = cronometro or Cronometro()
+
+    with cronometro.etapa(ETAPA_FILAS):
+        if progreso is None:
+            filas_por_hoja = [[] for _ in hojas]
+            for inicio, lote in _lotes_empleados(empleados_data):
+                for filas, hoja in zip(filas_por_hoja, hojas):
+                    filas.append(_renderizar_filas(lote, hoja, inicio, compresion=compresion))
         else:
-            fechas_dias = [
-                ("03 FEBRERO 2025", "LUNES"), ("04 FEBRERO 2025",
-                                               "MARTES"), ("05 FEBRERO 2025", "MIÉRCOLES"),
-                ("06 FEBRERO 2025", "JUEVES"), ("07 FEBRERO 2025",
-                                                "VIERNES"), ("08 FEBRERO 2025", "SÁBADO"),
-                ("09 FEBRERO 2025", "DOMINGO"), ("10 FEBRERO 2025",
-                                                 "LUNES"), ("11 FEBRERO 2025", "MARTES"),
-                ("12 FEBRERO 2025", "MIÉRCOLES"), ("13 FEBRERO 2025",
-                                                   "JUEVES"), ("14 FEBRERO 2025", "VIERNES")
-            ]
+            # El avance se informa hoja por hoja sobre el total de empleados
+            empleados = _empleados_validos(empleados_data)
+            fragmentos = _fragmentos_empleados(empleados)
+            total = len(empleados)
+            filas_por_hoja = []
+            for numero, hoja in enumerate(hojas):
+                avance = partial(_avance_hoja, progreso, numero * total, len(hojas))
+                filas_por_hoja.append([_renderizar_filas(lote, hoja, inicio, avance, compresion)
+                                       for inicio, lote in fragmentos])
 
-            # Para fechas estáticas, mapear manualmente
-            dias_mapeo = [
-                ("2025-02-03", "lun"), ("2025-02-04", "mar"), ("2025-02-05", "mie"),
-                ("2025-02-06", "jue"), ("2025-02-07",
-                                        "vier"), ("2025-02-08", "sab"),
-                ("2025-02-09", "dom"), ("2025-02-10", "lun"), ("2025-02-11", "mar"),
-                ("2025-02-12", "mie"), ("2025-02-13", "jue"), ("2025-02-14", "vier")
-            ]
-            todas_fechas = dias_mapeo
-            for fecha, dia in dias_mapeo:
-                dia_semana_map[fecha] = dia
-
-        columnas_fecha = ["ING", "TAR", "SALIDA", "EXT"]
-
-        for i, (fecha, dia) in enumerate(fechas_dias):
-            if usar_fechas_dinamicas:
-                fecha_dt = fecha_inicio_dt + timedelta(days=i)
-                fecha_iso = fecha_dt.strftime("%Y-%m-%d")
-            else:
-                fecha_iso = f"2025-02-{int(fecha[:2]):02d}"
-
-            fecha_col_map[fecha_iso] = col
-
-            ws.merge_cells(start_row=8, start_column=col,
-                           end_row=8, end_column=col+3)
-            ws.cell(row=8, column=col, value=fecha).alignment = Alignment(
-                horizontal='center', vertical='center')
-            ws.merge_cells(start_row=9, start_column=col,
-                           end_row=9, end_column=col+3)
-            ws.cell(row=9, column=col, value=dia).alignment = Alignment(
-                horizontal='center', vertical='center')
-
-            for j, sub in enumerate(columnas_fecha):
-                celda = ws.cell(row=10, column=col+j, value=sub)
-                celda.alignment = Alignment(
-                    horizontal='center', vertical='center')
-                if sub in ["TAR", "EXT"]:
-                    celda.fill = COLOR_ROJO
-                    celda.font = Font(color="FFFFFF", bold=True)
-                    # Registrar columnas TAR y EXT para aplicar negrita posteriormente
-                    columnas_tardanza_extension[col+j] = sub
-            col += 4
-
-        # Añadir nuevas columnas de cantidades
-        col_cant_tardanzas = col
-        col_cant_tolerancias = col + 1
-        col_cant_faltas = col + 2
-        col_total_tardanza = col + 3
-        col_total_ausencia = col + 4
-
-        # Añadir encabezados para las columnas de cantidades
-        ws.merge_cells(start_row=8, start_column=col_cant_tardanzas,
-                       end_row=10, end_column=col_cant_tardanzas)
-        celda_cant_tard = ws.cell(
-            row=8, column=col_cant_tardanzas, value="CANT. TARDANZAS")
-        celda_cant_tard.alignment = Alignment(
-            horizontal='center', vertical='center')
-        celda_cant_tard.fill = COLOR_ENCABEZADO
-        celda_cant_tard.font = Font(color="FFFFFF", bold=True)
-
-        ws.merge_cells(start_row=8, start_column=col_cant_tolerancias,
-                       end_row=10, end_column=col_cant_tolerancias)
-        celda_cant_toler = ws.cell(
-            row=8, column=col_cant_tolerancias, value="CANT. TOLERANCIAS")
-        celda_cant_toler.alignment = Alignment(
-            horizontal='center', vertical='center')
-        celda_cant_toler.fill = COLOR_ENCABEZADO
-        celda_cant_toler.font = Font(color="FFFFFF", bold=True)
-
-        ws.merge_cells(start_row=8, start_column=col_cant_faltas,
-                       end_row=10, end_column=col_cant_faltas)
-        celda_cant_faltas = ws.cell(
-            row=8, column=col_cant_faltas, value="CANT. FALTAS")
-        celda_cant_faltas.alignment = Alignment(
-            horizontal='center', vertical='center')
-        celda_cant_faltas.fill = COLOR_ENCABEZADO
-        celda_cant_faltas.font = Font(color="FFFFFF", bold=True)
-
-        # Añadir encabezados para las columnas de totales con nombres actualizados
-        ws.merge_cells(start_row=8, start_column=col_total_tardanza,
-                       end_row=10, end_column=col_total_tardanza)
-        celda_total_tardanza = ws.cell(
-            row=8, column=col_total_tardanza, value="TOTAL DE MINUTOS DE TARDANZA")
-        celda_total_tardanza.alignment = Alignment(
-            horizontal='center', vertical='center')
-        celda_total_tardanza.fill = COLOR_ENCABEZADO
-        celda_total_tardanza.font = Font(color="FFFFFF", bold=True)
-
-        ws.merge_cells(start_row=8, start_column=col_total_ausencia,
-                       end_row=10, end_column=col_total_ausencia)
-        celda_total_ausencia = ws.cell(
-            row=8, column=col_total_ausencia, value="TOTAL DE MINUTOS DE AUSENCIA")
-        celda_total_ausencia.alignment = Alignment(
-            horizontal='center', vertical='center')
-        celda_total_ausencia.fill = COLOR_ENCABEZADO
-        celda_total_ausencia.font = Font(color="FFFFFF", bold=True)
-
-        col += 5  # Actualizar el contador de columnas después de añadir las nuevas columnas
-
-        # Aplicar estilo a todas las celdas de encabezado
-        for row in ws.iter_rows(min_row=8, max_row=10, min_col=1, max_col=col-1):
-            for celda in row:
-                # Si no es una celda roja (TAR, EXT)
-                if not celda.fill.start_color.index == "FF0000":
-                    celda.fill = COLOR_ENCABEZADO
-                    celda.font = Font(color="FFFFFF", bold=True)
-
-        fila_actual = 11
-        empleados_validos = [e for e in empleados_data if isinstance(
-            e, dict) and e.get("emp_code")]
-
-        for idx, empleado in enumerate(empleados_validos, 1):
-            try:
-                dias_remoto = empleado.get("dias_remoto", [])
-
-                fechas_teletrabajo = set()
-                for fecha_iso, dia_semana in todas_fechas:
-                    if dia_semana in dias_remoto:
-                        fechas_teletrabajo.add(fecha_iso)
-
-                ws.cell(row=fila_actual, column=1, value=idx)
-                ws.cell(row=fila_actual, column=2,
-                        value=empleado.get("emp_code", ""))
-
-                first_name = empleado.get("first_name", "") or ""
-                last_name = empleado.get("last_name", "") or ""
-                nombre_completo = f"{first_name} {last_name}".strip()
-                ws.cell(row=fila_actual, column=3,
-                        value=nombre_completo if nombre_completo else "-")
-
-                if empleado.get("hire_date"):
-                    try:
-                        fecha_ingreso = datetime.strptime(
-                            empleado["hire_date"], "%Y-%m-%dT%H:%M:%S.%fZ").strftime("%d/%m/%Y")
-                        ws.cell(row=fila_actual, column=4, value=fecha_ingreso)
-                    except (ValueError, TypeError):
-                        ws.cell(row=fila_actual, column=4, value="-")
-                else:
-                    ws.cell(row=fila_actual, column=4, value="-")
-
-                fecha_cese = None
-                tiene_fecha_cese = False
-                fecha_cese_str = "-"
-
-                if empleado.get("fecha_cese"):
-                    try:
-                        fecha_cese = datetime.strptime(
-                            empleado["fecha_cese"], "%Y-%m-%dT%H:%M:%S.%fZ")
-                        fecha_cese_str = fecha_cese.strftime("%d/%m/%Y")
-                        tiene_fecha_cese = True
-                    except (ValueError, TypeError):
-                        pass
-
-                ws.cell(row=fila_actual, column=5, value=fecha_cese_str)
-
-                ws.cell(row=fila_actual, column=6,
-                        value=empleado.get("position_name", "-"))
-                dept_name = empleado.get("dept_name", "-")
-                ws.cell(row=fila_actual, column=7, value=dept_name)
-                ws.cell(row=fila_actual, column=8,
-                        value=empleado.get("gerencia", "-"))
-
-                if tiene_fecha_cese:
-                    estado = "Cesado"
-                elif empleado.get("is_unactive", False):
-                    estado = "Inactivo"
-                else:
-                    estado = "Activo"
-
-                ws.cell(row=fila_actual, column=9, value=estado)
-
-                ws.cell(row=fila_actual, column=10,
-                        value=empleado.get("registro", "-"))
-
-                dias_labores = empleado.get("dias_labores", "-")
-                if dias_labores == "lun-vier":
-                    ws.cell(row=fila_actual, column=11,
-                            value="LUNES A VIERNES")
-                else:
-                    ws.cell(row=fila_actual, column=11,
-                            value=dias_labores.upper() if dias_labores else "-")
-
-                dias_descanso = empleado.get("dias_descanso", "-")
-                if dias_descanso == "sab-dom":
-                    ws.cell(row=fila_actual, column=12, value="S Y D")
-                else:
-                    ws.cell(row=fila_actual, column=12,
-                            value=dias_descanso.upper() if dias_descanso else "-")
-
-                if empleado.get("hora_ingreso") and empleado.get("hora_salida"):
-                    horario = f"{empleado['hora_ingreso']}AM - {empleado['hora_salida']}PM"
-                    ws.cell(row=fila_actual, column=13, value=horario)
-                else:
-                    ws.cell(row=fila_actual, column=13, value="-")
-
-                # Agregar los días de teletrabajo formateados
-                ws.cell(row=fila_actual, column=14,
-                        value=formatear_dias_teletrabajo(dias_remoto))
-
-                # Inicializar un diccionario para rastrear las marcaciones por fecha
-                marcaciones_por_fecha = {}
-
-                # Almacenar todas las marcaciones por fecha
-                if "marcaciones" in empleado and isinstance(empleado["marcaciones"], list):
-                    for marcacion in empleado["marcaciones"]:
-                        try:
-                            if not isinstance(marcacion, dict) or "fecha" not in marcacion:
-                                continue
-
-                            fecha_marca = None
-                            try:
-                                fecha_marca = datetime.strptime(
-                                    marcacion["fecha"], "%Y-%m-%dT%H:%M:%S.%fZ").strftime("%Y-%m-%d")
-                            except ValueError:
-                                try:
-                                    fecha_marca = datetime.strptime(
-                                        marcacion["fecha"], "%Y-%m-%d").strftime("%Y-%m-%d")
-                                except ValueError:
-                                    print(
-                                        f"Error al parsear fecha: {marcacion['fecha']}")
-                                    continue
-
-                            # Almacenar esta marcación
-                            marcaciones_por_fecha[fecha_marca] = marcacion
-
-                        except Exception as e:
-                            print(f"Error procesando marcación: {str(e)}")
-                            continue
-
-                # Contadores para tolerancias y tardanzas
-                contador_tardanzas = 0
-                contador_tolerancias = 0
-
-                # Ahora, para cada fecha en el rango, procesarla adecuadamente
-                for fecha_iso in fecha_col_map.keys():
-                    col_inicio = fecha_col_map[fecha_iso]
-
-                    # Verificar si esta fecha debe ser teletrabajo
-                    es_dia_teletrabajo = fecha_iso in fechas_teletrabajo
-
-                    # Verificar si tenemos marcaciones para esta fecha
-                    tiene_marcaciones = fecha_iso in marcaciones_por_fecha
-
-                    # Si es día de teletrabajo, aplicar fondo gris claro a las celdas
-                    if es_dia_teletrabajo:
-                        # Aplicar fondo de teletrabajo a todas las celdas
-                        for j in range(4):  # 4 columnas: ING, TAR, SALIDA, EXT
-                            celda = ws.cell(row=fila_actual,
-                                            column=col_inicio+j)
-                            celda.fill = COLOR_TELETRABAJO
-                            celda.alignment = Alignment(
-                                horizontal='center', vertical='center')
-
-                    # Si tenemos marcaciones para esta fecha, mostrarlas
-                    if tiene_marcaciones:
-                        marcacion = marcaciones_por_fecha[fecha_iso]
-
-                        # Celda de entrada - centrada
-                        hora_ingreso = marcacion.get("hora_ingreso")
-                        if hora_ingreso is None:
-                            # Si hora_ingreso es null, escribir "NM" con fondo gris
-                            celda_ingreso = ws.cell(
-                                row=fila_actual, column=col_inicio, value="NM")
-                            celda_ingreso.fill = COLOR_GRIS_CLARO
-                            celda_ingreso.font = Font(bold=True)
-                        else:
-                            celda_ingreso = ws.cell(
-                                row=fila_actual, column=col_inicio, value=hora_ingreso)
-                            # Si es día de teletrabajo, mantener el fondo de teletrabajo
-                            if es_dia_teletrabajo:
-                                celda_ingreso.fill = COLOR_TELETRABAJO
-
-                        celda_ingreso.alignment = Alignment(
-                            horizontal='center', vertical='center')
-
-                        diferencia_ingreso = marcacion.get(
-                            "diferencia_ingreso", 0)
-                        try:
-                            diferencia_ingreso = int(diferencia_ingreso)
-                        except (ValueError, TypeError):
-                            diferencia_ingreso = 0
-
-                        # Celda de tardanza - centrada
-                        celda_tardanza = ws.cell(row=fila_actual, column=col_inicio+1,
-                                                 value=str(diferencia_ingreso))
-                        celda_tardanza.alignment = Alignment(
-                            horizontal='center', vertical='center')
-
-                        # Nueva lógica de color con tolerancia
-                        if diferencia_ingreso > MARGEN_TOLERANCIA:
-                            celda_tardanza.fill = COLOR_ROJO
-                            celda_tardanza.font = Font(
-                                color="FFFFFF", bold=True)
-                            contador_tardanzas += 1
-                        elif diferencia_ingreso > 0:
-                            celda_tardanza.fill = COLOR_AMARILLO
-                            celda_tardanza.font = Font(bold=True)
-                            contador_tolerancias += 1
-                        else:
-                            if es_dia_teletrabajo:
-                                celda_tardanza.fill = COLOR_TELETRABAJO
-                            else:
-                                celda_tardanza.fill = COLOR_VERDE
-                                celda_tardanza.font = Font(
-                                    color="FFFFFF", bold=True)
-
-                        # Celda de salida - centrada
-                        hora_salida = marcacion.get("hora_salida")
-                        if hora_salida is None:
-                            # Si hora_salida es null, escribir "NM" con fondo gris
-                            celda_salida = ws.cell(
-                                row=fila_actual, column=col_inicio+2, value="NM")
-                            celda_salida.fill = COLOR_GRIS_CLARO
-                            celda_salida.font = Font(bold=True)
-                        else:
-                            celda_salida = ws.cell(
-                                row=fila_actual, column=col_inicio+2, value=hora_salida)
-                            # Si es día de teletrabajo, mantener el fondo de teletrabajo
-                            if es_dia_teletrabajo:
-                                celda_salida.fill = COLOR_TELETRABAJO
-
-                        celda_salida.alignment = Alignment(
-                            horizontal='center', vertical='center')
-
-                        diferencia_salida = marcacion.get(
-                            "diferencia_salida", 0)
-                        try:
-                            diferencia_salida = int(diferencia_salida)
-                        except (ValueError, TypeError):
-                            diferencia_salida = 0
-
-                        # Celda de extensión - centrada
-                        celda_extension = ws.cell(row=fila_actual, column=col_inicio+3,
-                                                  value=str(diferencia_salida))
-                        celda_extension.alignment = Alignment(
-                            horizontal='center', vertical='center')
-
-                        # Aplicar color según extensión, pero respetando si es día de teletrabajo
-                        if diferencia_salida < 0:
-                            celda_extension.fill = COLOR_ROJO
-                            celda_extension.font = Font(
-                                color="FFFFFF", bold=True)
-                        else:
-                            if es_dia_teletrabajo:
-                                celda_extension.fill = COLOR_TELETRABAJO
-                            else:
-                                celda_extension.fill = COLOR_VERDE
-                                celda_extension.font = Font(
-                                    color="FFFFFF", bold=True)
-
-                # Calcular totales a partir de las marcaciones si es necesario
-                total_tardanza_calculado = 0
-                total_ausencia_calculada = 0
-
-                if "marcaciones" in empleado and isinstance(empleado["marcaciones"], list):
-                    for marcacion in empleado["marcaciones"]:
-                        try:
-                            diferencia_ingreso = marcacion.get(
-                                "diferencia_ingreso", 0)
-                            if isinstance(diferencia_ingreso, (int, float)) and diferencia_ingreso > 0:
-                                total_tardanza_calculado += diferencia_ingreso
-
-                            diferencia_salida = marcacion.get(
-                                "diferencia_salida", 0)
-                            if isinstance(diferencia_salida, (int, float)) and diferencia_salida < 0:
-                                total_ausencia_calculada += diferencia_salida
-                        except Exception as e:
-                            print(
-                                f"Error al calcular totales de marcación: {str(e)}")
-
-                # Extraer los valores de totales y cantidades del JSON
-                total_tardanza = empleado.get("total_minutos_tardanzas")
-                total_ausencia = empleado.get("total_minutos_salidas_temprano")
-                cant_tardanzas = empleado.get(
-                    "cantidad_tardanzas", contador_tardanzas)
-                cant_tolerancias = empleado.get(
-                    "cantidad_tolerancias", contador_tolerancias)
-                cant_faltas = empleado.get("cantidad_faltas", 0)
-
-                print(
-                    f"Empleado: {nombre_completo}, cantidad_faltas: {cant_faltas}")
-
-                # Asegúrate de que cant_faltas sea un número
-                if isinstance(cant_faltas, str):
-                    try:
-                        cant_faltas = int(cant_faltas)
-                    except (ValueError, TypeError):
-                        cant_faltas = 0
-                elif not isinstance(cant_faltas, (int, float)):
-                    cant_faltas = 0
-
-                # Forzar un valor mínimo si es un empleado activo y hay días sin marcar
-                if estado == "Activo" and cant_faltas == 0:
-                    # Calcular días laborables en el rango
-                    dias_laborables_rango = 0
-                    dias_laborables = empleado.get(
-                        "dias_labores", "lun-vier").split("-")
-
-                    for fecha_iso, dia_semana in todas_fechas:
-                        if dia_semana in dias_laborables and fecha_iso not in marcaciones_por_fecha and fecha_iso not in fechas_teletrabajo:
-                            dias_laborables_rango += 1
-
-                    # Si hay días laborables sin marcar, actualizar cant_faltas
-                    if dias_laborables_rango > 0:
-                        print(
-                            f"Días sin marcar para {nombre_completo}: {dias_laborables_rango}")
-                        cant_faltas = max(cant_faltas, dias_laborables_rango)
-                # Si los valores originales son None o 0, usar los calculados
-                if total_tardanza is None or total_tardanza == 0:
-                    total_tardanza = total_tardanza_calculado
-
-                if total_ausencia is None or total_ausencia == 0:
-                    total_ausencia = total_ausencia_calculada
-
-                # Verificar que sean números y convertirlos si es necesario
-                if isinstance(total_tardanza, str):
-                    try:
-                        total_tardanza = int(total_tardanza)
-                    except (ValueError, TypeError):
-                        total_tardanza = total_tardanza_calculado
-                elif not isinstance(total_tardanza, (int, float)):
-                    total_tardanza = total_tardanza_calculado
-
-                if isinstance(total_ausencia, str):
-                    try:
-                        total_ausencia = int(total_ausencia)
-                    except (ValueError, TypeError):
-                        total_ausencia = total_ausencia_calculada
-                elif not isinstance(total_ausencia, (int, float)):
-                    total_ausencia = total_ausencia_calculada
-
-                # Añadir las nuevas columnas de cantidades
-                celda_cant_tard = ws.cell(
-                    row=fila_actual, column=col_cant_tardanzas, value=cant_tardanzas)
-                celda_cant_tard.alignment = Alignment(
-                    horizontal='center', vertical='center')
-
-                celda_cant_toler = ws.cell(
-                    row=fila_actual, column=col_cant_tolerancias, value=cant_tolerancias)
-                celda_cant_toler.alignment = Alignment(
-                    horizontal='center', vertical='center')
-
-                celda_cant_faltas = ws.cell(
-                    row=fila_actual, column=col_cant_faltas, value=cant_faltas)
-                celda_cant_faltas.alignment = Alignment(
-                    horizontal='center', vertical='center')
-
-                # Celda Total Tardanza
-                celda_total_tard = ws.cell(
-                    row=fila_actual, column=col_total_tardanza, value=total_tardanza)
-                celda_total_tard.alignment = Alignment(
-                    horizontal='center', vertical='center')
-                if total_tardanza > 0:
-                    celda_total_tard.fill = COLOR_ROJO
-                    celda_total_tard.font = Font(color="FFFFFF", bold=True)
-                else:
-                    celda_total_tard.fill = COLOR_VERDE
-                    celda_total_tard.font = Font(color="FFFFFF", bold=True)
-
-                # Celda Total Ausencia
-                celda_total_aus = ws.cell(
-                    row=fila_actual, column=col_total_ausencia, value=total_ausencia)
-                celda_total_aus.alignment = Alignment(
-                    horizontal='center', vertical='center')
-                if total_ausencia < 0:
-                    celda_total_aus.fill = COLOR_ROJO
-                    celda_total_aus.font = Font(color="FFFFFF", bold=True)
-                else:
-                    celda_total_aus.fill = COLOR_VERDE
-                    celda_total_aus.font = Font(color="FFFFFF", bold=True)
-
-            except Exception as e:
-                print(f"Error procesando empleado {idx}: {str(e)}")
-                import traceback
-                traceback.print_exc()
-
-            fila_actual += 1
-
-        # Centrar todas las celdas de las columnas generadas por rango de fechas
-        # (a partir de la columna 15)
-        for row in ws.iter_rows(min_row=11, max_row=fila_actual-1, min_col=15, max_col=col-1):
-            for cell in row:
-                if not cell.alignment.horizontal:  # Si no tiene alineación definida
-                    cell.alignment = Alignment(
-                        horizontal='center', vertical='center')
-
-        thin_border = Border(
-            left=Side(style='thin', color='000000'),
-            right=Side(style='thin', color='000000'),
-            top=Side(style='thin', color='000000'),
-            bottom=Side(style='thin', color='000000')
-        )
-        for row in ws.iter_rows(min_row=8, max_row=fila_actual-1, min_col=1, max_col=ws.max_column):
-            for cell in row:
-                cell.border = thin_border
-
-        anchos_personalizados = {
-            'A': 5, 'B': 12, 'C': 25, 'D': 15, 'E': 15, 'F': 20,
-            'G': 15, 'H': 10, 'I': 12, 'J': 12, 'K': 18, 'L': 10,
-            'M': 20, 'N': 20
-        }
-
-        for letra, ancho in anchos_personalizados.items():
-            ws.column_dimensions[letra].width = ancho
-
-        # Configurar el ancho de las columnas de fechas
-        for idx in range(15, col_cant_tardanzas):  # Columnas de fechas
-            ws.column_dimensions[get_column_letter(idx)].width = 10
-
-        # Configurar el ancho de las nuevas columnas
-        ws.column_dimensions[get_column_letter(col_cant_tardanzas)].width = 15
-        ws.column_dimensions[get_column_letter(
-            col_cant_tolerancias)].width = 15
-        ws.column_dimensions[get_column_letter(col_cant_faltas)].width = 15
-        ws.column_dimensions[get_column_letter(col_total_tardanza)].width = 15
-        ws.column_dimensions[get_column_letter(col_total_ausencia)].width = 15
-
-        print("Generando bytes del Excel...")
+    with cronometro.etapa(ETAPA_GUARDADO):
+        _ensamblar_hojas(destino, hojas, filas_por_hoja, compresion)
+
+
+def _avance_hoja(progreso: Callable[[int], None], desplazamiento: int, cantidad_hojas: int, procesados: int) -> None:
+    """Traduce el avance dentro de una hoja al avance sobre el total de empleados."""
+    progreso((desplazamiento + procesados) // cantidad_hojas)
+
+
+def _ensamblar_en_memoria(hojas: List[HojaReporte], filas_por_hoja: List[List[FragmentoHoja]], compresion: str) -> bytes:
+    output = io.BytesIO()
+    _ensamblar_hojas(output, hojas, filas_por_hoja, compresion)
+    return output.getvalue()
+
+
+def _serializar_fragmentos(fragmentos: List[Tuple[int, List[EmpleadoMarcaciones]]]) -> List[bytes]:
+    return [pickle.dumps(lote, pickle.HIGHEST_PROTOCOL) for _, lote in fragmentos]
+
+
+async def _generar_fragmentado(empleados_data: List[EmpleadoMarcaciones], hojas: List[HojaReporte], progreso: Optional[Callable[[int], None]] = None, compresion: str = COMPRESION_NORMAL, cronometro: Optional[Cronometro] = None) -> bytes:
+    """
+    Genera el reporte renderizando en paralelo, en el pool de procesos, cada
+    fragmento de empleados de cada hoja, y une los fragmentos en orden.
+
+    En el cronómetro, "filas" es el tiempo de reloj hasta tener todos los
+    fragmentos (incluida su serialización) y "guardado" el de la unión.
+    """
+    cronometro = cronometro or Cronometro()
+    loop = asyncio.get_running_loop()
+    empleados = _empleados_validos(empleados_data)
+    fragmentos = _fragmentos_empleados(empleados)
+    logger.info("Generando Excel con %d empleados en %d hojas de %d fragmentos (%s a %s)",
+                len(empleados), len(hojas), len(fragmentos), hojas[0][1], hojas[-1][2])
+
+    # Cada fragmento se serializa una sola vez: todas sus hojas reciben los
+    # mismos bytes en lugar de volver a recorrer los modelos
+    inicio_filas = time.perf_counter()
+    serializados = await loop.run_in_executor(
+        None, _serializar_fragmentos, fragmentos)
+
+    procesados = 0
+
+    async def _renderizar(datos: bytes, hoja: HojaReporte, inicio: int, cantidad: int) -> FragmentoHoja:
+        nonlocal procesados
+        fragmento = await ejecutar_en_pool(renderizar_fragmento, datos, hoja, inicio, compresion)
+        procesados += cantidad
+        if progreso is not None:
+            progreso(procesados // len(hojas))
+        return fragmento
+
+    tareas = [
+        [asyncio.ensure_future(_renderizar(datos, hoja, inicio, len(lote)))
+         for (inicio, lote), datos in zip(fragmentos, serializados)]
+        for hoja in hojas
+    ]
+    try:
+        await asyncio.gather(*(tarea for fila in tareas for tarea in fila))
+    finally:
+        for fila in tareas:
+            for tarea in fila:
+                tarea.cancel()
+    filas_por_hoja = [[tarea.result() for tarea in fila] for fila in tareas]
+    cronometro.sumar(ETAPA_FILAS, time.perf_counter() - inicio_filas)
+
+    inicio_guardado = time.perf_counter()
+    excel_bytes = await loop.run_in_executor(
+        None, _ensamblar_en_memoria, hojas, filas_por_hoja, compresion)
+    cronometro.sumar(ETAPA_GUARDADO, time.perf_counter() - inicio_guardado)
+    logger.info("Excel generado correctamente. Tamaño: %.2f KB",
+                len(excel_bytes) / 1024)
+    return excel_bytes
+
+
+def renderizar_excel(empleados_data: List[EmpleadoMarcaciones], fecha_inicio: Optional[str] = None, fecha_fin: Optional[str] = None, modo: Optional[str] = None, progreso: Optional[Callable[[int], None]] = None, backend: Optional[str] = None, compresion: Optional[str] = None, cronometro: Optional[Cronometro] = None) -> bytes:
+    """
+    Construye el archivo Excel de forma síncrona. Es trabajo de CPU puro, por lo
+    que se ejecuta dentro del pool de procesos (ver generate_excel_report).
+
+    Args:
+        empleados_data: Lista de datos de empleados con sus marcaciones
+        fecha_inicio: Fecha inicial en formato YYYY-MM-DD
+        fecha_fin: Fecha final en formato YYYY-MM-DD
+        modo: Modo de escritura ("normal", "streaming" o "auto")
+        progreso: Función opcional (serializable con pickle) que recibe la
+            cantidad de empleados ya procesados
+        backend: Motor de escritura ("openpyxl" o "nativo")
+        compresion: Perfil de compresión del zip
+        cronometro: Cronómetro opcional donde se suman las etapas del renderizado
+
+    Returns:
+        Bytes del archivo Excel generado
+    """
+    try:
         output = io.BytesIO()
-        wb.save(output)
-        output.seek(0)
+        escribir_excel(output, empleados_data, fecha_inicio,
+                       fecha_fin, modo, progreso, backend, compresion, cronometro)
         excel_bytes = output.getvalue()
 
-        print(
-            f"Excel generado correctamente. Tamaño: {len(excel_bytes) / 1024:.2f} KB")
+        logger.info("Excel generado correctamente. Tamaño: %.2f KB",
+                    len(excel_bytes) / 1024)
         return excel_bytes
 
     except Exception as e:
-        print(f"Error al generar el Excel: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error al generar el Excel: %s", e)
         raise e
+
+
+def renderizar_excel_medido(empleados_data: List[EmpleadoMarcaciones], fecha_inicio: Optional[str] = None, fecha_fin: Optional[str] = None, modo: Optional[str] = None, progreso: Optional[Callable[[int], None]] = None, backend: Optional[str] = None, compresion: Optional[str] = None) -> Tuple[bytes, Cronometro]:
+    """Como renderizar_excel, pero devuelve también las etapas medidas dentro del pool."""
+    cronometro = Cronometro()
+    excel_bytes = renderizar_excel(empleados_data, fecha_inicio, fecha_fin,
+                                   modo, progreso, backend, compresion, cronometro)
+    return excel_bytes, cronometro
+
+
+async def _renderizar_en_pool(cronometro: Optional[Cronometro], *args) -> bytes:
+    """
+    Ejecuta renderizar_excel_medido en el pool y suma sus etapas al cronómetro.
+    El resto del tiempo de reloj (espera de un worker y envío de datos entre
+    procesos) se suma a la etapa "pool".
+    """
+    inicio = time.perf_counter()
+    excel_bytes, etapas = await ejecutar_en_pool(renderizar_excel_medido, *args)
+    if cronometro is not None:
+        cronometro.actualizar(etapas)
+        cronometro.sumar(ETAPA_POOL, time.perf_counter() - inicio
+                         - sum(etapas.duraciones.values()))
+    return excel_bytes
+
+
+async def generate_excel_report(empleados_data: List[EmpleadoMarcaciones], fecha_inicio: Optional[str] = None, fecha_fin: Optional[str] = None, modo: Optional[str] = None, progreso: Optional[Callable[[int], None]] = None, backend: Optional[str] = None, compresion: Optional[str] = None, cronometro: Optional[Cronometro] = None) -> bytes:
+    """
+    Genera un archivo Excel con las marcaciones de los empleados y lo devuelve como bytes.
+
+    El renderizado corre en el pool de procesos, de modo que el event loop sigue
+    atendiendo otras solicitudes y varios reportes pueden construirse en paralelo.
+
+    Args:
+        empleados_data: Lista de datos de empleados con sus marcaciones
+        fecha_inicio: Fecha inicial en formato YYYY-MM-DD
+        fecha_fin: Fecha final en formato YYYY-MM-DD
+        modo: Modo de escritura ("normal", "streaming" o "auto"). En modo
+            streaming cada fila se escribe con su formato final y se libera
+            apenas se genera; "auto" lo elige según el tamaño del reporte
+        progreso: Función opcional que recibe la cantidad de empleados ya
+            procesados; debe poder serializarse con pickle para llegar al pool
+        backend: Motor de escritura: "openpyxl" o "nativo" (escritor XML directo
+            de xlsx_nativo, que arma las filas como texto sin pasar por el modelo
+            de celdas de openpyxl); None usa la configuración
+        compresion: Perfil de compresión del zip: "stored" (sin comprimir),
+            "fast", "default" o "max"; None usa la configuración
+        cronometro: Cronómetro opcional donde se suman las etapas "filas",
+            "estilos", "guardado" y "pool" (ver utils.metricas)
+
+    Returns:
+        Bytes del archivo Excel generado
+    """
+    hojas = planificar_hojas(fecha_inicio, fecha_fin)
+    modo_resuelto = resolver_modo_escritura(
+        modo, len(empleados_data), layout_hoja(hojas[0]))
+    compresion = resolver_compresion(compresion)
+
+    if resolver_backend(backend) == BACKEND_NATIVO:
+        return await _renderizar_en_pool(cronometro, empleados_data, fecha_inicio, fecha_fin, modo, progreso, BACKEND_NATIVO, compresion)
+
+    # Rangos de varios meses y reportes grandes en modo streaming se reparten
+    # por fragmentos de empleados (y por hoja) entre los procesos del pool
+    if len(hojas) > 1 or (modo_resuelto == MODO_STREAMING
+                          and len(empleados_data) > settings.EXCEL_EMPLEADOS_POR_FRAGMENTO):
+        return await _generar_fragmentado(empleados_data, hojas, progreso, compresion, cronometro)
+
+    return await _renderizar_en_pool(cronometro, empleados_data, fecha_inicio, fecha_fin, modo, progreso, backend, compresion)
@@ -0,0 +1,124 @@
+import asyncio
+import logging
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from config import settings
+from services.excel_service import escribir_excel, MODO_STREAMING
+from utils.metricas import Cronometro
+
+logger = logging.getLogger(__name__)
+
+# Marca de fin de archivo en la cola de bloques
+_FIN = object()
+
+
+class _CanalEscritura:
+    """
+    Flujo binario de solo escritura, sin seek, que entrega lo escrito al event
+    loop en bloques de tamaño fijo a través de una cola acotada.
+
+    Se escribe desde un hilo; si la cola está llena el hilo espera, así el
+    renderizado nunca se adelanta más de unos pocos bloques al cliente.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, cola: asyncio.Queue, tamano_bloque: int):
+        self._loop = loop
+        self._cola = cola
+        self._tamano_bloque = tamano_bloque
+        self._buffer = bytearray()
+        self.bytes_escritos = 0
+        self.cancelado = False
+
+    def write(self, datos) -> int:
+        if self.cancelado:
+            raise ConnectionAbortedError("El cliente cerró la conexión")
+
+        self._buffer += datos
+        self.bytes_escritos += len(datos)
+        if len(self._buffer) >= self._tamano_bloque:
+            self._enviar(bytes(self._buffer))
+            self._buffer.clear()
+        return len(datos)
+
+    def flush(self) -> None:
+        pass
+
+    def cerrar(self) -> None:
+        """Envía lo que quede en el buffer y la marca de fin."""
+        if self._buffer:
+            self._enviar(bytes(self._buffer))
+            self._buffer.clear()
+        self._enviar(_FIN)
+
+    def fallar(self, error: BaseException) -> None:
+        """Propaga un error del renderizado al consumidor."""
+        if not self.cancelado:
+            self._enviar(error)
+
+    def _enviar(self, elemento: Any) -> None:
+        asyncio.run_coroutine_threadsafe(
+            self._cola.put(elemento), self._loop).result()
+
+
+async def stream_excel_report(empleados_data: List[Dict[str, Any]], fecha_inicio: Optional[str] = None, fecha_fin: Optional[str] = None, modo: Optional[str] = None, backend: Optional[str] = None, compresion: Optional[str] = None, cronometro: Optional[Cronometro] = None) -> AsyncIterator[bytes]:
+    """
+    Genera el Excel y lo entrega por partes a medida que se escribe el zip.
+
+    Por defecto usa el modo de escritura streaming: cada fila se comprime dentro
+    de la hoja apenas se genera, así que ni el primer byte ni la memoria dependen
+    del tamaño del reporte. El renderizado corre en un hilo porque los bloques
+    deben llegar a este proceso; el pool de procesos se usa solo con
+    generate_excel_report.
+
+    Args:
+        empleados_data: Lista de datos de empleados con sus marcaciones
+        fecha_inicio: Fecha inicial en formato YYYY-MM-DD
+        fecha_fin: Fecha final en formato YYYY-MM-DD
+        modo: Modo de escritura; None usa "streaming"
+        backend: Motor de escritura ("openpyxl" o "nativo")
+        compresion: Perfil de compresión del zip
+        cronometro: Cronómetro opcional donde se suman las etapas del renderizado
+
+    Yields:
+        Bloques consecutivos del archivo xlsx
+    """
+    loop = asyncio.get_running_loop()
+    cola = asyncio.Queue(maxsize=settings.EXCEL_STREAM_BLOQUES_EN_COLA)
+    canal = _CanalEscritura(loop, cola, settings.EXCEL_STREAM_TAMANO_BLOQUE)
+
+    def _producir():
+        try:
+            escribir_excel(canal, empleados_data, fecha_inicio,
+                           fecha_fin, modo or MODO_STREAMING, backend=backend, compresion=compresion,
+                           cronometro=cronometro)
+            canal.cerrar()
+        except ConnectionAbortedError:
+            logger.info(
+                "Generación de Excel interrumpida: el cliente se desconectó")
+        except Exception as e:
+            logger.exception("Error al generar el Excel en streaming: %s", e)
+            canal.fallar(e)
+
+    productor = loop.run_in_executor(None, _producir)
+
+    terminado = False
+    try:
+        while True:
+            bloque = await cola.get()
+            if bloque is _FIN:
+                terminado = True
+                break
+            if isinstance(bloque, BaseException):
+                raise bloque
+            yield bloque
+
+        await productor
+        logger.info("Excel enviado en streaming. Tamaño: %.2f KB",
+                    canal.bytes_escritos / 1024)
+    finally:
+        if not terminado:
+            # El cliente se fue o hubo un error: detener al productor y liberar
+            # la cola por si está bloqueado esperando espacio
+            canal.cancelado = True
+            while not cola.empty():
+                cola.get_nowait()
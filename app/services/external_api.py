@@ -1,9 +1,74 @@
 import json
-from typing import Optional, List, Dict, Any
+import logging
+from typing import List, Optional, Type, TypeVar
 from fastapi import HTTPException
+from fastapi.exceptions import RequestValidationError
+from pydantic import BaseModel, ValidationError
+import orjson
 
+from models.schemas import EmpleadoMarcaciones, Marcacion, ReporteRequest
 
-async def process_empleados_data(data: List[Dict[str, Any]], fecha_inicio: Optional[str] = None, fecha_fin: Optional[str] = None) -> List[Dict[str, Any]]:
+logger = logging.getLogger(__name__)
+
+ModeloSolicitud = TypeVar("ModeloSolicitud", bound=BaseModel)
+
+
+def decodificar_reporte(cuerpo: bytes, confiable: bool = False) -> ReporteRequest:
+    """
+    Decodifica el cuerpo de la solicitud directamente a ReporteRequest.
+
+    Args:
+        cuerpo: Bytes JSON recibidos en el body del request
+        confiable: Si es True (llamadas internas) se construyen los modelos sin
+            validar cada campo
+
+    Returns:
+        Solicitud con los empleados ya tipados
+    """
+    if not confiable:
+        try:
+            return ReporteRequest.model_validate_json(cuerpo)
+        except ValidationError as e:
+            raise RequestValidationError(e.errors(include_url=False))
+
+    try:
+        datos = orjson.loads(cuerpo)
+    except orjson.JSONDecodeError as e:
+        raise HTTPException(status_code=400, detail=f"JSON inválido: {str(e)}")
+
+    if not isinstance(datos, dict):
+        raise HTTPException(
+            status_code=400, detail="El cuerpo debe ser un objeto JSON")
+
+    empleados = []
+    for empleado in datos.get("empleados_data") or []:
+        marcaciones = [Marcacion.model_construct(**m)
+                       for m in empleado.get("marcaciones") or []]
+        empleados.append(EmpleadoMarcaciones.model_construct(
+            **{**empleado, "marcaciones": marcaciones}))
+
+    return ReporteRequest.model_construct(**{**datos, "empleados_data": empleados})
+
+
+def decodificar_json(cuerpo: bytes, modelo: Type[ModeloSolicitud]) -> ModeloSolicitud:
+    """
+    Decodifica y valida un cuerpo JSON con el modelo indicado (cambios de un
+    reporte incremental, ingesta o reporte del almacén local).
+
+    Args:
+        cuerpo: Bytes JSON recibidos en el body del request
+        modelo: Modelo pydantic de la solicitud
+
+    Returns:
+        Solicitud validada
+    """
+    try:
+        return modelo.model_validate_json(cuerpo)
+    except ValidationError as e:
+        raise RequestValidationError(e.errors(include_url=False))
+
+
+async def process_empleados_data(data: List[EmpleadoMarcaciones], fecha_inicio: Optional[str] = None, fecha_fin: Optional[str] = None) -> List[EmpleadoMarcaciones]:
     """
     Procesa los datos de empleados recibidos directamente en el endpoint.
 
@@ -13,7 +78,7 @@ async def process_empleados_data(data: List[Dict[str, Any]], fecha_inicio: Optio
         fecha_fin: Fecha final en formato YYYY-MM-DD (para referencia)
 
     Returns:
-        Lista de diccionarios con datos de empleados procesados
+        Lista de empleados procesados
     """
     try:
         # Validar que se recibieron datos
@@ -27,29 +92,33 @@ async def process_empleados_data(data: List[Dict[str, Any]], fecha_inicio: Optio
         if not isinstance(data, list):
             data = [data]
 
-        print(f"Procesando datos de {len(data)} empleados")
+        logger.info("Procesando datos de %d empleados", len(data))
 
-        # Añade logs detallados para depuración
-        if len(data) > 0:
-            print(
-                f"Ejemplo del primer empleado: {json.dumps(data, default=str)[:500]}...")
+        # Detalle para depuración: solo se serializa el primer empleado y solo
+        # si el nivel DEBUG está activo
+        if len(data) > 0 and logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Ejemplo del primer empleado: %s...",
+                         data[0].model_dump_json()[:500])
 
         return data
 
     except Exception as e:
         # Registrar el error con detalles
-        print(f"Error al procesar los datos: {str(e)}")
+        logger.error("Error al procesar los datos: %s", e)
 
         try:
             with open("test.json", "r", encoding="utf-8") as file:
                 fallback_data = json.load(file)
                 if not isinstance(fallback_data, list):
                     fallback_data = [fallback_data]
+                fallback_data = [EmpleadoMarcaciones.model_validate(
+                    e) for e in fallback_data]
 
-                print("Usando datos de prueba del archivo local")
+                logger.warning("Usando datos de prueba del archivo local")
                 return fallback_data
         except Exception as fallback_error:
-            print(f"Error al cargar datos de respaldo: {str(fallback_error)}")
+            logger.error("Error al cargar datos de respaldo: %s",
+                         fallback_error)
             raise HTTPException(
                 status_code=503,
                 detail=f"Error al procesar los datos: {str(e)}"
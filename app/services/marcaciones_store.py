@@ -0,0 +1,265 @@
+import asyncio
+import logging
+import threading
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from itertools import groupby
+from operator import itemgetter
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from pydantic import TypeAdapter
+from sqlalchemy import create_engine, event, func, select
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.engine import Engine
+from sqlalchemy.sql import Select
+
+from config import settings
+from models.schemas import EmpleadoMarcaciones
+from models.store import CAMPOS_EMPLEADO, CAMPOS_MARCACION, empleados, marcaciones, metadata
+
+logger = logging.getLogger(__name__)
+
+_motor: Optional[Engine] = None
+_lock_motor = threading.Lock()
+
+_empleados_adapter = TypeAdapter(List[EmpleadoMarcaciones])
+
+# Columnas leídas en las consultas de cargar_empleados, en orden
+COLUMNAS_EMPLEADO = ("emp_code",) + CAMPOS_EMPLEADO
+COLUMNAS_MARCACION = ("emp_code", "fecha") + CAMPOS_MARCACION
+
+
+def _configurar_sqlite(conexion, _registro) -> None:
+    """WAL permite leer (generar reportes) mientras se ingieren datos."""
+    cursor = conexion.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.close()
+
+
+def obtener_motor() -> Engine:
+    """Motor de SQLAlchemy del almacén; crea el archivo y las tablas la primera vez."""
+    global _motor
+
+    with _lock_motor:
+        if _motor is None:
+            motor = create_engine(f"sqlite:///{settings.STORE_RUTA}")
+            event.listen(motor, "connect", _configurar_sqlite)
+            metadata.create_all(motor)
+            _motor = motor
+            logger.info("Almacén de marcaciones abierto en %s", settings.STORE_RUTA)
+    return _motor
+
+
+def cerrar_store() -> None:
+    """Cierra las conexiones del almacén."""
+    global _motor
+
+    with _lock_motor:
+        if _motor is not None:
+            _motor.dispose()
+            _motor = None
+
+
+@dataclass
+class ResultadoIngesta:
+    """Cantidades guardadas en una ingesta."""
+    empleados: int
+    marcaciones: int
+    # Marcaciones descartadas porque su fecha no se pudo interpretar
+    marcaciones_invalidas: int
+
+
+def _valor_columna(valor: Any) -> Any:
+    # hire_date y fecha_cese pueden llegar como datetime desde llamadas internas
+    return valor.isoformat() if isinstance(valor, datetime) else valor
+
+
+def guardar_empleados(empleados_data: Iterable[EmpleadoMarcaciones]) -> ResultadoIngesta:
+    """
+    Inserta o actualiza empleados y marcaciones en una sola transacción.
+
+    Un empleado nuevo se guarda con todos sus campos (los no enviados toman el
+    valor por defecto del esquema); de uno existente solo se actualizan los
+    campos enviados, así una ingesta diaria puede traer solo emp_code y las
+    marcaciones del día. Cada marcación reemplaza a la del mismo emp_code y
+    fecha.
+
+    Args:
+        empleados_data: Empleados validados con sus marcaciones
+
+    Returns:
+        Cantidades guardadas y descartadas
+    """
+    # Las actualizaciones se agrupan por campos enviados: un executemany por grupo
+    por_campos: Dict[Tuple[str, ...], List[Dict[str, Any]]] = {}
+    filas_marcaciones: Dict[Tuple[str, str], Dict[str, Any]] = {}
+    cantidad_empleados = 0
+    invalidas = 0
+
+    for empleado in empleados_data:
+        if not empleado.emp_code:
+            continue
+        cantidad_empleados += 1
+        campos = tuple(campo for campo in CAMPOS_EMPLEADO if campo in empleado.model_fields_set)
+        fila = {"emp_code": empleado.emp_code}
+        fila.update((campo, _valor_columna(getattr(empleado, campo))) for campo in CAMPOS_EMPLEADO)
+        por_campos.setdefault(campos, []).append(fila)
+
+        for marcacion in empleado.marcaciones:
+            fecha = marcacion.fecha_iso
+            if fecha is None:
+                invalidas += 1
+                continue
+            fila_marcacion = {"emp_code": empleado.emp_code, "fecha": fecha}
+            fila_marcacion.update((campo, getattr(marcacion, campo)) for campo in CAMPOS_MARCACION)
+            filas_marcaciones[(empleado.emp_code, fecha)] = fila_marcacion
+
+    with obtener_motor().begin() as conexion:
+        for campos, filas in por_campos.items():
+            sentencia = insert(empleados)
+            if campos:
+                sentencia = sentencia.on_conflict_do_update(
+                    index_elements=[empleados.c.emp_code],
+                    set_={campo: sentencia.excluded[campo] for campo in campos})
+            else:
+                sentencia = sentencia.on_conflict_do_nothing(index_elements=[empleados.c.emp_code])
+            conexion.execute(sentencia, filas)
+
+        if filas_marcaciones:
+            sentencia = insert(marcaciones)
+            sentencia = sentencia.on_conflict_do_update(
+                index_elements=[marcaciones.c.emp_code, marcaciones.c.fecha],
+                set_={campo: sentencia.excluded[campo] for campo in CAMPOS_MARCACION})
+            conexion.execute(sentencia, list(filas_marcaciones.values()))
+
+    resultado = ResultadoIngesta(cantidad_empleados, len(filas_marcaciones), invalidas)
+    logger.info("Ingesta en el almacén: %d empleados, %d marcaciones (%d inválidas)",
+                resultado.empleados, resultado.marcaciones, resultado.marcaciones_invalidas)
+    return resultado
+
+
+def validar_rango(fecha_inicio: str, fecha_fin: str) -> Tuple[str, str]:
+    """
+    Valida el rango de una consulta al almacén.
+
+    Returns:
+        Tupla (fecha inicial, fecha final) en orden
+
+    Raises:
+        ValueError: Si alguna fecha no tiene el formato YYYY-MM-DD
+    """
+    try:
+        inicio = datetime.strptime(fecha_inicio, "%Y-%m-%d").date()
+        fin = datetime.strptime(fecha_fin, "%Y-%m-%d").date()
+    except ValueError:
+        raise ValueError("fecha_inicio y fecha_fin deben tener el formato YYYY-MM-DD")
+    return min(inicio, fin).isoformat(), max(inicio, fin).isoformat()
+
+
+def _consultas_reporte(fecha_inicio: str, fecha_fin: str, emp_codes: Optional[List[str]] = None, dept_name: Optional[str] = None, gerencia: Optional[str] = None) -> Tuple[Select, Select]:
+    """
+    Consultas de cargar_empleados: los empleados filtrados y sus marcaciones del rango.
+
+    Las marcaciones se leen partiendo de empleados: por cada emp_code se busca
+    el rango de fechas en la clave primaria (emp_code, fecha), así la consulta
+    lee solo las marcaciones del rango y no todo el historial.
+
+    Returns:
+        Tupla (consulta de empleados, consulta de marcaciones)
+    """
+    filtros = []
+    if emp_codes is not None:
+        filtros.append(empleados.c.emp_code.in_(emp_codes))
+    if dept_name:
+        filtros.append(empleados.c.dept_name == dept_name)
+    if gerencia:
+        filtros.append(empleados.c.gerencia == gerencia)
+
+    consulta_empleados = select(
+        *(empleados.c[columna] for columna in COLUMNAS_EMPLEADO)
+    ).where(*filtros).order_by(empleados.c.id)
+
+    consulta_marcaciones = select(
+        *(marcaciones.c[columna] for columna in COLUMNAS_MARCACION)
+    ).select_from(empleados).join(
+        marcaciones, marcaciones.c.emp_code == empleados.c.emp_code
+    ).where(
+        marcaciones.c.fecha.between(fecha_inicio, fecha_fin), *filtros
+    ).order_by(empleados.c.emp_code, marcaciones.c.fecha)
+
+    return consulta_empleados, consulta_marcaciones
+
+
+def cargar_empleados(fecha_inicio: str, fecha_fin: str, emp_codes: Optional[List[str]] = None, dept_name: Optional[str] = None, gerencia: Optional[str] = None) -> List[EmpleadoMarcaciones]:
+    """
+    Lee del almacén los empleados (en orden de alta) con sus marcaciones del rango.
+
+    Son dos consultas (ver _consultas_reporte): los empleados filtrados y
+    todas sus marcaciones entre las fechas, ordenadas por (emp_code, fecha).
+    El reporte es el mismo que se obtiene enviando esos empleados con las
+    marcaciones del rango.
+
+    Args:
+        fecha_inicio: Fecha inicial en formato YYYY-MM-DD
+        fecha_fin: Fecha final en formato YYYY-MM-DD
+        emp_codes: Solo estos empleados (None para no filtrar)
+        dept_name: Solo los empleados de esta área
+        gerencia: Solo los empleados de esta gerencia
+
+    Returns:
+        Empleados con sus marcaciones, listos para el reporte
+    """
+    consulta_empleados, consulta_marcaciones = _consultas_reporte(
+        fecha_inicio, fecha_fin, emp_codes, dept_name, gerencia)
+
+    with obtener_motor().connect() as conexion:
+        filas_empleados = conexion.execute(consulta_empleados).all()
+        por_empleado = {
+            emp_code: [dict(zip(COLUMNAS_MARCACION, fila)) for fila in filas]
+            for emp_code, filas in groupby(conexion.execute(consulta_marcaciones).all(), key=itemgetter(0))
+        }
+
+    datos = []
+    for fila in filas_empleados:
+        empleado = {campo: valor for campo, valor in zip(COLUMNAS_EMPLEADO, fila) if valor is not None}
+        empleado["marcaciones"] = por_empleado.get(fila[0], [])
+        datos.append(empleado)
+
+    # Una sola validación para todo el lote: más rápida que construir cada
+    # modelo por separado, y los valores vuelven a tener los tipos del esquema
+    resultado = _empleados_adapter.validate_python(datos)
+
+    logger.info("Almacén: %d empleados y %d marcaciones entre %s y %s",
+                len(resultado), sum(len(m) for m in por_empleado.values()), fecha_inicio, fecha_fin)
+    return resultado
+
+
+def estadisticas_store() -> Dict[str, Any]:
+    """Cantidad de empleados y marcaciones guardados y rango de fechas cubierto."""
+    with obtener_motor().connect() as conexion:
+        cantidad_empleados = conexion.execute(select(func.count()).select_from(empleados)).scalar_one()
+        cantidad, primera, ultima = conexion.execute(select(
+            func.count(), func.min(marcaciones.c.fecha), func.max(marcaciones.c.fecha))).one()
+    return {
+        "ruta": settings.STORE_RUTA,
+        "empleados": cantidad_empleados,
+        "marcaciones": cantidad,
+        "fecha_minima": primera,
+        "fecha_maxima": ultima,
+    }
+
+
+async def ingerir_empleados(empleados_data: List[EmpleadoMarcaciones]) -> Dict[str, int]:
+    """Guarda los empleados en el almacén fuera del event loop."""
+    loop = asyncio.get_running_loop()
+    resultado = await loop.run_in_executor(None, guardar_empleados, empleados_data)
+    return asdict(resultado)
+
+
+async def consultar_empleados(fecha_inicio: str, fecha_fin: str, emp_codes: Optional[List[str]] = None, dept_name: Optional[str] = None, gerencia: Optional[str] = None) -> List[EmpleadoMarcaciones]:
+    """Lee los empleados del almacén fuera del event loop (ver cargar_empleados)."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        None, cargar_empleados, fecha_inicio, fecha_fin, emp_codes, dept_name, gerencia)
@@ -0,0 +1,169 @@
+import asyncio
+import io
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Dict, List, Tuple
+
+from fastapi import HTTPException
+from pydantic import ValidationError
+
+from config import settings
+from models.schemas import EmpleadoMarcaciones, ReporteNdjsonEncabezado
+from services.excel_service import escribir_excel, MODO_STREAMING
+
+# Marca de fin de la cola de empleados
+_FIN = object()
+
+
+@dataclass
+class ResultadoNdjson:
+    """Resultado de generar un reporte a partir de un cuerpo NDJSON."""
+    excel_bytes: bytes
+    encabezado: ReporteNdjsonEncabezado
+    empleados_validos: int = 0
+    errores: List[Dict[str, Any]] = field(default_factory=list)
+
+
+async def iterar_lineas_ndjson(chunks: AsyncIterator[bytes], max_bytes_linea: int) -> AsyncIterator[Tuple[int, bytes]]:
+    """
+    Separa un cuerpo NDJSON en líneas a medida que llegan los bloques.
+
+    Args:
+        chunks: Bloques del cuerpo de la solicitud
+        max_bytes_linea: Tamaño máximo permitido para una línea
+
+    Yields:
+        Tuplas (número de línea, contenido) omitiendo las líneas vacías
+    """
+    # Partes de la línea en curso: se unen una sola vez al llegar su salto de
+    # línea, y en cada bloque solo se buscan saltos en los datos nuevos
+    pendiente: List[bytes] = []
+    bytes_pendientes = 0
+    numero = 0
+
+    async for chunk in chunks:
+        inicio = 0
+        fin = chunk.find(b"\n")
+        while fin != -1:
+            pendiente.append(chunk[inicio:fin])
+            linea = b"".join(pendiente).strip()
+            pendiente.clear()
+            bytes_pendientes = 0
+            numero += 1
+            if linea:
+                yield numero, linea
+            inicio = fin + 1
+            fin = chunk.find(b"\n", inicio)
+
+        if inicio < len(chunk):
+            pendiente.append(chunk[inicio:])
+            bytes_pendientes += len(chunk) - inicio
+        if bytes_pendientes > max_bytes_linea:
+            raise HTTPException(
+                status_code=413,
+                detail=f"La línea {numero + 1} supera el máximo de {max_bytes_linea} bytes"
+            )
+
+    linea = b"".join(pendiente).strip()
+    if linea:
+        yield numero + 1, linea
+
+
+def _resumir_error(error: ValidationError) -> str:
+    """Convierte un error de validación en un texto corto de una línea."""
+    partes = []
+    for detalle in error.errors()[:3]:
+        ubicacion = ".".join(str(p) for p in detalle.get("loc", ()))
+        mensaje = detalle.get("msg")
+        partes.append(f"{ubicacion}: {mensaje}" if ubicacion else mensaje)
+    return "; ".join(partes)
+
+
+async def generar_excel_desde_ndjson(chunks: AsyncIterator[bytes]) -> ResultadoNdjson:
+    """
+    Genera el reporte Excel a partir de un cuerpo NDJSON.
+
+    La primera línea es el encabezado con fecha_inicio y fecha_fin; cada línea
+    siguiente es un EmpleadoMarcaciones. Cada empleado se valida apenas llega y
+    pasa a un hilo que va escribiendo su fila en el Excel (modo streaming), así
+    que nunca se tiene el cuerpo completo en memoria. Con un rango de varios
+    meses, las filas se renderizan para todas las hojas por fragmentos de
+    EXCEL_EMPLEADOS_POR_FRAGMENTO empleados a medida que llegan; solo con el
+    backend nativo se esperan todos los empleados, porque escribe las hojas una
+    tras otra. Las líneas inválidas se registran y se omiten sin fallar la
+    solicitud.
+
+    Args:
+        chunks: Bloques del cuerpo de la solicitud
+
+    Returns:
+        ResultadoNdjson con el archivo generado y los errores por línea
+    """
+    lineas = iterar_lineas_ndjson(chunks, settings.NDJSON_MAX_BYTES_LINEA)
+
+    try:
+        numero, primera = await lineas.__anext__()
+    except StopAsyncIteration:
+        raise HTTPException(status_code=400, detail="El cuerpo NDJSON está vacío")
+
+    try:
+        encabezado = ReporteNdjsonEncabezado.model_validate_json(primera)
+    except ValidationError as e:
+        raise HTTPException(
+            status_code=422,
+            detail=f"Encabezado NDJSON inválido en la línea {numero}: {_resumir_error(e)}"
+        )
+
+    loop = asyncio.get_running_loop()
+    # La cola vive en el event loop: el hilo del renderizado toma cada empleado
+    # con run_coroutine_threadsafe, así la entrega no ocupa otro hilo del
+    # executor (con varias cargas a la vez, los hilos del executor podrían
+    # quedar todos esperando empleados que nadie puede encolar)
+    cola: "asyncio.Queue[Any]" = asyncio.Queue(
+        maxsize=settings.NDJSON_EMPLEADOS_EN_COLA)
+    salida = io.BytesIO()
+
+    def _empleados():
+        while True:
+            empleado = asyncio.run_coroutine_threadsafe(cola.get(), loop).result()
+            if empleado is _FIN:
+                return
+            yield empleado
+
+    renderizador = loop.run_in_executor(
+        None, escribir_excel, salida, _empleados(),
+        encabezado.fecha_inicio, encabezado.fecha_fin, MODO_STREAMING)
+
+    async def _encolar(elemento):
+        if renderizador.done():
+            return
+        # El renderizado va más lento que la red: esperar espacio en la cola,
+        # salvo que el renderizado termine (falló) mientras tanto
+        poner = asyncio.ensure_future(cola.put(elemento))
+        try:
+            await asyncio.wait((poner, renderizador), return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            if not poner.done():
+                poner.cancel()
+
+    resultado = ResultadoNdjson(excel_bytes=b"", encabezado=encabezado)
+    try:
+        async for numero, linea in lineas:
+            if renderizador.done():
+                # El renderizado falló; su error se propaga abajo
+                break
+            try:
+                empleado = EmpleadoMarcaciones.model_validate_json(linea)
+            except ValidationError as e:
+                resultado.errores.append(
+                    {"linea": numero, "error": _resumir_error(e)})
+                continue
+
+            await _encolar(empleado)
+            resultado.empleados_validos += 1
+    finally:
+        if not renderizador.done():
+            await _encolar(_FIN)
+
+    await renderizador
+    resultado.excel_bytes = salida.getvalue()
+    return resultado
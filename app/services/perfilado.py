@@ -0,0 +1,202 @@
+import cProfile
+import io
+import json
+import logging
+import marshal
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Callable, List, Optional, Tuple
+
+from config import settings
+from services.excel_service import escribir_excel, renderizar_excel
+from services.render_pool import ejecutar_en_pool
+
+logger = logging.getLogger(__name__)
+
+ETAPA_RENDERIZADO = "renderizado"
+
+
+@dataclass
+class Perfil:
+    """Resultado de perfilar una etapa: CPU (cProfile) y memoria (tracemalloc)."""
+    etapa: str
+    segundos: float
+    # Estadísticas de cProfile serializadas con marshal (formato de pstats.dump_stats)
+    estadisticas: bytes
+    resumen: str
+    memoria_pico_bytes: int
+    asignaciones: List[str] = field(default_factory=list)
+
+
+def perfilar(etapa: str, funcion: Callable[..., Any], *args: Any, **kwargs: Any) -> Tuple[Any, Perfil]:
+    """
+    Ejecuta la función bajo cProfile y tracemalloc en el proceso actual.
+
+    Es una función de módulo para poder enviarse al pool de procesos junto con
+    la función a perfilar (por ejemplo renderizar_excel), de modo que el perfil
+    cubra el trabajo que hace el worker y no solo la espera en el event loop.
+
+    Args:
+        etapa: Nombre de la etapa perfilada
+        funcion: Función a ejecutar
+        *args, **kwargs: Argumentos de la función
+
+    Returns:
+        Tupla (resultado de la función, perfil)
+    """
+    traza_propia = not tracemalloc.is_tracing()
+    if traza_propia:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    perfilador = cProfile.Profile()
+
+    inicio = time.perf_counter()
+    try:
+        resultado = perfilador.runcall(funcion, *args, **kwargs)
+    finally:
+        segundos = time.perf_counter() - inicio
+        _, pico = tracemalloc.get_traced_memory()
+        asignaciones = tracemalloc.take_snapshot().statistics("lineno")
+        if traza_propia:
+            tracemalloc.stop()
+
+    resumen = io.StringIO()
+    estadisticas = pstats.Stats(perfilador, stream=resumen)
+    estadisticas.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(settings.PERFILADO_FUNCIONES_RESUMEN)
+
+    return resultado, Perfil(
+        etapa=etapa,
+        segundos=segundos,
+        estadisticas=marshal.dumps(estadisticas.stats),
+        resumen=resumen.getvalue(),
+        memoria_pico_bytes=pico,
+        asignaciones=[str(estadistica) for estadistica in
+                      asignaciones[:settings.PERFILADO_TOP_ASIGNACIONES]]
+    )
+
+
+class _SalidaSecuencial:
+    """
+    Destino de solo escritura, sin tell ni seek, como el canal de la respuesta
+    en streaming: zipfile escribe entonces los descriptores de datos después de
+    cada archivo y los bytes son los mismos que se envían en streaming.
+    """
+
+    def __init__(self):
+        self._partes: List[bytes] = []
+
+    def write(self, datos) -> int:
+        self._partes.append(bytes(datos))
+        return len(datos)
+
+    def flush(self) -> None:
+        pass
+
+    def getvalue(self) -> bytes:
+        return b"".join(self._partes)
+
+
+def renderizar_excel_secuencial(*args: Any) -> bytes:
+    """Como renderizar_excel, pero con los bytes de la respuesta en streaming."""
+    salida = _SalidaSecuencial()
+    escribir_excel(salida, *args)
+    return salida.getvalue()
+
+
+async def generar_excel_perfilado(empleados_data: List[Any], fecha_inicio: Optional[str], fecha_fin: Optional[str], modo: Optional[str], backend: Optional[str], compresion: str, streaming: bool = False) -> Tuple[bytes, Perfil]:
+    """
+    Renderiza el Excel perfilado dentro de un worker del pool.
+
+    Se usa renderizar_excel, que hace todo el trabajo en un solo proceso (sin
+    repartir fragmentos entre workers), para que el perfil cubra el renderizado
+    completo. Los bytes son los mismos que los de generate_excel_report o, con
+    streaming, los de stream_excel_report.
+
+    Args:
+        modo: Modo de escritura ya resuelto (el de la clave del reporte)
+        streaming: Escribir como la respuesta en streaming (sin seek)
+
+    Returns:
+        Tupla (bytes del Excel, perfil del renderizado)
+    """
+    renderizar = renderizar_excel_secuencial if streaming else renderizar_excel
+    return await ejecutar_en_pool(
+        perfilar, ETAPA_RENDERIZADO, renderizar,
+        empleados_data, fecha_inicio, fecha_fin, modo, None, backend, compresion)
+
+
+class LimitadorPerfilado:
+    """
+    Permite un solo perfilado a la vez y como máximo uno cada
+    PERFILADO_INTERVALO_SEGUNDOS, para que el encabezado no pueda usarse para
+    sobrecargar el servidor.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._en_curso = False
+        self._ultimo: Optional[float] = None
+
+    def intentar(self) -> bool:
+        """Reserva el perfilado si está disponible; hay que liberarlo con terminar()."""
+        with self._lock:
+            ahora = time.monotonic()
+            if self._en_curso or (self._ultimo is not None and
+                                  ahora - self._ultimo < settings.PERFILADO_INTERVALO_SEGUNDOS):
+                return False
+            self._en_curso = True
+            self._ultimo = ahora
+            return True
+
+    def terminar(self) -> None:
+        with self._lock:
+            self._en_curso = False
+
+
+def guardar_perfiles(perfiles: List[Perfil], descripcion: dict) -> str:
+    """
+    Guarda los perfiles de una solicitud en PERFILADO_DIRECTORIO.
+
+    Por cada etapa escribe <id>-<etapa>.prof, que se abre con pstats.Stats o
+    herramientas como snakeviz, y un <id>.json con el resumen de CPU, el pico de
+    memoria y los principales sitios de asignación.
+
+    Args:
+        perfiles: Perfiles de las etapas de la solicitud
+        descripcion: Datos de la solicitud que se incluyen en el resumen
+
+    Returns:
+        Id del perfil (prefijo de los archivos)
+    """
+    perfil_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+    os.makedirs(settings.PERFILADO_DIRECTORIO, exist_ok=True)
+
+    for perfil in perfiles:
+        ruta = os.path.join(settings.PERFILADO_DIRECTORIO, f"{perfil_id}-{perfil.etapa}.prof")
+        with open(ruta, "wb") as archivo:
+            archivo.write(perfil.estadisticas)
+
+    resumen = {
+        "id": perfil_id,
+        "solicitud": descripcion,
+        "etapas": [{
+            "etapa": perfil.etapa,
+            "segundos": round(perfil.segundos, 4),
+            "memoria_pico_bytes": perfil.memoria_pico_bytes,
+            "asignaciones": perfil.asignaciones,
+            "cpu": perfil.resumen
+        } for perfil in perfiles]
+    }
+    with open(os.path.join(settings.PERFILADO_DIRECTORIO, f"{perfil_id}.json"), "w", encoding="utf-8") as archivo:
+        json.dump(resumen, archivo, ensure_ascii=False, indent=2)
+
+    logger.info("Perfil %s guardado en %s", perfil_id, settings.PERFILADO_DIRECTORIO)
+    return perfil_id
+
+
+limitador_perfilado = LimitadorPerfilado()
@@ -0,0 +1,90 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import Any, Callable, Optional
+
+from config import settings
+from utils.logger import configurar_logging
+
+logger = logging.getLogger(__name__)
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def _inicializar_worker() -> None:
+    """Importa el renderer (y openpyxl) al arrancar cada proceso del pool."""
+    configurar_logging()
+    import openpyxl  # noqa: F401
+    import services.excel_service  # noqa: F401
+
+
+def _calentar_worker(_: int) -> int:
+    """Tarea vacía usada para forzar el arranque de los procesos."""
+    return os.getpid()
+
+
+def iniciar_pool() -> Optional[ProcessPoolExecutor]:
+    """
+    Crea el pool de procesos de renderizado y arranca sus workers.
+
+    Returns:
+        El pool creado, o None si EXCEL_POOL_WORKERS es 0 (renderizado en hilos)
+    """
+    global _pool
+
+    if _pool is not None:
+        return _pool
+
+    workers = settings.EXCEL_POOL_WORKERS
+    if workers <= 0:
+        logger.info(
+            "Pool de procesos deshabilitado. Los reportes se generarán en hilos.")
+        return None
+
+    max_tareas = settings.EXCEL_POOL_MAX_TAREAS_POR_WORKER or None
+    # max_tasks_per_child no es compatible con fork, así que se usa spawn en ese caso
+    contexto = multiprocessing.get_context("spawn") if max_tareas else None
+
+    _pool = ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=contexto,
+        initializer=_inicializar_worker,
+        max_tasks_per_child=max_tareas
+    )
+
+    # Forzar el arranque de los workers para que el primer reporte no pague
+    # el costo de crear procesos e importar openpyxl
+    pids = set(_pool.map(_calentar_worker, range(workers)))
+    logger.info("Pool de renderizado iniciado con %d workers (%d calientes)",
+                workers, len(pids))
+    return _pool
+
+
+def cerrar_pool() -> None:
+    """Detiene el pool de procesos, esperando a que terminen los reportes en curso."""
+    global _pool
+
+    if _pool is not None:
+        _pool.shutdown(wait=True, cancel_futures=True)
+        _pool = None
+
+
+async def ejecutar_en_pool(funcion: Callable[..., Any], *args: Any) -> Any:
+    """
+    Ejecuta una función bloqueante fuera del event loop.
+
+    Usa el pool de procesos si está configurado (creándolo si aún no existe) y,
+    si EXCEL_POOL_WORKERS es 0, el executor de hilos por defecto.
+
+    Args:
+        funcion: Función a ejecutar; debe poder serializarse con pickle
+        *args: Argumentos de la función
+
+    Returns:
+        El resultado de la función
+    """
+    pool = _pool if _pool is not None else iniciar_pool()
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(pool, partial(funcion, *args))
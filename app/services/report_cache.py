@@ -0,0 +1,143 @@
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from pydantic import TypeAdapter
+
+from config import settings
+from models.schemas import EmpleadoMarcaciones
+
+logger = logging.getLogger(__name__)
+
+# Cambiar este valor invalida las claves si cambia el formato del reporte
+VERSION_REPORTE = "3"
+
+_empleados_adapter = TypeAdapter(List[EmpleadoMarcaciones])
+
+
+def clave_reporte(empleados_data: List[EmpleadoMarcaciones], fecha_inicio: Optional[str], fecha_fin: Optional[str], modo: Optional[str], backend: Optional[str] = None, formato: Optional[str] = None, compresion: Optional[str] = None, tipo: Optional[str] = None, streaming: bool = False) -> str:
+    """
+    Calcula el hash canónico (sha256) de una solicitud de reporte ya validada.
+
+    Como el Excel generado es determinista, la misma clave identifica siempre
+    los mismos bytes y sirve también como ETag.
+
+    Args:
+        empleados_data: Empleados validados del reporte
+        fecha_inicio: Fecha inicial en formato YYYY-MM-DD
+        fecha_fin: Fecha final en formato YYYY-MM-DD
+        modo: Modo de escritura solicitado
+        backend: Motor de escritura solicitado
+        formato: Formato de salida (xlsx, csv, json o parquet)
+        compresion: Perfil de compresión ya resuelto
+        tipo: Tipo de reporte (detalle o resumen)
+        streaming: Si el xlsx se envía en streaming: el zip se escribe sin
+            seek y lleva descriptores de datos, así que sus bytes son otros
+
+    Returns:
+        Hash hexadecimal de la solicitud
+    """
+    parametros = json.dumps(
+        [VERSION_REPORTE, fecha_inicio, fecha_fin, modo, backend, formato, compresion, tipo, streaming], separators=(",", ":"))
+    digest = hashlib.sha256(parametros.encode())
+    digest.update(_empleados_adapter.dump_json(empleados_data, warnings=False))
+    return digest.hexdigest()
+
+
+@dataclass
+class _Entrada:
+    contenido: bytes
+    expira: float
+
+
+class CacheReportes:
+    """
+    Caché LRU en memoria de reportes generados, acotado por cantidad de
+    reportes y por bytes totales, con expiración por tiempo (TTL).
+    """
+
+    def __init__(self, max_reportes: int, max_bytes: int, ttl_segundos: float):
+        self.max_reportes = max_reportes
+        self.max_bytes = max_bytes
+        self.ttl_segundos = ttl_segundos
+        self._entradas: "OrderedDict[str, _Entrada]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+        self.expulsiones = 0
+
+    def admite(self, tamano: int) -> bool:
+        """Indica si un reporte de ese tamaño puede guardarse en el caché."""
+        return self.max_reportes > 0 and tamano <= self.max_bytes
+
+    def obtener(self, clave: str) -> Optional[bytes]:
+        """Devuelve el reporte guardado bajo la clave, o None si no está o expiró."""
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is not None and entrada.expira <= time.monotonic():
+                self._quitar(clave)
+                self.expulsiones += 1
+                entrada = None
+
+            if entrada is None:
+                self.fallos += 1
+                return None
+
+            self._entradas.move_to_end(clave)
+            self.aciertos += 1
+            return entrada.contenido
+
+    def guardar(self, clave: str, contenido: bytes) -> None:
+        """Guarda un reporte y expulsa los menos usados si se superan los límites."""
+        if not self.admite(len(contenido)):
+            return
+
+        with self._lock:
+            if clave in self._entradas:
+                self._quitar(clave)
+
+            self._entradas[clave] = _Entrada(
+                contenido, time.monotonic() + self.ttl_segundos)
+            self._bytes += len(contenido)
+
+            while len(self._entradas) > self.max_reportes or self._bytes > self.max_bytes:
+                clave_antigua = next(iter(self._entradas))
+                self._quitar(clave_antigua)
+                self.expulsiones += 1
+
+    def limpiar(self) -> None:
+        """Vacía el caché (los contadores se conservan)."""
+        with self._lock:
+            self._entradas.clear()
+            self._bytes = 0
+
+    def estadisticas(self) -> Dict[str, Any]:
+        """Contadores y ocupación actual del caché."""
+        with self._lock:
+            return {
+                "reportes": len(self._entradas),
+                "bytes": self._bytes,
+                "aciertos": self.aciertos,
+                "fallos": self.fallos,
+                "expulsiones": self.expulsiones,
+                "max_reportes": self.max_reportes,
+                "max_bytes": self.max_bytes,
+                "ttl_segundos": self.ttl_segundos,
+            }
+
+    def _quitar(self, clave: str) -> None:
+        entrada = self._entradas.pop(clave)
+        self._bytes -= len(entrada.contenido)
+
+
+cache_reportes = CacheReportes(
+    max_reportes=settings.EXCEL_CACHE_MAX_REPORTES,
+    max_bytes=settings.EXCEL_CACHE_MAX_MB * 1024 * 1024,
+    ttl_segundos=settings.EXCEL_CACHE_TTL_SEGUNDOS,
+)
@@ -0,0 +1,321 @@
+import asyncio
+import glob
+import logging
+import multiprocessing
+import os
+import time
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from fastapi import HTTPException
+
+from config import settings
+from models.schemas import EmpleadoMarcaciones
+from services.excel_service import generate_excel_report
+from services.resumen_service import TIPO_DETALLE, TIPO_RESUMEN, generate_summary_report
+from utils.metricas import Indicador, registro
+
+logger = logging.getLogger(__name__)
+
+ESTADO_EN_COLA = "queued"
+ESTADO_EN_PROCESO = "running"
+ESTADO_TERMINADO = "done"
+ESTADO_FALLIDO = "failed"
+
+
+class _ValorLocal:
+    """Contador en memoria con la misma interfaz que un Value del Manager."""
+
+    def __init__(self):
+        self.value = 0
+
+
+class ProgresoCompartido:
+    """
+    Callback de progreso que el renderer invoca con los empleados procesados.
+
+    Se serializa con pickle hacia el pool de procesos; el contador vive en un
+    Manager de multiprocessing para que el proceso principal pueda leerlo. Solo
+    se actualiza cada `paso` empleados para no pagar una llamada entre procesos
+    por fila.
+    """
+
+    def __init__(self, valor: Any, total: int):
+        self.valor = valor
+        self.total = total
+        self.paso = max(1, total // 100)
+        self._ultimo = 0
+
+    def __call__(self, procesados: int) -> None:
+        if procesados - self._ultimo >= self.paso or procesados >= self.total:
+            self._ultimo = procesados
+            self.valor.value = procesados
+
+    def __getstate__(self):
+        return {"valor": self.valor, "total": self.total, "paso": self.paso, "_ultimo": 0}
+
+    @property
+    def procesados(self) -> int:
+        return self.valor.value
+
+
+def _iso(marca: Optional[float]) -> Optional[str]:
+    if marca is None:
+        return None
+    return datetime.fromtimestamp(marca, tz=timezone.utc).isoformat()
+
+
+@dataclass
+class TrabajoReporte:
+    """Estado de un reporte solicitado a la API de trabajos."""
+    id: str
+    fecha_inicio: Optional[str]
+    fecha_fin: Optional[str]
+    modo: Optional[str]
+    nombre_archivo: str
+    backend: Optional[str]
+    compresion: Optional[str]
+    tipo: str
+    total_empleados: int
+    progreso: ProgresoCompartido
+    empleados_data: Optional[List[EmpleadoMarcaciones]] = None
+    estado: str = ESTADO_EN_COLA
+    creado: float = field(default_factory=time.time)
+    iniciado: Optional[float] = None
+    terminado: Optional[float] = None
+    expira: Optional[float] = None
+    error: Optional[str] = None
+    ruta_archivo: Optional[str] = None
+    tamano_bytes: Optional[int] = None
+
+    def a_dict(self) -> Dict[str, Any]:
+        """Representación del trabajo para el endpoint de estado."""
+        procesados = self.total_empleados if self.estado == ESTADO_TERMINADO else self.progreso.procesados
+        ahora = time.time()
+        return {
+            "id": self.id,
+            "estado": self.estado,
+            "progreso": {
+                "procesados": procesados,
+                "total": self.total_empleados,
+                "porcentaje": round(100 * procesados / self.total_empleados, 1) if self.total_empleados else 100.0
+            },
+            "tiempos": {
+                "creado": _iso(self.creado),
+                "iniciado": _iso(self.iniciado),
+                "terminado": _iso(self.terminado),
+                "expira": _iso(self.expira),
+                "espera_segundos": round((self.iniciado or ahora) - self.creado, 3),
+                "duracion_segundos": round((self.terminado or ahora) - self.iniciado, 3) if self.iniciado else None
+            },
+            "tamano_bytes": self.tamano_bytes,
+            "error": self.error
+        }
+
+
+class GestorTrabajos:
+    """
+    Cola acotada de reportes que atiende un número fijo de workers asíncronos.
+
+    Cada worker usa generate_excel_report (el mismo renderer del endpoint
+    síncrono) y guarda el resultado en disco, donde se conserva hasta que expira.
+    """
+
+    def __init__(self):
+        self._trabajos: Dict[str, TrabajoReporte] = {}
+        self._cola: Optional[asyncio.Queue] = None
+        self._tareas: List[asyncio.Task] = []
+        # Arranque del Manager de multiprocessing (lanza un proceso servidor),
+        # hecho en el executor para no bloquear el event loop
+        self._manager: Optional[asyncio.Future] = None
+
+    @property
+    def directorio(self) -> str:
+        return settings.JOBS_DIRECTORIO
+
+    def iniciar(self) -> None:
+        """
+        Crea la cola, arranca los workers y la limpieza periódica.
+
+        Con pool de procesos también arranca, en el executor, el Manager donde
+        viven los contadores de progreso; enviar espera a que esté listo.
+        """
+        if self._cola is not None:
+            return
+
+        os.makedirs(self.directorio, exist_ok=True)
+        # Los archivos de una ejecución anterior ya no tienen trabajo asociado
+        for ruta in glob.glob(os.path.join(self.directorio, "*.xlsx")):
+            self._eliminar_archivo(ruta)
+
+        self._cola = asyncio.Queue(maxsize=settings.JOBS_MAX_EN_COLA)
+        self._tareas = [
+            asyncio.create_task(self._worker(n))
+            for n in range(max(settings.JOBS_WORKERS, 1))
+        ]
+        self._tareas.append(asyncio.create_task(self._limpieza_periodica()))
+        if settings.EXCEL_POOL_WORKERS > 0:
+            self._manager = asyncio.get_running_loop().run_in_executor(None, multiprocessing.Manager)
+        logger.info("API de trabajos iniciada con %d workers", max(settings.JOBS_WORKERS, 1))
+
+    async def detener(self) -> None:
+        """Cancela los workers y cierra el Manager del progreso."""
+        for tarea in self._tareas:
+            tarea.cancel()
+        await asyncio.gather(*self._tareas, return_exceptions=True)
+        self._tareas = []
+        self._cola = None
+
+        if self._manager is not None:
+            manager, self._manager = self._manager, None
+            try:
+                await asyncio.get_running_loop().run_in_executor(None, (await manager).shutdown)
+            except Exception as e:
+                logger.warning("No se pudo cerrar el Manager del progreso: %s", e)
+
+    async def enviar(self, empleados_data: List[EmpleadoMarcaciones], fecha_inicio: Optional[str], fecha_fin: Optional[str], modo: Optional[str], nombre_archivo: str, backend: Optional[str] = None, compresion: Optional[str] = None, tipo: str = TIPO_DETALLE) -> TrabajoReporte:
+        """
+        Encola un reporte.
+
+        Raises:
+            HTTPException: 503 si la cola de trabajos está llena
+        """
+        self.iniciar()
+
+        trabajo = TrabajoReporte(
+            id=uuid.uuid4().hex,
+            fecha_inicio=fecha_inicio,
+            fecha_fin=fecha_fin,
+            modo=modo,
+            nombre_archivo=nombre_archivo,
+            backend=backend,
+            compresion=compresion,
+            tipo=tipo,
+            total_empleados=len(empleados_data),
+            progreso=ProgresoCompartido(await self._nuevo_contador(), len(empleados_data)),
+            empleados_data=empleados_data
+        )
+
+        try:
+            self._cola.put_nowait(trabajo)
+        except asyncio.QueueFull:
+            raise HTTPException(
+                status_code=503,
+                detail="Hay demasiados reportes en cola. Intente nuevamente en unos minutos."
+            )
+
+        self._trabajos[trabajo.id] = trabajo
+        logger.info("Trabajo %s encolado (%d empleados)", trabajo.id, trabajo.total_empleados)
+        return trabajo
+
+    def obtener(self, trabajo_id: str) -> Optional[TrabajoReporte]:
+        """Devuelve el trabajo si existe y no expiró."""
+        trabajo = self._trabajos.get(trabajo_id)
+        if trabajo is not None and trabajo.expira is not None and trabajo.expira <= time.time():
+            self._descartar(trabajo)
+            return None
+        return trabajo
+
+    def contar_por_estado(self) -> Dict[tuple, int]:
+        """Trabajos en cola y en proceso, con el formato de etiquetas de utils.metricas."""
+        conteos = {ESTADO_EN_COLA: 0, ESTADO_EN_PROCESO: 0}
+        for trabajo in list(self._trabajos.values()):
+            if trabajo.estado in conteos:
+                conteos[trabajo.estado] += 1
+        return {(("estado", estado),): cantidad for estado, cantidad in conteos.items()}
+
+    async def _nuevo_contador(self) -> Any:
+        # Con pool de procesos el contador debe ser visible entre procesos
+        if self._manager is None:
+            return _ValorLocal()
+        # Crear el Value es una llamada al proceso del Manager: fuera del loop
+        manager = await self._manager
+        return await asyncio.get_running_loop().run_in_executor(None, manager.Value, "i", 0)
+
+    async def _worker(self, numero: int) -> None:
+        while True:
+            trabajo = await self._cola.get()
+            try:
+                await self._ejecutar(trabajo)
+            finally:
+                self._cola.task_done()
+
+    async def _ejecutar(self, trabajo: TrabajoReporte) -> None:
+        trabajo.estado = ESTADO_EN_PROCESO
+        trabajo.iniciado = time.time()
+        empleados_data, trabajo.empleados_data = trabajo.empleados_data, None
+
+        try:
+            if trabajo.tipo == TIPO_RESUMEN:
+                excel_bytes = await generate_summary_report(
+                    empleados_data,
+                    trabajo.fecha_inicio,
+                    trabajo.fecha_fin,
+                    trabajo.progreso,
+                    trabajo.compresion
+                )
+            else:
+                excel_bytes = await generate_excel_report(
+                    empleados_data,
+                    trabajo.fecha_inicio,
+                    trabajo.fecha_fin,
+                    trabajo.modo,
+                    trabajo.progreso,
+                    trabajo.backend,
+                    trabajo.compresion
+                )
+            ruta = os.path.join(self.directorio, f"{trabajo.id}.xlsx")
+            await asyncio.get_running_loop().run_in_executor(
+                None, _escribir_archivo, ruta, excel_bytes)
+
+            trabajo.ruta_archivo = ruta
+            trabajo.tamano_bytes = len(excel_bytes)
+            trabajo.estado = ESTADO_TERMINADO
+            logger.info("Trabajo %s terminado (%.2f KB)", trabajo.id, len(excel_bytes) / 1024)
+        except Exception as e:
+            logger.exception("Error en el trabajo %s: %s", trabajo.id, e)
+            trabajo.estado = ESTADO_FALLIDO
+            trabajo.error = str(e)
+        finally:
+            trabajo.terminado = time.time()
+            trabajo.expira = trabajo.terminado + settings.JOBS_TTL_SEGUNDOS
+
+    async def _limpieza_periodica(self) -> None:
+        while True:
+            await asyncio.sleep(settings.JOBS_INTERVALO_LIMPIEZA_SEGUNDOS)
+            ahora = time.time()
+            for trabajo in list(self._trabajos.values()):
+                if trabajo.expira is not None and trabajo.expira <= ahora:
+                    self._descartar(trabajo)
+
+    def _descartar(self, trabajo: TrabajoReporte) -> None:
+        self._trabajos.pop(trabajo.id, None)
+        if trabajo.ruta_archivo:
+            self._eliminar_archivo(trabajo.ruta_archivo)
+        logger.debug("Trabajo %s expirado y eliminado", trabajo.id)
+
+    @staticmethod
+    def _eliminar_archivo(ruta: str) -> None:
+        try:
+            os.remove(ruta)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning("No se pudo eliminar %s: %s", ruta, e)
+
+
+def _escribir_archivo(ruta: str, contenido: bytes) -> None:
+    """Escribe el archivo de forma atómica (primero a un temporal)."""
+    temporal = ruta + ".tmp"
+    with open(temporal, "wb") as archivo:
+        archivo.write(contenido)
+    os.replace(temporal, ruta)
+
+
+gestor_trabajos = GestorTrabajos()
+
+registro.registrar(Indicador(
+    "reporte_trabajos", "Trabajos asíncronos en cola o en proceso",
+    funcion=gestor_trabajos.contar_por_estado))
@@ -0,0 +1,364 @@
+import asyncio
+import io
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from config import settings
+from models.schemas import EmpleadoMarcaciones, Marcacion
+from services.asistencia_engine import calcular_asistencia
+from services.excel_service import (
+    LayoutReporte, _como_empleado, _en_lotes, anchos_columnas, fila_empleado, layout_hoja,
+    planificar_hojas, resolver_compresion
+)
+from services.xlsx_nativo import (
+    FILAS_POR_ESCRITURA, _TablaCadenas, escribir_libro_xml, letras_columnas, xml_fila
+)
+from utils.metricas import Indicador, registro
+
+logger = logging.getLogger(__name__)
+
+# Reportes incrementales: el servidor conserva el estado calculado de un
+# reporte (empleados con todas sus marcaciones y el XML de cada fila) y el
+# cliente envía luego solo las marcaciones nuevas o corregidas. Cada
+# actualización recalcula las filas de los empleados que cambiaron y vuelve a
+# emitir el libro uniendo el XML ya armado del resto, sin recalcularlas.
+
+
+@dataclass
+class _HojaIncremental:
+    """Hoja de un reporte incremental con sus filas ya convertidas a XML."""
+    titulo: str
+    layout: LayoutReporte
+    letras: List[str]
+    # Filas 1 a 10 (encabezado), una entrada por fila como en xlsx_nativo
+    encabezado: List[bytes]
+    referencias_encabezado: int
+    # Elemento <row> de cada empleado y cadenas compartidas que usa, por posición
+    filas: List[bytes] = field(default_factory=list)
+    referencias: List[int] = field(default_factory=list)
+
+    @property
+    def primera_fila(self) -> int:
+        return len(self.layout.filas_encabezado) + 1
+
+    def cuerpo(self) -> Iterator[bytes]:
+        """XML de la hoja (encabezado y empleados) en los mismos bloques que xlsx_nativo."""
+        yield from self.encabezado
+        for inicio in range(0, len(self.filas), FILAS_POR_ESCRITURA):
+            yield b"".join(self.filas[inicio:inicio + FILAS_POR_ESCRITURA])
+
+
+@dataclass
+class ReporteIncremental:
+    """Estado de un reporte que se actualiza con cambios (ver aplicar_cambios)."""
+    id: str
+    fecha_inicio: Optional[str]
+    fecha_fin: Optional[str]
+    compresion: str
+    # Empleados en el orden del reporte y posición de cada emp_code
+    empleados: List[EmpleadoMarcaciones]
+    posiciones: Dict[str, int]
+    # Tabla de cadenas compartida por todas las versiones del libro: solo
+    # crece, así los índices del XML ya armado siguen siendo válidos
+    cadenas: _TablaCadenas = field(default_factory=_TablaCadenas)
+    hojas: List[_HojaIncremental] = field(default_factory=list)
+    version: int = 0
+    expira: Optional[float] = None
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def a_dict(self) -> Dict[str, Any]:
+        """Representación del reporte para el endpoint de estado."""
+        return {
+            "id": self.id,
+            "fecha_inicio": self.fecha_inicio,
+            "fecha_fin": self.fecha_fin,
+            "version": self.version,
+            "empleados": len(self.empleados),
+            "hojas": [hoja.titulo for hoja in self.hojas],
+            "cadenas_compartidas": len(self.cadenas.indices),
+        }
+
+
+def _clave_marcacion(marcacion: Marcacion) -> str:
+    """Fecha que identifica la marcación dentro del empleado."""
+    return marcacion.fecha_iso or str(marcacion.fecha)
+
+
+def fusionar_empleado(actual: EmpleadoMarcaciones, cambio: EmpleadoMarcaciones) -> EmpleadoMarcaciones:
+    """
+    Aplica el cambio de un empleado a su estado actual.
+
+    Las marcaciones se identifican por fecha: las del cambio reemplazan a las
+    de la misma fecha y las demás se agregan. De los otros campos solo se
+    toman los que vienen en el cambio (por ejemplo cantidad_tardanzas).
+
+    Args:
+        actual: Empleado tal como está en el reporte
+        cambio: Empleado recibido en la actualización
+
+    Returns:
+        Nuevo modelo del empleado con el cambio aplicado
+    """
+    marcaciones = {_clave_marcacion(m): m for m in actual.marcaciones}
+    for marcacion in cambio.marcaciones:
+        marcaciones[_clave_marcacion(marcacion)] = marcacion
+
+    campos = {campo: getattr(cambio, campo) for campo in cambio.model_fields_set
+              if campo not in ("emp_code", "marcaciones")}
+    return actual.model_copy(update={**campos, "marcaciones": list(marcaciones.values())})
+
+
+def _nueva_hoja(titulo: str, layout: LayoutReporte, cadenas: _TablaCadenas) -> _HojaIncremental:
+    letras = letras_columnas(layout)
+    antes = cadenas.referencias
+    encabezado = [xml_fila(fila_idx, fila, letras, cadenas)
+                  for fila_idx, fila in layout.filas_encabezado.items()]
+    return _HojaIncremental(titulo, layout, letras, encabezado, cadenas.referencias - antes)
+
+
+def _renderizar_filas(reporte: ReporteIncremental, hoja: _HojaIncremental, posiciones: List[int]) -> None:
+    """
+    Recalcula la asistencia de los empleados indicados y reemplaza (o agrega,
+    si son nuevos) el XML de sus filas en la hoja.
+
+    Args:
+        reporte: Reporte incremental
+        hoja: Hoja a actualizar
+        posiciones: Posiciones de los empleados en el reporte, en orden creciente
+    """
+    layout = hoja.layout
+    for lote in _en_lotes(posiciones, settings.ASISTENCIA_LOTE_EMPLEADOS):
+        matriz = calcular_asistencia(
+            [reporte.empleados[posicion] for posicion in lote], layout.todas_fechas)
+        for i, posicion in enumerate(lote):
+            fila = fila_empleado(posicion + 1, matriz, i, layout)
+            if fila is None:
+                # Los empleados que no pudieron procesarse quedan como fila vacía
+                fila = list(layout.fila_base)
+
+            antes = reporte.cadenas.referencias
+            xml = xml_fila(hoja.primera_fila + posicion, fila, hoja.letras, reporte.cadenas)
+            referencias = reporte.cadenas.referencias - antes
+
+            if posicion == len(hoja.filas):
+                hoja.filas.append(xml)
+                hoja.referencias.append(referencias)
+            else:
+                hoja.filas[posicion] = xml
+                hoja.referencias[posicion] = referencias
+
+
+def crear_reporte(empleados_data: Iterable[Any], fecha_inicio: Optional[str] = None, fecha_fin: Optional[str] = None, compresion: Optional[str] = None) -> ReporteIncremental:
+    """
+    Calcula el estado inicial de un reporte incremental.
+
+    El rango de fechas (y por lo tanto las hojas y columnas) queda fijo; para
+    un reporte del mes en curso conviene crearlo con el mes completo.
+
+    Args:
+        empleados_data: Empleados del reporte
+        fecha_inicio: Fecha inicial en formato YYYY-MM-DD
+        fecha_fin: Fecha final en formato YYYY-MM-DD
+        compresion: Perfil de compresión del zip; None usa la configuración
+
+    Returns:
+        Reporte con todas sus filas ya armadas
+
+    Raises:
+        ValueError: Si un emp_code aparece más de una vez (cada uno identifica
+            una fila del reporte)
+    """
+    empleados = [e for e in map(_como_empleado, empleados_data) if e is not None]
+    posiciones = {}
+    for posicion, empleado in enumerate(empleados):
+        if empleado.emp_code in posiciones:
+            raise ValueError(
+                f"El empleado {empleado.emp_code} aparece más de una vez; "
+                "en un reporte incremental cada emp_code identifica una fila")
+        posiciones[empleado.emp_code] = posicion
+
+    reporte = ReporteIncremental(
+        id=uuid.uuid4().hex,
+        fecha_inicio=fecha_inicio,
+        fecha_fin=fecha_fin,
+        compresion=resolver_compresion(compresion),
+        empleados=empleados,
+        posiciones=posiciones
+    )
+
+    # Hoja por hoja (encabezado y luego filas) para que la tabla de cadenas
+    # quede en el mismo orden que la del backend nativo
+    todas = list(range(len(empleados)))
+    for hoja in planificar_hojas(fecha_inicio, fecha_fin):
+        titulo = hoja[0]
+        incremental = _nueva_hoja(titulo, layout_hoja(hoja), reporte.cadenas)
+        reporte.hojas.append(incremental)
+        _renderizar_filas(reporte, incremental, todas)
+
+    return reporte
+
+
+def aplicar_cambios(reporte: ReporteIncremental, cambios: Iterable[EmpleadoMarcaciones]) -> int:
+    """
+    Aplica los cambios al reporte y recalcula solo las filas afectadas.
+
+    Args:
+        reporte: Reporte incremental
+        cambios: Empleados con sus marcaciones nuevas o corregidas; los emp_code
+            que el reporte no tiene se agregan al final como empleados nuevos
+
+    Returns:
+        Cantidad de empleados actualizados
+    """
+    afectados = set()
+    for cambio in cambios:
+        if not cambio.emp_code:
+            continue
+        posicion = reporte.posiciones.get(cambio.emp_code)
+        if posicion is None:
+            posicion = reporte.posiciones[cambio.emp_code] = len(reporte.empleados)
+            reporte.empleados.append(cambio)
+        else:
+            reporte.empleados[posicion] = fusionar_empleado(reporte.empleados[posicion], cambio)
+        afectados.add(posicion)
+
+    # Los totales (minutos de tardanza y de ausencia) cubren todas las
+    # marcaciones, así que el empleado cambia en todas las hojas
+    posiciones = sorted(afectados)
+    for hoja in reporte.hojas:
+        _renderizar_filas(reporte, hoja, posiciones)
+
+    reporte.version += 1
+    logger.debug("Reporte incremental %s: %d empleados recalculados (versión %d)",
+                 reporte.id, len(posiciones), reporte.version)
+    return len(posiciones)
+
+
+def emitir_reporte(reporte: ReporteIncremental) -> bytes:
+    """
+    Escribe el libro actual del reporte uniendo el XML ya armado de las filas.
+
+    Las cadenas que dejaron de usarse siguen en sharedStrings.xml, por lo que
+    tras una actualización el archivo puede diferir en bytes del reporte
+    completo, con los mismos valores y estilos en cada celda.
+
+    Returns:
+        Bytes del archivo Excel
+    """
+    reporte.cadenas.referencias = sum(
+        hoja.referencias_encabezado + sum(hoja.referencias) for hoja in reporte.hojas)
+
+    output = io.BytesIO()
+    escribir_libro_xml(
+        output,
+        [hoja.titulo for hoja in reporte.hojas],
+        ((hoja.layout, hoja.cuerpo(), anchos_columnas(hoja.layout)) for hoja in reporte.hojas),
+        reporte.cadenas,
+        reporte.compresion
+    )
+    return output.getvalue()
+
+
+def _crear_y_emitir(empleados_data: List[EmpleadoMarcaciones], fecha_inicio: Optional[str], fecha_fin: Optional[str], compresion: Optional[str]) -> Tuple[ReporteIncremental, bytes]:
+    reporte = crear_reporte(empleados_data, fecha_inicio, fecha_fin, compresion)
+    return reporte, emitir_reporte(reporte)
+
+
+def _actualizar_y_emitir(reporte: ReporteIncremental, cambios: List[EmpleadoMarcaciones]) -> Tuple[bytes, int]:
+    # Las actualizaciones de un mismo reporte se aplican de a una
+    with reporte.lock:
+        actualizados = aplicar_cambios(reporte, cambios)
+        return emitir_reporte(reporte), actualizados
+
+
+class AlmacenReportesIncrementales:
+    """
+    Reportes incrementales en memoria, acotados por cantidad (se descarta el
+    menos usado) y con expiración que se renueva en cada uso.
+    """
+
+    def __init__(self, max_reportes: int, ttl_segundos: float):
+        self.max_reportes = max_reportes
+        self.ttl_segundos = ttl_segundos
+        self._reportes: "OrderedDict[str, ReporteIncremental]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def guardar(self, reporte: ReporteIncremental) -> None:
+        with self._lock:
+            reporte.expira = time.monotonic() + self.ttl_segundos
+            self._reportes[reporte.id] = reporte
+            while len(self._reportes) > max(self.max_reportes, 1):
+                descartado, _ = self._reportes.popitem(last=False)
+                logger.info("Reporte incremental %s descartado por límite de memoria", descartado)
+
+    def obtener(self, reporte_id: str) -> Optional[ReporteIncremental]:
+        """Devuelve el reporte si existe y no expiró, renovando su expiración."""
+        with self._lock:
+            reporte = self._reportes.get(reporte_id)
+            if reporte is None:
+                return None
+            ahora = time.monotonic()
+            if reporte.expira <= ahora:
+                del self._reportes[reporte_id]
+                return None
+            reporte.expira = ahora + self.ttl_segundos
+            self._reportes.move_to_end(reporte_id)
+            return reporte
+
+    def eliminar(self, reporte_id: str) -> bool:
+        with self._lock:
+            return self._reportes.pop(reporte_id, None) is not None
+
+    def contar(self) -> Dict[tuple, int]:
+        """Reportes guardados, con el formato de etiquetas de utils.metricas."""
+        with self._lock:
+            return {(): len(self._reportes)}
+
+
+almacen_incremental = AlmacenReportesIncrementales(
+    max_reportes=settings.INCREMENTAL_MAX_REPORTES,
+    ttl_segundos=settings.INCREMENTAL_TTL_SEGUNDOS,
+)
+
+registro.registrar(Indicador(
+    "reportes_incrementales", "Reportes incrementales con estado en memoria",
+    funcion=almacen_incremental.contar))
+
+
+async def crear_reporte_incremental(empleados_data: List[EmpleadoMarcaciones], fecha_inicio: Optional[str] = None, fecha_fin: Optional[str] = None, compresion: Optional[str] = None) -> Tuple[ReporteIncremental, bytes]:
+    """
+    Crea un reporte incremental, lo guarda en el almacén y devuelve su libro.
+
+    El estado vive en este proceso, así que el trabajo corre en el executor de
+    hilos y no en el pool de procesos.
+
+    Returns:
+        Tupla (reporte guardado, bytes del Excel)
+    """
+    loop = asyncio.get_running_loop()
+    reporte, excel_bytes = await loop.run_in_executor(
+        None, _crear_y_emitir, empleados_data, fecha_inicio, fecha_fin, compresion)
+    almacen_incremental.guardar(reporte)
+    logger.info("Reporte incremental %s creado: %d empleados, %.2f KB",
+                reporte.id, len(reporte.empleados), len(excel_bytes) / 1024)
+    return reporte, excel_bytes
+
+
+async def actualizar_reporte_incremental(reporte: ReporteIncremental, cambios: List[EmpleadoMarcaciones]) -> Tuple[bytes, int]:
+    """
+    Aplica los cambios al reporte y devuelve el libro actualizado.
+
+    Returns:
+        Tupla (bytes del Excel, cantidad de empleados actualizados)
+    """
+    loop = asyncio.get_running_loop()
+    excel_bytes, actualizados = await loop.run_in_executor(
+        None, _actualizar_y_emitir, reporte, cambios)
+    logger.info("Reporte incremental %s actualizado (versión %d): %d empleados, %.2f KB",
+                reporte.id, reporte.version, actualizados, len(excel_bytes) / 1024)
+    return excel_bytes, actualizados
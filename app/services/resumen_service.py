@@ -0,0 +1,258 @@
+import io
+import logging
+from dataclasses import dataclass, field
+from datetime import date
+from typing import Any, BinaryIO, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+from openpyxl.utils import get_column_letter
+
+from models.schemas import EmpleadoMarcaciones
+from services.asistencia_engine import CLASE_AMARILLO, CLASE_ROJO, MatrizAsistencia
+from services.excel_service import (
+    ANCHOS_ENCABEZADOS, ENCABEZADOS, MESES, CeldaSpec, asistencia_empleados, datos_empleado,
+    layout_rango, resolver_compresion
+)
+from services.render_pool import ejecutar_en_pool
+from services.xlsx_nativo import escribir_libro
+
+logger = logging.getLogger(__name__)
+
+# Tipo de reporte: la grilla diaria completa o solo los totales por mes
+TIPO_DETALLE = "detalle"
+TIPO_RESUMEN = "resumen"
+TIPOS_REPORTE = (TIPO_DETALLE, TIPO_RESUMEN)
+
+# Columnas de cada mes (y del total del rango), en el orden de ENCABEZADOS_TOTALES
+ENCABEZADOS_RESUMEN = [
+    "TARDANZAS", "TOLERANCIAS", "FALTAS", "MIN. TARDANZA", "MIN. AUSENCIA"
+]
+
+# Columnas de identificación del empleado (N. a ESTADO), las mismas del detalle
+COLUMNAS_IDENTIFICACION = 9
+
+TITULO_HOJA_RESUMEN = "RESUMEN"
+ANCHO_COLUMNA_RESUMEN = 14
+
+
+@dataclass
+class LayoutResumen:
+    """Meses y columnas del resumen de un rango."""
+    # Fechas del rango, como en LayoutReporte.todas_fechas
+    todas_fechas: List[Tuple[str, str]]
+    # Título de cada mes y posición de su primer día dentro de todas_fechas
+    meses: List[str]
+    inicios_mes: np.ndarray
+    columna_max_borde: int
+    filas_encabezado: Dict[int, List[CeldaSpec]] = field(default_factory=dict)
+    rangos_combinados: List[str] = field(default_factory=list)
+
+    def __post_init__(self):
+        if not self.filas_encabezado:
+            self.filas_encabezado, self.rangos_combinados = _construir_encabezado_resumen(self)
+
+
+def layout_resumen(fecha_inicio: Optional[str] = None, fecha_fin: Optional[str] = None) -> LayoutResumen:
+    """
+    Agrupa por mes calendario las fechas del rango (las mismas que usa el
+    reporte detallado, incluido el rango por defecto).
+    """
+    todas_fechas = layout_rango(fecha_inicio, fecha_fin).todas_fechas
+    meses = []
+    inicios = []
+    for posicion, (fecha, _) in enumerate(todas_fechas):
+        dia = date.fromisoformat(fecha)
+        titulo = f"{MESES[dia.month]} {dia.year}"
+        if not meses or meses[-1] != titulo:
+            meses.append(titulo)
+            inicios.append(posicion)
+
+    return LayoutResumen(
+        todas_fechas=todas_fechas,
+        meses=meses,
+        inicios_mes=np.asarray(inicios, dtype=np.intp),
+        columna_max_borde=COLUMNAS_IDENTIFICACION + len(ENCABEZADOS_RESUMEN) * (len(meses) + 1)
+    )
+
+
+def _construir_encabezado_resumen(layout: LayoutResumen) -> Tuple[Dict[int, List[CeldaSpec]], List[str]]:
+    """
+    Arma las filas 1 a 5 del resumen: título, rango, y los encabezados de
+    columnas con un grupo por mes y uno para el total.
+
+    Returns:
+        Tupla (filas, rangos combinados) donde filas mapea fila -> lista de celdas
+    """
+    ultima = get_column_letter(layout.columna_max_borde)
+    desde, hasta = layout.todas_fechas[0][0], layout.todas_fechas[-1][0]
+    filas = {
+        1: [("RESUMEN DE ASISTENCIA DEL PERSONAL", "titulo")],
+        2: [(f"Del {desde} al {hasta}", "subtitulo")],
+        3: [],
+        4: [(None, "encabezado_combinado")] * layout.columna_max_borde,
+        5: [(None, "encabezado_combinado")] * layout.columna_max_borde,
+    }
+    rangos_combinados = [f"A1:{ultima}1", f"A2:{ultima}2"]
+
+    for col, encabezado in enumerate(ENCABEZADOS[:COLUMNAS_IDENTIFICACION], start=1):
+        letra = get_column_letter(col)
+        rangos_combinados.append(f"{letra}4:{letra}5")
+        filas[4][col - 1] = (encabezado, "encabezado")
+
+    grupos = layout.meses + ["TOTAL"]
+    for numero, titulo in enumerate(grupos):
+        col = COLUMNAS_IDENTIFICACION + 1 + numero * len(ENCABEZADOS_RESUMEN)
+        rangos_combinados.append(
+            f"{get_column_letter(col)}4:{get_column_letter(col + len(ENCABEZADOS_RESUMEN) - 1)}4")
+        filas[4][col - 1] = (titulo, "encabezado")
+        for j, encabezado in enumerate(ENCABEZADOS_RESUMEN):
+            filas[5][col - 1 + j] = (encabezado, "encabezado")
+
+    return filas, rangos_combinados
+
+
+def anchos_resumen(layout: LayoutResumen) -> List[Tuple[int, int]]:
+    """Ancho de las columnas del resumen, como (columna, ancho)."""
+    anchos = list(enumerate(ANCHOS_ENCABEZADOS[:COLUMNAS_IDENTIFICACION], start=1))
+    anchos.extend((col, ANCHO_COLUMNA_RESUMEN) for col in range(
+        COLUMNAS_IDENTIFICACION + 1, layout.columna_max_borde + 1))
+    return anchos
+
+
+def totales_por_mes(matriz: MatrizAsistencia, inicios_mes: np.ndarray) -> np.ndarray:
+    """
+    Suma por mes, para todo el lote a la vez, las cantidades y minutos de cada
+    empleado. La clasificación es la del motor de asistencia (MARGEN_TOLERANCIA,
+    marcaciones NM y días de teletrabajo que no cuentan como falta).
+
+    Args:
+        matriz: Asistencia calculada del lote
+        inicios_mes: Posición del primer día de cada mes
+
+    Returns:
+        Matriz empleados × meses × columnas de ENCABEZADOS_RESUMEN
+    """
+    # Las diferencias valen 0 en los días sin marcación
+    valores = np.stack([
+        matriz.clase_tardanza == CLASE_ROJO,
+        matriz.clase_tardanza == CLASE_AMARILLO,
+        matriz.sin_marcar,
+        np.where(matriz.diferencia_ingreso > 0, matriz.diferencia_ingreso, 0),
+        np.where(matriz.diferencia_salida < 0, matriz.diferencia_salida, 0),
+    ], axis=-1).astype(np.int64)
+    return np.add.reduceat(valores, inicios_mes, axis=1)
+
+
+def _celdas_grupo(tardanzas: int, tolerancias: int, faltas: Any, minutos_tardanza: int, minutos_ausencia: int) -> List[CeldaSpec]:
+    """Celdas de un mes o del total; los minutos llevan el color de los totales del detalle."""
+    return [
+        (tardanzas, "centrado"),
+        (tolerancias, "centrado"),
+        (faltas, "centrado"),
+        (minutos_tardanza, "rojo" if minutos_tardanza > 0 else "verde"),
+        (minutos_ausencia, "rojo" if minutos_ausencia < 0 else "verde"),
+    ]
+
+
+def _fila_resumen(idx: int, matriz: MatrizAsistencia, i: int, meses: List[List[int]]) -> List[CeldaSpec]:
+    """
+    Fila del resumen de un empleado.
+
+    Las faltas informadas en el JSON cubren todo el rango y no pueden repartirse
+    por mes: en ese caso los meses muestran "-" y el total lleva esas faltas,
+    igual que la columna CANT. FALTAS del detalle.
+    """
+    fila = datos_empleado(idx, matriz.empleados[i], matriz.estados[i])
+    calculadas = bool(matriz.faltas_calculadas[i])
+
+    for tardanzas, tolerancias, faltas, minutos_tardanza, minutos_ausencia in meses:
+        fila.extend(_celdas_grupo(tardanzas, tolerancias, faltas if calculadas else "-",
+                                  minutos_tardanza, minutos_ausencia))
+
+    totales = [sum(columna) for columna in zip(*meses)]
+    fila.extend(_celdas_grupo(totales[0], totales[1], matriz.cantidad_faltas[i].item(),
+                              totales[3], totales[4]))
+    return fila
+
+
+def filas_resumen(empleados_data: Iterable[Any], layout: LayoutResumen, progreso: Optional[Callable[[int], None]] = None) -> Iterator[List[CeldaSpec]]:
+    """
+    Genera, en orden, la fila del resumen de cada empleado válido.
+
+    La asistencia se calcula por lotes (ASISTENCIA_LOTE_EMPLEADOS) y los
+    totales por mes de cada lote con una sola reducción de NumPy.
+    """
+    fila_vacia = [(None, "plano")] * COLUMNAS_IDENTIFICACION + \
+        [(None, "centrado")] * (layout.columna_max_borde - COLUMNAS_IDENTIFICACION)
+    matriz_actual = None
+    totales = None
+
+    for idx, matriz, i in asistencia_empleados(empleados_data, layout, progreso):
+        if matriz is not matriz_actual:
+            matriz_actual, totales = matriz, totales_por_mes(matriz, layout.inicios_mes)
+        if matriz.fallidos[i]:
+            # Los empleados que no pudieron procesarse quedan como fila vacía
+            yield fila_vacia
+            continue
+        yield _fila_resumen(idx, matriz, i, totales[i].tolist())
+
+
+def escribir_resumen(destino: BinaryIO, empleados_data: Iterable[Any], fecha_inicio: Optional[str] = None, fecha_fin: Optional[str] = None, progreso: Optional[Callable[[int], None]] = None, compresion: Optional[str] = None) -> None:
+    """
+    Escribe el resumen en una sola hoja con el escritor XML directo.
+
+    Args:
+        destino: Archivo o flujo binario donde se escribe el xlsx
+        empleados_data: Datos de empleados con sus marcaciones
+        fecha_inicio: Fecha inicial en formato YYYY-MM-DD
+        fecha_fin: Fecha final en formato YYYY-MM-DD
+        progreso: Función opcional que recibe la cantidad de empleados ya procesados
+        compresion: Perfil de compresión del zip; None usa la configuración
+    """
+    layout = layout_resumen(fecha_inicio, fecha_fin)
+    logger.info("Generando resumen de %d meses (%s a %s)",
+                len(layout.meses), layout.todas_fechas[0][0], layout.todas_fechas[-1][0])
+    escribir_libro(destino, [TITULO_HOJA_RESUMEN],
+                   [(layout, filas_resumen(empleados_data, layout, progreso), anchos_resumen(layout))],
+                   resolver_compresion(compresion))
+
+
+def renderizar_resumen(empleados_data: List[EmpleadoMarcaciones], fecha_inicio: Optional[str] = None, fecha_fin: Optional[str] = None, progreso: Optional[Callable[[int], None]] = None, compresion: Optional[str] = None) -> bytes:
+    """Construye el resumen de forma síncrona (se ejecuta dentro del pool de procesos)."""
+    output = io.BytesIO()
+    escribir_resumen(output, empleados_data, fecha_inicio, fecha_fin, progreso, compresion)
+    return output.getvalue()
+
+
+async def generate_summary_report(empleados_data: List[EmpleadoMarcaciones], fecha_inicio: Optional[str] = None, fecha_fin: Optional[str] = None, progreso: Optional[Callable[[int], None]] = None, compresion: Optional[str] = None) -> bytes:
+    """
+    Genera el resumen por mes de la asistencia: una fila por empleado con las
+    tardanzas, tolerancias, faltas y minutos de tardanza y de ausencia de cada
+    mes del rango, más el total. Está pensado para rangos largos (por ejemplo un
+    año), donde la grilla diaria del reporte detallado sería enorme.
+
+    Args:
+        empleados_data: Lista de datos de empleados con sus marcaciones
+        fecha_inicio: Fecha inicial en formato YYYY-MM-DD
+        fecha_fin: Fecha final en formato YYYY-MM-DD
+        progreso: Función opcional (serializable con pickle) que recibe la
+            cantidad de empleados ya procesados
+        compresion: Perfil de compresión del zip; None usa la configuración
+
+    Returns:
+        Bytes del archivo Excel generado
+    """
+    return await ejecutar_en_pool(renderizar_resumen, empleados_data, fecha_inicio, fecha_fin, progreso, compresion)
+
+
+def resolver_tipo_reporte(tipo: Optional[str]) -> str:
+    """
+    Valida el tipo de reporte solicitado (None es el reporte detallado).
+
+    Raises:
+        ValueError: Si el tipo no es "detalle" ni "resumen"
+    """
+    tipo = tipo or TIPO_DETALLE
+    if tipo not in TIPOS_REPORTE:
+        raise ValueError(f"Tipo de reporte no soportado: {tipo}")
+    return tipo
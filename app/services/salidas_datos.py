@@ -0,0 +1,309 @@
+"""
+Salidas de datos del reporte (CSV, JSON y Parquet) para consumidores que no
+necesitan el Excel con formato.
+
+Usan el mismo cálculo que las columnas del Excel (asistencia_empleados y
+fila_empleado) pero omiten todo lo relacionado con estilos, y cubren el rango
+completo en una sola tabla aunque el Excel lo divida en hojas mensuales.
+"""
+import csv
+import io
+import logging
+from datetime import date
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+import orjson
+
+from config import settings
+from services.asistencia_engine import (
+    MatrizAsistencia, CLASE_SIN_MARCA, CLASE_ROJO, CLASE_AMARILLO, CLASE_VERDE, CLASE_TELETRABAJO
+)
+from services.excel_service import (
+    COLUMNAS_FECHA, ENCABEZADOS, ENCABEZADOS_TOTALES, LayoutReporte,
+    asistencia_empleados, fila_empleado, layout_rango
+)
+from services.render_pool import ejecutar_en_pool
+
+logger = logging.getLogger(__name__)
+
+FORMATO_XLSX = "xlsx"
+FORMATO_CSV = "csv"
+FORMATO_JSON = "json"
+FORMATO_PARQUET = "parquet"
+FORMATOS = (FORMATO_XLSX, FORMATO_CSV, FORMATO_JSON, FORMATO_PARQUET)
+
+MEDIA_TYPES = {
+    FORMATO_XLSX: "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    FORMATO_CSV: "text/csv; charset=utf-8",
+    FORMATO_JSON: "application/json",
+    FORMATO_PARQUET: "application/vnd.apache.parquet",
+}
+
+# Claves de las columnas fijas del reporte (mismo orden que ENCABEZADOS)
+CAMPOS_EMPLEADO = (
+    "n", "emp_code", "trabajador", "fecha_ingreso", "fecha_cese", "cargo",
+    "area", "gerencia", "estado", "registro", "dias_labores", "dias_descanso",
+    "horario_oficial", "dias_teletrabajo"
+)
+
+# Claves de las columnas de cantidades y totales (mismo orden que ENCABEZADOS_TOTALES)
+CAMPOS_TOTALES = (
+    "cant_tardanzas", "cant_tolerancias", "cant_faltas",
+    "total_minutos_tardanza", "total_minutos_ausencia"
+)
+
+# Código de cada día según la clasificación del motor de asistencia
+CODIGOS_INGRESO = {
+    CLASE_SIN_MARCA: "SIN_MARCA",
+    CLASE_ROJO: "TARDANZA",
+    CLASE_AMARILLO: "TOLERANCIA",
+    CLASE_VERDE: "PUNTUAL",
+    CLASE_TELETRABAJO: "TELETRABAJO",
+}
+CODIGOS_SALIDA = {
+    CLASE_SIN_MARCA: "SIN_MARCA",
+    CLASE_ROJO: "SALIDA_TEMPRANA",
+    CLASE_VERDE: "COMPLETA",
+    CLASE_TELETRABAJO: "TELETRABAJO",
+}
+
+
+def resolver_formato(formato: Optional[str]) -> str:
+    """
+    Valida el formato de salida solicitado.
+
+    Args:
+        formato: "xlsx", "csv", "json" o "parquet"; None equivale a "xlsx"
+
+    Returns:
+        Formato validado
+    """
+    formato = formato or FORMATO_XLSX
+    if formato not in FORMATOS:
+        raise ValueError(f"Formato de salida no soportado: {formato}")
+    return formato
+
+
+def columnas_csv(layout: LayoutReporte) -> List[str]:
+    """Encabezados planos del CSV: las columnas del Excel, con la fecha en cada subcolumna."""
+    columnas = list(ENCABEZADOS)
+    for fecha, _ in layout.todas_fechas:
+        columnas.extend(f"{fecha} {sub}" for sub in COLUMNAS_FECHA)
+    columnas.extend(ENCABEZADOS_TOTALES)
+    return columnas
+
+
+def _valores(fila: List[Any], layout: LayoutReporte) -> List[Any]:
+    """Valores de las columnas de la tabla (sin las celdas de relleno hasta el borde)."""
+    return [valor for valor, _ in fila[:layout.total_columnas]]
+
+
+def generar_csv(empleados_data: Iterable[Any], fecha_inicio: Optional[str] = None, fecha_fin: Optional[str] = None) -> Iterator[bytes]:
+    """
+    Genera el reporte como CSV, una fila por empleado con las mismas columnas
+    que el Excel.
+
+    Args:
+        empleados_data: Empleados del reporte
+        fecha_inicio: Fecha inicial en formato YYYY-MM-DD
+        fecha_fin: Fecha final en formato YYYY-MM-DD
+
+    Yields:
+        Bloques de hasta EXCEL_STREAM_TAMANO_BLOQUE bytes, a medida que se
+        arman las filas
+    """
+    layout = layout_rango(fecha_inicio, fecha_fin)
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer, lineterminator="\n")
+    escritor.writerow(columnas_csv(layout))
+
+    for idx, matriz, i in asistencia_empleados(empleados_data, layout):
+        fila = fila_empleado(idx, matriz, i, layout)
+        if fila is None:
+            continue
+        escritor.writerow(_valores(fila, layout))
+
+        if buffer.tell() >= settings.EXCEL_STREAM_TAMANO_BLOQUE:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+def _dias_empleado(matriz: MatrizAsistencia, i: int, layout: LayoutReporte) -> List[Dict[str, Any]]:
+    """Detalle por día del empleado: horas, minutos de diferencia y códigos."""
+    dias = []
+    marcaciones = matriz.marcaciones[i]
+    presente = matriz.presente[i].tolist()
+    teletrabajo = matriz.teletrabajo[i].tolist()
+    diferencia_ingreso = matriz.diferencia_ingreso[i].tolist()
+    diferencia_salida = matriz.diferencia_salida[i].tolist()
+    clase_tardanza = matriz.clase_tardanza[i].tolist()
+    clase_extension = matriz.clase_extension[i].tolist()
+
+    for dia, (fecha, dia_semana) in enumerate(layout.todas_fechas):
+        marcacion = marcaciones[dia]
+        dias.append({
+            "fecha": fecha,
+            "dia_semana": dia_semana,
+            "teletrabajo": teletrabajo[dia],
+            "hora_ingreso": marcacion.hora_ingreso if marcacion is not None else None,
+            "diferencia_ingreso": diferencia_ingreso[dia] if presente[dia] else None,
+            "codigo_ingreso": CODIGOS_INGRESO[clase_tardanza[dia]],
+            "hora_salida": marcacion.hora_salida if marcacion is not None else None,
+            "diferencia_salida": diferencia_salida[dia] if presente[dia] else None,
+            "codigo_salida": CODIGOS_SALIDA[clase_extension[dia]],
+        })
+    return dias
+
+
+def generar_json(empleados_data: Iterable[Any], fecha_inicio: Optional[str] = None, fecha_fin: Optional[str] = None) -> bytes:
+    """
+    Genera el reporte como JSON: por empleado, sus datos, los totales calculados
+    y el detalle de cada día con sus códigos.
+
+    Args:
+        empleados_data: Empleados del reporte
+        fecha_inicio: Fecha inicial en formato YYYY-MM-DD
+        fecha_fin: Fecha final en formato YYYY-MM-DD
+
+    Returns:
+        Bytes del documento JSON
+    """
+    layout = layout_rango(fecha_inicio, fecha_fin)
+    empleados = []
+
+    for idx, matriz, i in asistencia_empleados(empleados_data, layout):
+        fila = fila_empleado(idx, matriz, i, layout)
+        if fila is None:
+            continue
+        valores = _valores(fila, layout)
+        empleado = dict(zip(CAMPOS_EMPLEADO, valores))
+        empleado["totales"] = dict(
+            zip(CAMPOS_TOTALES, valores[layout.col_cant_tardanzas - 1:]))
+        empleado["dias"] = _dias_empleado(matriz, i, layout)
+        empleados.append(empleado)
+
+    return orjson.dumps({
+        "fecha_inicio": layout.todas_fechas[0][0],
+        "fecha_fin": layout.todas_fechas[-1][0],
+        "empleados": empleados
+    })
+
+
+def _tabla_lote(matriz: MatrizAsistencia, indices: List[int], numeros: List[int], fechas: List[date], layout: LayoutReporte):
+    """Filas empleado × día de un lote como tabla de Arrow."""
+    import pyarrow as pa
+
+    n_dias = len(fechas)
+    presente = matriz.presente[indices]
+    marcaciones = [matriz.marcaciones[i] for i in indices]
+
+    def horas(atributo: str) -> List[Optional[str]]:
+        return [getattr(m, atributo) if m is not None else None
+                for fila in marcaciones for m in fila]
+
+    def diferencias(matriz_dif: np.ndarray) -> "pa.Array":
+        return pa.array(matriz_dif[indices].ravel(), mask=~presente.ravel(), type=pa.int64())
+
+    def codigos(clases: np.ndarray, nombres: Dict[int, str]) -> "pa.Array":
+        # Columna de diccionario: cada clase se traduce a la posición de su código
+        posicion = np.zeros(max(nombres) + 1, dtype=np.int8)
+        posicion[list(nombres)] = np.arange(len(nombres))
+        return pa.DictionaryArray.from_arrays(
+            pa.array(posicion[clases[indices].ravel()]), pa.array(list(nombres.values())))
+
+    codigos_empleado = [matriz.empleados[i].emp_code for i in indices]
+    return pa.table({
+        "n": pa.array(np.repeat(numeros, n_dias), type=pa.int32()),
+        "emp_code": pa.array(np.repeat(codigos_empleado, n_dias), type=pa.string()),
+        "fecha": pa.array(fechas * len(indices), type=pa.date32()),
+        "dia_semana": pa.array([dia for _, dia in layout.todas_fechas] * len(indices)),
+        "presente": pa.array(presente.ravel()),
+        "teletrabajo": pa.array(matriz.teletrabajo[indices].ravel()),
+        "hora_ingreso": pa.array(horas("hora_ingreso"), type=pa.string()),
+        "diferencia_ingreso": diferencias(matriz.diferencia_ingreso),
+        "codigo_ingreso": codigos(matriz.clase_tardanza, CODIGOS_INGRESO),
+        "hora_salida": pa.array(horas("hora_salida"), type=pa.string()),
+        "diferencia_salida": diferencias(matriz.diferencia_salida),
+        "codigo_salida": codigos(matriz.clase_extension, CODIGOS_SALIDA),
+    })
+
+
+def generar_parquet(empleados_data: Iterable[Any], fecha_inicio: Optional[str] = None, fecha_fin: Optional[str] = None) -> bytes:
+    """
+    Genera la tabla de asistencia empleado × día en formato Parquet (un grupo
+    de filas por lote del motor de asistencia). Requiere pyarrow.
+
+    Args:
+        empleados_data: Empleados del reporte
+        fecha_inicio: Fecha inicial en formato YYYY-MM-DD
+        fecha_fin: Fecha final en formato YYYY-MM-DD
+
+    Returns:
+        Bytes del archivo Parquet
+    """
+    import pyarrow.parquet as pq
+
+    layout = layout_rango(fecha_inicio, fecha_fin)
+    fechas = [date.fromisoformat(fecha) for fecha, _ in layout.todas_fechas]
+    output = io.BytesIO()
+    escritor = None
+
+    def escribir(matriz: MatrizAsistencia, indices: List[int], numeros: List[int]) -> None:
+        nonlocal escritor
+        tabla = _tabla_lote(matriz, indices, numeros, fechas, layout)
+        if escritor is None:
+            escritor = pq.ParquetWriter(output, tabla.schema)
+        escritor.write_table(tabla)
+
+    # Los empleados llegan agrupados por la matriz de su lote
+    matriz_actual, indices, numeros = None, [], []
+    for idx, matriz, i in asistencia_empleados(empleados_data, layout):
+        if matriz is not matriz_actual:
+            if indices:
+                escribir(matriz_actual, indices, numeros)
+            matriz_actual, indices, numeros = matriz, [], []
+        if not matriz.fallidos[i]:
+            indices.append(i)
+            numeros.append(idx)
+
+    if indices:
+        escribir(matriz_actual, indices, numeros)
+    if escritor is None:
+        raise ValueError("No hay empleados válidos para generar el Parquet")
+    escritor.close()
+    return output.getvalue()
+
+
+def renderizar_datos(empleados_data: List[Any], fecha_inicio: Optional[str], fecha_fin: Optional[str], formato: str) -> bytes:
+    """Genera una salida de datos completa en memoria (se ejecuta en el pool de procesos)."""
+    if formato == FORMATO_CSV:
+        return b"".join(generar_csv(empleados_data, fecha_inicio, fecha_fin))
+    if formato == FORMATO_JSON:
+        return generar_json(empleados_data, fecha_inicio, fecha_fin)
+    if formato == FORMATO_PARQUET:
+        return generar_parquet(empleados_data, fecha_inicio, fecha_fin)
+    raise ValueError(f"Formato de datos no soportado: {formato}")
+
+
+async def generate_data_report(empleados_data: List[Any], fecha_inicio: Optional[str] = None, fecha_fin: Optional[str] = None, formato: str = FORMATO_JSON) -> bytes:
+    """
+    Genera una salida de datos (csv, json o parquet) en el pool de procesos.
+
+    Args:
+        empleados_data: Lista de datos de empleados con sus marcaciones
+        fecha_inicio: Fecha inicial en formato YYYY-MM-DD
+        fecha_fin: Fecha final en formato YYYY-MM-DD
+        formato: "csv", "json" o "parquet"
+
+    Returns:
+        Bytes del archivo generado
+    """
+    datos = await ejecutar_en_pool(renderizar_datos, empleados_data, fecha_inicio, fecha_fin, formato)
+    logger.info("Reporte %s generado correctamente. Tamaño: %.2f KB",
+                formato, len(datos) / 1024)
+    return datos
@@ -0,0 +1,362 @@
+"""
+Escritor XLSX directo para el layout fijo del reporte de marcaciones.
+
+Escribe las partes del paquete (sheetN.xml, styles.xml, sharedStrings.xml y
+las relaciones) desde plantillas de texto, sin el modelo de objetos de
+openpyxl: cada fila se convierte en XML y se comprime dentro de la entrada del
+zip apenas se arma. El contenido (valores, estilos, anchos y rangos combinados)
+es el mismo que el del backend openpyxl.
+"""
+import logging
+import re
+from functools import partial
+from typing import Any, BinaryIO, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from xml.sax.saxutils import escape, quoteattr
+from zipfile import ZipInfo
+
+from openpyxl.utils import get_column_letter
+from openpyxl.writer.theme import theme_xml
+
+from services.excel_service import (
+    COMPRESION_NORMAL, ESTILOS, ETAPA_FILAS, ETAPA_GUARDADO, FECHA_DOCUMENTO, FECHA_ENTRADAS_ZIP, HojaReporte, LayoutReporte,
+    _ZipDeterminista, _avance_hoja, abrir_zip, _filas_empleados, anchos_columnas, layout_hoja
+)
+from utils.metricas import Cronometro
+
+logger = logging.getLogger(__name__)
+
+NS_MAIN = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+NS_REL = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+NS_PKG_REL = "http://schemas.openxmlformats.org/package/2006/relationships"
+
+# Índice de cada estilo de ESTILOS en cellXfs (el 0 es el estilo por defecto)
+ID_ESTILO = {nombre: i for i, nombre in enumerate(ESTILOS, start=1)}
+
+# Tabla de estilos fija: fuentes, rellenos, bordes y un xf por cada entrada de
+# ESTILOS, en el mismo orden
+STYLES_XML = (
+    f'<styleSheet xmlns="{NS_MAIN}">'
+    '<fonts count="4">'
+    '<font><name val="Calibri"/><family val="2"/><color theme="1"/><sz val="11"/><scheme val="minor"/></font>'
+    '<font><b val="1"/><sz val="14"/></font>'
+    '<font><b val="1"/><color rgb="00FFFFFF"/></font>'
+    '<font><b val="1"/></font>'
+    '</fonts>'
+    '<fills count="8">'
+    '<fill><patternFill/></fill>'
+    '<fill><patternFill patternType="gray125"/></fill>'
+    '<fill><patternFill patternType="solid"><fgColor rgb="001F4E78"/><bgColor rgb="001F4E78"/></patternFill></fill>'
+    '<fill><patternFill patternType="solid"><fgColor rgb="00DDDDDD"/><bgColor rgb="00DDDDDD"/></patternFill></fill>'
+    '<fill><patternFill patternType="solid"><fgColor rgb="00A9A9A9"/><bgColor rgb="00A9A9A9"/></patternFill></fill>'
+    '<fill><patternFill patternType="solid"><fgColor rgb="00FF0000"/><bgColor rgb="00FF0000"/></patternFill></fill>'
+    '<fill><patternFill patternType="solid"><fgColor rgb="00FFFF00"/><bgColor rgb="00FFFF00"/></patternFill></fill>'
+    '<fill><patternFill patternType="solid"><fgColor rgb="00538D22"/><bgColor rgb="00538D22"/></patternFill></fill>'
+    '</fills>'
+    '<borders count="2">'
+    '<border><left/><right/><top/><bottom/><diagonal/></border>'
+    '<border><left style="thin"><color rgb="00000000"/></left><right style="thin"><color rgb="00000000"/></right>'
+    '<top style="thin"><color rgb="00000000"/></top><bottom style="thin"><color rgb="00000000"/></bottom></border>'
+    '</borders>'
+    '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+    '<cellXfs count="12">'
+    '<xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+    # titulo
+    '<xf numFmtId="0" fontId="1" fillId="0" borderId="0" applyAlignment="1" xfId="0"><alignment horizontal="left"/></xf>'
+    # subtitulo
+    '<xf numFmtId="0" fontId="0" fillId="0" borderId="0" applyAlignment="1" xfId="0"><alignment horizontal="left"/></xf>'
+    # encabezado
+    '<xf numFmtId="0" fontId="2" fillId="2" borderId="1" applyAlignment="1" xfId="0"><alignment horizontal="center" vertical="center"/></xf>'
+    # encabezado_combinado
+    '<xf numFmtId="0" fontId="2" fillId="2" borderId="1" xfId="0"/>'
+    # plano
+    '<xf numFmtId="0" fontId="0" fillId="0" borderId="1" xfId="0"/>'
+    # centrado
+    '<xf numFmtId="0" fontId="0" fillId="0" borderId="1" applyAlignment="1" xfId="0"><alignment horizontal="center" vertical="center"/></xf>'
+    # teletrabajo
+    '<xf numFmtId="0" fontId="0" fillId="3" borderId="1" applyAlignment="1" xfId="0"><alignment horizontal="center" vertical="center"/></xf>'
+    # nm
+    '<xf numFmtId="0" fontId="3" fillId="4" borderId="1" applyAlignment="1" xfId="0"><alignment horizontal="center" vertical="center"/></xf>'
+    # rojo
+    '<xf numFmtId="0" fontId="2" fillId="5" borderId="1" applyAlignment="1" xfId="0"><alignment horizontal="center" vertical="center"/></xf>'
+    # amarillo
+    '<xf numFmtId="0" fontId="3" fillId="6" borderId="1" applyAlignment="1" xfId="0"><alignment horizontal="center" vertical="center"/></xf>'
+    # verde
+    '<xf numFmtId="0" fontId="2" fillId="7" borderId="1" applyAlignment="1" xfId="0"><alignment horizontal="center" vertical="center"/></xf>'
+    '</cellXfs>'
+    '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+    '</styleSheet>'
+)
+
+CONTENT_TYPES_XML = (
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/styles.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+    '<Override PartName="/xl/theme/theme1.xml" ContentType="application/vnd.openxmlformats-officedocument.theme+xml"/>'
+    '<Override PartName="/xl/sharedStrings.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sharedStrings+xml"/>'
+    '{hojas}'
+    '<Override PartName="/docProps/core.xml" ContentType="application/vnd.openxmlformats-package.core-properties+xml"/>'
+    '<Override PartName="/docProps/app.xml" ContentType="application/vnd.openxmlformats-officedocument.extended-properties+xml"/>'
+    '</Types>'
+)
+CONTENT_TYPE_HOJA = (
+    '<Override PartName="/xl/worksheets/sheet{n}.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+)
+
+RELS_XML = (
+    f'<Relationships xmlns="{NS_PKG_REL}">'
+    f'<Relationship Id="rId1" Type="{NS_REL}/officeDocument" Target="xl/workbook.xml"/>'
+    '<Relationship Id="rId2" Type="http://schemas.openxmlformats.org/package/2006/relationships/metadata/core-properties" Target="docProps/core.xml"/>'
+    f'<Relationship Id="rId3" Type="{NS_REL}/extended-properties" Target="docProps/app.xml"/>'
+    '</Relationships>'
+)
+
+APP_XML = (
+    '<Properties xmlns="http://schemas.openxmlformats.org/officeDocument/2006/extended-properties">'
+    '<Application>Microsoft Excel</Application></Properties>'
+)
+
+CORE_XML = (
+    '<cp:coreProperties xmlns:cp="http://schemas.openxmlformats.org/package/2006/metadata/core-properties" '
+    'xmlns:dc="http://purl.org/dc/elements/1.1/" xmlns:dcterms="http://purl.org/dc/terms/" '
+    'xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance">'
+    '<dcterms:created xsi:type="dcterms:W3CDTF">{fecha}</dcterms:created>'
+    '<dcterms:modified xsi:type="dcterms:W3CDTF">{fecha}</dcterms:modified>'
+    '</cp:coreProperties>'
+)
+
+WORKBOOK_XML = (
+    f'<workbook xmlns="{NS_MAIN}" xmlns:r="{NS_REL}">'
+    '<bookViews><workbookView activeTab="0"/></bookViews>'
+    '<sheets>{hojas}</sheets>'
+    '<calcPr calcId="124519" fullCalcOnLoad="1"/>'
+    '</workbook>'
+)
+
+HOJA_INICIO_XML = (
+    f'<worksheet xmlns="{NS_MAIN}">'
+    '<sheetViews><sheetView workbookViewId="0"/></sheetViews>'
+    '<sheetFormatPr baseColWidth="8" defaultRowHeight="15"/>'
+    '<cols>{columnas}</cols>'
+    '<sheetData>'
+)
+HOJA_FIN_XML = (
+    '</sheetData>'
+    '<mergeCells count="{cantidad}">{rangos}</mergeCells>'
+    '<pageMargins left="0.75" right="0.75" top="1" bottom="1" header="0.5" footer="0.5"/>'
+    '</worksheet>'
+)
+
+# Caracteres de control que XML no admite (openpyxl rechaza los mismos)
+_CARACTERES_ILEGALES = re.compile(r"[\000-\010]|[\013-\014]|[\016-\037]")
+
+# Filas de la hoja que se acumulan antes de escribirlas en el zip
+FILAS_POR_ESCRITURA = 64
+
+
+class _TablaCadenas:
+    """Tabla de cadenas compartidas (sharedStrings.xml), en orden de aparición."""
+
+    def __init__(self):
+        self.indices: Dict[str, int] = {}
+        self.referencias = 0
+
+    def indice(self, texto: str) -> int:
+        self.referencias += 1
+        indice = self.indices.get(texto)
+        if indice is None:
+            indice = self.indices[texto] = len(self.indices)
+        return indice
+
+    def xml(self) -> str:
+        partes = [f'<sst xmlns="{NS_MAIN}" count="{self.referencias}" uniqueCount="{len(self.indices)}">']
+        for texto in self.indices:
+            limpio = escape(_CARACTERES_ILEGALES.sub("", texto))
+            if texto != texto.strip():
+                partes.append(f'<si><t xml:space="preserve">{limpio}</t></si>')
+            else:
+                partes.append(f'<si><t>{limpio}</t></si>')
+        partes.append('</sst>')
+        return "".join(partes)
+
+
+def _xml_fila(fila_idx: int, fila: List[Any], letras: List[str], cadenas: _TablaCadenas) -> str:
+    """Convierte una fila armada [(valor, estilo), ...] en un elemento <row>."""
+    numero = str(fila_idx)
+    partes = [f'<row r="{numero}">']
+    for letra, (valor, estilo) in zip(letras, fila):
+        inicio = f'<c r="{letra}{numero}" s="{ID_ESTILO[estilo]}"'
+        if valor is None or valor == "":
+            partes.append(inicio + '/>')
+        elif isinstance(valor, bool):
+            partes.append(f'{inicio} t="b"><v>{int(valor)}</v></c>')
+        elif isinstance(valor, int):
+            partes.append(f'{inicio} t="n"><v>{valor}</v></c>')
+        elif isinstance(valor, float):
+            partes.append(f'{inicio} t="n"><v>{valor!r}</v></c>')
+        else:
+            # Los textos siempre se guardan como texto, aunque empiecen con "="
+            partes.append(f'{inicio} t="s"><v>{cadenas.indice(str(valor))}</v></c>')
+    partes.append('</row>')
+    return "".join(partes)
+
+
+def letras_columnas(layout: LayoutReporte) -> List[str]:
+    """Letras de las columnas de la hoja, de A a la última con borde."""
+    return [get_column_letter(col)
+            for col in range(1, layout.columna_max_borde + 1)]
+
+
+def xml_fila(fila_idx: int, fila: List[Any], letras: List[str], cadenas: _TablaCadenas) -> bytes:
+    """Elemento <row> de una fila armada, ya codificado."""
+    return _xml_fila(fila_idx, fila, letras, cadenas).encode()
+
+
+def _cuerpo_hoja(layout: LayoutReporte, filas_empleados: Iterable[List[Any]], cadenas: _TablaCadenas) -> Iterator[bytes]:
+    """XML de las filas de la hoja (encabezado y empleados), en bloques."""
+    letras = letras_columnas(layout)
+
+    for fila_idx, fila in layout.filas_encabezado.items():
+        yield xml_fila(fila_idx, fila, letras, cadenas)
+
+    bloque = []
+    fila_idx = len(layout.filas_encabezado) + 1
+    for fila in filas_empleados:
+        bloque.append(_xml_fila(fila_idx, fila, letras, cadenas))
+        fila_idx += 1
+        if len(bloque) >= FILAS_POR_ESCRITURA:
+            yield "".join(bloque).encode()
+            bloque.clear()
+    if bloque:
+        yield "".join(bloque).encode()
+
+
+def _escribir_hoja(zf: _ZipDeterminista, numero: int, layout: LayoutReporte, cuerpo: Iterable[bytes], anchos: List[Tuple[int, int]]) -> None:
+    """Escribe sheetN.xml dentro de su entrada del zip, bloque por bloque."""
+    columnas = "".join(
+        f'<col min="{col}" max="{col}" width="{ancho}" customWidth="1"/>'
+        for col, ancho in anchos
+    )
+
+    zinfo = ZipInfo(f"xl/worksheets/sheet{numero}.xml",
+                    date_time=FECHA_ENTRADAS_ZIP)
+    zinfo.compress_type = zf.compression
+    zinfo._compresslevel = zf.compresslevel
+    zinfo.external_attr = 0o600 << 16
+
+    with zf.open(zinfo, "w") as destino:
+        destino.write(HOJA_INICIO_XML.format(columnas=columnas).encode())
+
+        for bloque in cuerpo:
+            destino.write(bloque)
+
+        rangos = "".join(
+            f'<mergeCell ref="{rango}"/>' for rango in layout.rangos_combinados)
+        destino.write(HOJA_FIN_XML.format(
+            cantidad=len(layout.rangos_combinados), rangos=rangos).encode())
+
+
+def escribir_libro(destino: BinaryIO, titulos: List[str], hojas: Iterable[Tuple[Any, Iterable[List[Any]], List[Tuple[int, int]]]], compresion: str = COMPRESION_NORMAL) -> _TablaCadenas:
+    """
+    Escribe un xlsx con las hojas indicadas y la paleta de estilos del reporte.
+
+    Args:
+        destino: Archivo o flujo binario donde se escribe el xlsx
+        titulos: Título de cada hoja, en orden
+        hojas: Por cada hoja, (layout, filas, anchos). Del layout se usan
+            filas_encabezado, rangos_combinados y columna_max_borde; las filas
+            se escriben a continuación del encabezado a medida que se generan
+        compresion: Perfil de compresión del zip
+
+    Returns:
+        Tabla de cadenas compartidas del libro
+    """
+    cadenas = _TablaCadenas()
+    escribir_libro_xml(destino, titulos, (
+        (layout, _cuerpo_hoja(layout, filas, cadenas), anchos)
+        for layout, filas, anchos in hojas
+    ), cadenas, compresion)
+    return cadenas
+
+
+def escribir_libro_xml(destino: BinaryIO, titulos: List[str], hojas: Iterable[Tuple[Any, Iterable[bytes], List[Tuple[int, int]]]], cadenas: _TablaCadenas, compresion: str = COMPRESION_NORMAL) -> None:
+    """
+    Como escribir_libro, pero con las filas de cada hoja ya convertidas a XML.
+
+    Args:
+        destino: Archivo o flujo binario donde se escribe el xlsx
+        titulos: Título de cada hoja, en orden
+        hojas: Por cada hoja, (layout, cuerpo, anchos), donde cuerpo son los
+            elementos <row> de la hoja (encabezado incluido) ya codificados
+        cadenas: Tabla de cadenas a la que se refieren las filas; se escribe
+            después de las hojas, así que puede llenarse mientras se recorren
+        compresion: Perfil de compresión del zip
+    """
+    with abrir_zip(destino, compresion) as zf:
+        zf.writestr("[Content_Types].xml", CONTENT_TYPES_XML.format(
+            hojas="".join(CONTENT_TYPE_HOJA.format(n=n) for n in range(1, len(titulos) + 1))))
+        zf.writestr("_rels/.rels", RELS_XML)
+        zf.writestr("docProps/app.xml", APP_XML)
+        zf.writestr("docProps/core.xml", CORE_XML.format(
+            fecha=FECHA_DOCUMENTO.strftime("%Y-%m-%dT%H:%M:%SZ")))
+
+        for numero, (layout, cuerpo, anchos) in enumerate(hojas, start=1):
+            _escribir_hoja(zf, numero, layout, cuerpo, anchos)
+
+        zf.writestr("xl/sharedStrings.xml", cadenas.xml())
+        zf.writestr("xl/styles.xml", STYLES_XML)
+        zf.writestr("xl/theme/theme1.xml", theme_xml)
+        zf.writestr("xl/workbook.xml", WORKBOOK_XML.format(hojas="".join(
+            f'<sheet name={quoteattr(titulo)} sheetId="{n}" r:id="rId{n}"/>'
+            for n, titulo in enumerate(titulos, start=1))))
+
+        relaciones = [
+            f'<Relationship Id="rId{n}" Type="{NS_REL}/worksheet" Target="worksheets/sheet{n}.xml"/>'
+            for n in range(1, len(titulos) + 1)
+        ]
+        siguiente = len(titulos) + 1
+        relaciones.append(
+            f'<Relationship Id="rId{siguiente}" Type="{NS_REL}/styles" Target="styles.xml"/>')
+        relaciones.append(
+            f'<Relationship Id="rId{siguiente + 1}" Type="{NS_REL}/theme" Target="theme/theme1.xml"/>')
+        relaciones.append(
+            f'<Relationship Id="rId{siguiente + 2}" Type="{NS_REL}/sharedStrings" Target="sharedStrings.xml"/>')
+        zf.writestr("xl/_rels/workbook.xml.rels",
+                    f'<Relationships xmlns="{NS_PKG_REL}">{"".join(relaciones)}</Relationships>')
+
+
+def escribir_xlsx_nativo(destino: BinaryIO, empleados_data: List[Any], hojas: List[HojaReporte], progreso: Optional[Callable[[int], None]] = None, compresion: str = COMPRESION_NORMAL, cronometro: Optional[Cronometro] = None) -> None:
+    """
+    Escribe el reporte con el escritor XML directo.
+
+    Args:
+        destino: Archivo o flujo binario donde se escribe el xlsx
+        empleados_data: Empleados del reporte. Con una sola hoja puede ser un
+            iterador; con varias debe ser una lista (se recorre una vez por hoja)
+        hojas: Hojas del reporte, según planificar_hojas
+        progreso: Función opcional que recibe la cantidad de empleados ya procesados
+        compresion: Perfil de compresión del zip
+        cronometro: Cronómetro opcional. El estilo de cada celda es solo un
+            atributo del XML, por lo que no hay etapa "estilos": el armado de
+            las filas va a "filas" y su paso a XML comprimido a "guardado"
+    """
+    cronometro = cronometro or Cronometro()
+
+    def _hojas():
+        for numero, hoja in enumerate(hojas, start=1):
+            avance = progreso
+            if progreso is not None and len(hojas) > 1:
+                avance = partial(_avance_hoja, progreso,
+                                 (numero - 1) * len(empleados_data), len(hojas))
+
+            layout = layout_hoja(hoja)
+            filas = _filas_empleados(empleados_data, layout, avance)
+            yield layout, cronometro.medir_iterador(filas, ETAPA_FILAS), anchos_columnas(layout)
+
+    with cronometro.etapa(ETAPA_GUARDADO, excluir=(ETAPA_FILAS,)):
+        cadenas = escribir_libro(destino, [titulo for titulo, _, _ in hojas], _hojas(), compresion)
+
+    logger.debug("Excel escrito con el backend nativo: %d hojas, %d cadenas compartidas",
+                 len(hojas), len(cadenas.indices))
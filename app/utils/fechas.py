@@ -0,0 +1,131 @@
+from datetime import date, datetime
+from functools import lru_cache
+from typing import Any, Optional
+
+# Formatos de fecha que envía el sistema de marcaciones
+FORMATO_TIMESTAMP = "%Y-%m-%dT%H:%M:%S.%fZ"
+FORMATO_FECHA = "%Y-%m-%d"
+
+# Las mismas ~31 fechas se repiten en todos los empleados; las fechas de
+# ingreso y cese varían más, por eso el memo es amplio
+TAMANO_MEMO_FECHAS = 8192
+
+_DIGITOS = frozenset("0123456789")
+
+
+def _son_digitos(texto: str) -> bool:
+    return bool(texto) and _DIGITOS.issuperset(texto)
+
+
+def _parsear_rapido(valor: str) -> Optional[date]:
+    """
+    Parser de formato fijo para 'YYYY-MM-DD' y 'YYYY-MM-DDTHH:MM:SS.fffZ'.
+
+    Returns:
+        La fecha, o None si el texto no tiene exactamente ese formato (en ese
+        caso se delega en strptime)
+    """
+    if len(valor) < 10 or valor[4] != "-" or valor[7] != "-":
+        return None
+
+    anio, mes, dia = valor[0:4], valor[5:7], valor[8:10]
+    if not (_son_digitos(anio) and _son_digitos(mes) and _son_digitos(dia)):
+        return None
+
+    if len(valor) > 10:
+        if len(valor) < 22:
+            return None
+        # Parte horaria: THH:MM:SS.<1 a 6 dígitos>Z
+        if (valor[10] != "T" or valor[-1] != "Z" or valor[13] != ":"
+                or valor[16] != ":" or valor[19] != "."):
+            return None
+        hora, minuto, segundo, fraccion = valor[11:13], valor[14:16], valor[17:19], valor[20:-1]
+        if not (_son_digitos(hora) and _son_digitos(minuto) and _son_digitos(segundo)
+                and _son_digitos(fraccion) and len(fraccion) <= 6):
+            return None
+        if int(hora) > 23 or int(minuto) > 59 or int(segundo) > 59:
+            return None
+
+    try:
+        return date(int(anio), int(mes), int(dia))
+    except ValueError:
+        return None
+
+
+@lru_cache(maxsize=TAMANO_MEMO_FECHAS)
+def _parsear(valor: str, permitir_solo_fecha: bool) -> Optional[date]:
+    fecha = _parsear_rapido(valor)
+    if fecha is not None and (permitir_solo_fecha or len(valor) > 10):
+        return fecha
+
+    # Formatos poco comunes (p. ej. sin ceros a la izquierda): strptime decide
+    formatos = (FORMATO_TIMESTAMP, FORMATO_FECHA) if permitir_solo_fecha else (
+        FORMATO_TIMESTAMP,)
+    for formato in formatos:
+        try:
+            return datetime.strptime(valor, formato).date()
+        except ValueError:
+            continue
+    return None
+
+
+def parsear_fecha(valor: Any) -> Optional[date]:
+    """
+    Interpreta la fecha de una marcación: timestamp ISO con 'Z' o solo fecha.
+
+    Args:
+        valor: Texto 'YYYY-MM-DDTHH:MM:SS.fffZ' o 'YYYY-MM-DD'
+
+    Returns:
+        La fecha, o None si el valor no es un texto en uno de esos formatos
+    """
+    if not isinstance(valor, str):
+        return None
+    return _parsear(valor, True)
+
+
+def parsear_timestamp(valor: Any) -> Optional[date]:
+    """
+    Interpreta hire_date y fecha_cese, que solo se aceptan como timestamp ISO.
+
+    Args:
+        valor: Texto 'YYYY-MM-DDTHH:MM:SS.fffZ'
+
+    Returns:
+        La fecha, o None si el valor no es un texto con ese formato
+    """
+    if not isinstance(valor, str):
+        return None
+    return _parsear(valor, False)
+
+
+@lru_cache(maxsize=TAMANO_MEMO_FECHAS)
+def _a_iso(fecha: date) -> str:
+    return fecha.isoformat()
+
+
+@lru_cache(maxsize=TAMANO_MEMO_FECHAS)
+def _a_dia_mes_anio(fecha: date) -> str:
+    return fecha.strftime("%d/%m/%Y")
+
+
+def normalizar_fecha(valor: Any) -> Optional[str]:
+    """
+    Normaliza la fecha de una marcación a 'YYYY-MM-DD', la clave usada en el reporte.
+
+    Returns:
+        Fecha ISO, o None si el valor no se puede interpretar
+    """
+    fecha = parsear_fecha(valor)
+    return _a_iso(fecha) if fecha is not None else None
+
+
+def formatear_timestamp(valor: Any) -> Optional[str]:
+    """
+    Formatea hire_date o fecha_cese como 'DD/MM/YYYY' para mostrar en el reporte.
+
+    Returns:
+        Fecha formateada, o None si el valor no es un timestamp válido
+    """
+    fecha = parsear_timestamp(valor)
+    return _a_dia_mes_anio(fecha) if fecha is not None else None
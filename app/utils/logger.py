@@ -0,0 +1,59 @@
+import atexit
+import logging
+import queue
+import sys
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
+from config import settings
+
+# Paquetes de la aplicación cuyo nivel se controla con LOG_LEVEL
+LOGGERS_APLICACION = ("api", "services", "utils", "main")
+
+_listener: Optional[QueueListener] = None
+
+
+def configurar_logging(nivel: Optional[str] = None) -> None:
+    """
+    Configura el logging de la aplicación con un handler de cola no bloqueante.
+
+    Los módulos solo encolan los registros; un hilo aparte (QueueListener) los
+    formatea y los escribe en stderr. Se puede llamar varias veces: solo la
+    primera llamada de cada proceso tiene efecto.
+
+    Args:
+        nivel: Nivel de log para la aplicación (por defecto settings.LOG_LEVEL)
+    """
+    global _listener
+
+    if _listener is not None:
+        return
+
+    nivel = (nivel or settings.LOG_LEVEL).upper()
+
+    salida = logging.StreamHandler(sys.stderr)
+    salida.setFormatter(logging.Formatter(settings.LOG_FORMAT))
+
+    cola = queue.SimpleQueue()
+    _listener = QueueListener(cola, salida)
+    _listener.start()
+    atexit.register(detener_logging)
+
+    raiz = logging.getLogger()
+    raiz.addHandler(QueueHandler(cola))
+    # Las librerías de terceros solo reportan advertencias y errores
+    raiz.setLevel(logging.WARNING)
+
+    for nombre in LOGGERS_APLICACION:
+        logging.getLogger(nombre).setLevel(nivel)
+
+
+def detener_logging() -> None:
+    """Vacía la cola de logs pendientes y detiene el hilo escritor."""
+    global _listener
+
+    if _listener is None:
+        return
+
+    _listener.stop()
+    _listener = None
@@ -0,0 +1,216 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+# Métricas en memoria con salida en el formato de texto de Prometheus, sin
+# dependencias ni servicios externos. Los valores son de este proceso: el pool
+# de renderizado devuelve sus tiempos al proceso principal (ver Cronometro).
+
+# Límites de los histogramas
+BUCKETS_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+BUCKETS_BYTES = tuple(1024 * 4 ** n for n in range(11))  # 1 KB a 1 GB
+BUCKETS_EMPLEADOS = (1, 10, 50, 100, 500, 1000, 2500, 5000, 10000, 25000, 50000)
+BUCKETS_DIAS = (1, 7, 14, 31, 62, 92, 183, 366)
+
+Etiquetas = Tuple[Tuple[str, str], ...]
+
+
+class Cronometro:
+    """
+    Acumula la duración de las etapas de un reporte, en segundos y en el orden
+    en que aparecen. Es serializable con pickle: el renderer lo llena dentro del
+    pool y lo devuelve con el resultado.
+    """
+
+    def __init__(self):
+        self.duraciones: Dict[str, float] = {}
+
+    def sumar(self, etapa: str, segundos: float) -> None:
+        self.duraciones[etapa] = self.duraciones.get(etapa, 0.0) + segundos
+
+    def actualizar(self, otro: "Cronometro") -> None:
+        """Suma las etapas de otro cronómetro (por ejemplo, el devuelto por el pool)."""
+        for etapa, segundos in otro.duraciones.items():
+            self.sumar(etapa, segundos)
+
+    @contextmanager
+    def etapa(self, nombre: str, excluir: Sequence[str] = ()):
+        """Suma la duración del bloque, sin el tiempo que se sumó dentro a las etapas de `excluir`."""
+        anidadas = sum(self.duraciones.get(etapa, 0.0) for etapa in excluir)
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            anidadas = sum(self.duraciones.get(etapa, 0.0) for etapa in excluir) - anidadas
+            self.sumar(nombre, time.perf_counter() - inicio - anidadas)
+
+    def medir_iterador(self, iterable: Iterable, etapa: str) -> Iterator:
+        """Recorre el iterable sumando a la etapa solo el tiempo que tarda en producir cada elemento."""
+        iterador = iter(iterable)
+        while True:
+            inicio = time.perf_counter()
+            try:
+                elemento = next(iterador)
+            except StopIteration:
+                self.sumar(etapa, time.perf_counter() - inicio)
+                return
+            self.sumar(etapa, time.perf_counter() - inicio)
+            yield elemento
+
+    def server_timing(self) -> str:
+        """Valor del encabezado Server-Timing (duraciones en milisegundos)."""
+        return ", ".join(f"{etapa};dur={segundos * 1000:.1f}"
+                         for etapa, segundos in self.duraciones.items())
+
+
+def _formatear_etiquetas(etiquetas: Etiquetas, extra: Optional[Tuple[str, str]] = None) -> str:
+    pares = list(etiquetas) + ([extra] if extra else [])
+    if not pares:
+        return ""
+    texto = ",".join('{}="{}"'.format(clave, valor.replace("\\", "\\\\").replace('"', '\\"'))
+                     for clave, valor in pares)
+    return "{" + texto + "}"
+
+
+def _formatear_numero(valor: float) -> str:
+    if valor == float("inf"):
+        return "+Inf"
+    return repr(float(valor)) if not float(valor).is_integer() else str(int(valor))
+
+
+class _Metrica:
+    tipo = ""
+
+    def __init__(self, nombre: str, ayuda: str):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self._lock = threading.Lock()
+
+    def exponer(self) -> List[str]:
+        return [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} {self.tipo}"]
+
+
+class Contador(_Metrica):
+    tipo = "counter"
+
+    def __init__(self, nombre: str, ayuda: str):
+        super().__init__(nombre, ayuda)
+        self._valores: Dict[Etiquetas, float] = {}
+
+    def incrementar(self, valor: float = 1, **etiquetas: str) -> None:
+        clave = tuple(sorted(etiquetas.items()))
+        with self._lock:
+            self._valores[clave] = self._valores.get(clave, 0) + valor
+
+    def exponer(self) -> List[str]:
+        lineas = super().exponer()
+        with self._lock:
+            for etiquetas, valor in sorted(self._valores.items()):
+                lineas.append(f"{self.nombre}{_formatear_etiquetas(etiquetas)} {_formatear_numero(valor)}")
+        return lineas
+
+
+class Indicador(_Metrica):
+    """Gauge: valor que sube y baja, o que se calcula al exponerlo con `funcion`."""
+    tipo = "gauge"
+
+    def __init__(self, nombre: str, ayuda: str, funcion: Optional[Callable[[], Dict[Etiquetas, float]]] = None):
+        super().__init__(nombre, ayuda)
+        self._valores: Dict[Etiquetas, float] = {}
+        self._funcion = funcion
+
+    def sumar(self, valor: float, **etiquetas: str) -> None:
+        clave = tuple(sorted(etiquetas.items()))
+        with self._lock:
+            self._valores[clave] = self._valores.get(clave, 0) + valor
+
+    def exponer(self) -> List[str]:
+        lineas = super().exponer()
+        with self._lock:
+            valores = dict(self._valores)
+        if self._funcion is not None:
+            valores.update(self._funcion())
+        for etiquetas, valor in sorted(valores.items()):
+            lineas.append(f"{self.nombre}{_formatear_etiquetas(etiquetas)} {_formatear_numero(valor)}")
+        return lineas
+
+
+class Histograma(_Metrica):
+    tipo = "histogram"
+
+    def __init__(self, nombre: str, ayuda: str, buckets: Sequence[float]):
+        super().__init__(nombre, ayuda)
+        self.buckets = tuple(sorted(buckets))
+        # Por combinación de etiquetas: (conteos por bucket, suma, cantidad)
+        self._series: Dict[Etiquetas, Tuple[List[int], float, int]] = {}
+
+    def observar(self, valor: float, **etiquetas: str) -> None:
+        clave = tuple(sorted(etiquetas.items()))
+        with self._lock:
+            conteos, suma, cantidad = self._series.get(
+                clave, ([0] * len(self.buckets), 0.0, 0))
+            posicion = bisect.bisect_left(self.buckets, valor)
+            if posicion < len(conteos):
+                conteos[posicion] += 1
+            self._series[clave] = (conteos, suma + valor, cantidad + 1)
+
+    def exponer(self) -> List[str]:
+        lineas = super().exponer()
+        with self._lock:
+            series = {clave: (list(c), s, n) for clave, (c, s, n) in self._series.items()}
+        for etiquetas, (conteos, suma, cantidad) in sorted(series.items()):
+            acumulado = 0
+            for limite, conteo in zip(self.buckets, conteos):
+                acumulado += conteo
+                lineas.append(f"{self.nombre}_bucket"
+                              f"{_formatear_etiquetas(etiquetas, ('le', _formatear_numero(limite)))} {acumulado}")
+            lineas.append(f"{self.nombre}_bucket{_formatear_etiquetas(etiquetas, ('le', '+Inf'))} {cantidad}")
+            lineas.append(f"{self.nombre}_sum{_formatear_etiquetas(etiquetas)} {_formatear_numero(suma)}")
+            lineas.append(f"{self.nombre}_count{_formatear_etiquetas(etiquetas)} {cantidad}")
+        return lineas
+
+
+class RegistroMetricas:
+    """Conjunto de métricas que se exponen juntas en /metrics."""
+
+    def __init__(self):
+        self._metricas: List[_Metrica] = []
+
+    def registrar(self, metrica: _Metrica) -> _Metrica:
+        self._metricas.append(metrica)
+        return metrica
+
+    def exponer(self) -> str:
+        lineas = []
+        for metrica in self._metricas:
+            lineas.extend(metrica.exponer())
+        return "\n".join(lineas) + "\n"
+
+
+registro = RegistroMetricas()
+
+etapa_segundos = registro.registrar(Histograma(
+    "reporte_etapa_segundos", "Duración de cada etapa de la generación de reportes", BUCKETS_SEGUNDOS))
+solicitud_bytes = registro.registrar(Histograma(
+    "reporte_solicitud_bytes", "Tamaño del cuerpo de las solicitudes de reporte", BUCKETS_BYTES))
+solicitud_descomprimida_bytes = registro.registrar(Histograma(
+    "reporte_solicitud_descomprimida_bytes",
+    "Tamaño del cuerpo de las solicitudes de reporte una vez descomprimido", BUCKETS_BYTES))
+salida_bytes = registro.registrar(Histograma(
+    "reporte_salida_bytes", "Tamaño de los reportes generados", BUCKETS_BYTES))
+empleados_reporte = registro.registrar(Histograma(
+    "reporte_empleados", "Empleados por reporte", BUCKETS_EMPLEADOS))
+dias_reporte = registro.registrar(Histograma(
+    "reporte_dias", "Días del rango de cada reporte", BUCKETS_DIAS))
+reportes_en_curso = registro.registrar(Indicador(
+    "reportes_en_curso", "Reportes que se están generando en este momento"))
+reportes_total = registro.registrar(Contador(
+    "reportes_total", "Solicitudes de reporte atendidas por resultado"))
+
+
+def registrar_etapas(cronometro: Cronometro, **etiquetas: str) -> None:
+    """Agrega las duraciones del cronómetro al histograma de etapas."""
+    for etapa, segundos in cronometro.duraciones.items():
+        etapa_segundos.observar(segundos, etapa=etapa, **etiquetas)
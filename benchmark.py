@@ -0,0 +1,270 @@
+import argparse
+import asyncio
+import io
+import json
+import os
+import platform
+import random
+import resource
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta, timezone
+
+sys.path.append(os.path.join(os.path.dirname(__file__), 'app'))
+
+import logging
+logging.disable(logging.INFO)
+
+from services.excel_service import (
+    _guardar_normal, _libro_normal, asistencia_empleados, fila_empleado, layout_rango,
+    renderizar_excel, resolver_compresion
+)
+from services.external_api import decodificar_reporte, process_empleados_data
+
+# Benchmark del pipeline del reporte: genera una solicitud sintética, mide cada
+# etapa por separado y guarda los resultados en JSON. Con --base compara contra
+# una corrida anterior y falla si alguna etapa se volvió más lenta que la
+# tolerancia indicada.
+#
+#   python benchmark.py --empleados 2000 --salida base.json
+#   python benchmark.py --empleados 2000 --base base.json --tolerancia 0.2
+
+NOMBRES = ["Percy", "María", "José", "Ana", "Luis", "Rosa", "Carlos", "Lucía", "Jorge", "Elena"]
+APELLIDOS = ["Levano", "Rodríguez", "Quispe", "Flores", "Torres", "Mendoza", "Huamán", "Castillo"]
+CARGOS = ["Analista", "Jefe de Arquitectura", "Asistente", "Practicante", "Ingeniero de Campo", None]
+AREAS = ["Arquitectura", "Ventas", "Operaciones", "Finanzas", "Recursos Humanos"]
+PATRONES_TELETRABAJO = [["lun", "vier"], ["mar", "jue"], ["mie"], ["lun", "mie", "vier"]]
+DIAS_SEMANA = ["lun", "mar", "mie", "jue", "vier", "sab", "dom"]
+JORNADAS = {"lun-vier": 5, "lun-sab": 6}
+
+# Etapas medidas, en orden
+ETAPAS = ["validacion", "procesamiento", "asistencia", "filas", "estilos", "guardado", "total"]
+
+
+def generar_payload(empleados, fecha_inicio, fecha_fin, densidad=0.9, teletrabajo=0.3, tasa_nm=0.05, semilla=1):
+    """
+    Genera un cuerpo de ReporteRequest con datos sintéticos pero realistas.
+
+    Args:
+        empleados: Cantidad de empleados
+        fecha_inicio: Fecha inicial (YYYY-MM-DD)
+        fecha_fin: Fecha final (YYYY-MM-DD)
+        densidad: Probabilidad de que un empleado marque en un día laborable
+        teletrabajo: Fracción de empleados con días de teletrabajo
+        tasa_nm: Probabilidad de que falte la hora de ingreso o de salida (NM)
+        semilla: Semilla del generador, para repetir la misma solicitud
+
+    Returns:
+        Diccionario listo para serializar como JSON
+    """
+    azar = random.Random(semilla)
+    inicio = date.fromisoformat(fecha_inicio)
+    fin = date.fromisoformat(fecha_fin)
+
+    def hora(base_minutos, diferencia):
+        minutos = base_minutos + diferencia
+        return f"{minutos // 60:02d}:{minutos % 60:02d}"
+
+    lista = []
+    for n in range(empleados):
+        dias_labores = "lun-sab" if azar.random() < 0.15 else "lun-vier"
+        dias_remoto = azar.choice(PATRONES_TELETRABAJO) if azar.random() < teletrabajo else []
+        laborables = set(DIAS_SEMANA[:JORNADAS[dias_labores]])
+
+        marcaciones = []
+        # También hay marcaciones fuera del rango: cuentan en los totales
+        dia = inicio - timedelta(days=3)
+        while dia <= fin + timedelta(days=2):
+            nombre_dia = DIAS_SEMANA[dia.weekday()]
+            remoto = nombre_dia in dias_remoto
+            if nombre_dia in laborables and azar.random() < (densidad * (0.3 if remoto else 1)):
+                # Mayoría puntual, algunas tolerancias y tardanzas
+                diferencia_ingreso = int(azar.choice([
+                    azar.randint(-30, 0), azar.randint(-30, 0), azar.randint(1, 5), azar.randint(6, 90)]))
+                diferencia_salida = int(azar.choice([0, azar.randint(1, 60), -azar.randint(1, 120)]))
+                marcaciones.append({
+                    "fecha": f"{dia.isoformat()}T00:00:00.000Z",
+                    "hora_ingreso": None if azar.random() < tasa_nm else hora(510, diferencia_ingreso),
+                    "hora_salida": None if azar.random() < tasa_nm else hora(1110, -diferencia_salida),
+                    "diferencia_ingreso": diferencia_ingreso,
+                    "diferencia_salida": diferencia_salida,
+                    "marco_ingreso": True,
+                    "marco_salida": True,
+                    "ingreso_tarde": diferencia_ingreso > 5,
+                    "salida_temprano": diferencia_salida < 0
+                })
+            dia += timedelta(days=1)
+
+        lista.append({
+            "emp_code": str(40000000 + n),
+            "first_name": azar.choice(NOMBRES),
+            "last_name": f"{azar.choice(APELLIDOS)} {azar.choice(APELLIDOS)}",
+            "hire_date": f"{azar.randint(2005, 2024)}-{azar.randint(1, 12):02d}-01T00:00:00.000Z",
+            "fecha_cese": f"{fecha_fin}T00:00:00.000Z" if azar.random() < 0.03 else None,
+            "is_unactive": azar.random() < 0.02,
+            "marcaciones": marcaciones,
+            "position_name": azar.choice(CARGOS),
+            "dept_name": azar.choice(AREAS),
+            "gerencia": azar.choice(["Gerencia General", "Gerencia Comercial", None]),
+            "hora_ingreso": "08:30",
+            "hora_salida": "18:30",
+            "dias_labores": dias_labores,
+            "dias_descanso": "dom" if dias_labores == "lun-sab" else "sab-dom",
+            "dias_remoto": dias_remoto,
+            "cantidad_tardanzas": sum(1 for m in marcaciones if m["ingreso_tarde"]),
+            "cantidad_tolerancias": 0,
+            "cantidad_faltas": 0
+        })
+
+    return {"empleados_data": lista, "fecha_inicio": fecha_inicio, "fecha_fin": fecha_fin}
+
+
+def _etapas(cuerpo, args):
+    """Ejecuta una vez el pipeline completo; devuelve {etapa: (función, argumentos)} en orden."""
+    estado = {}
+
+    def validacion():
+        estado["request"] = decodificar_reporte(cuerpo)
+
+    def procesamiento():
+        request = estado["request"]
+        estado["empleados"] = asyncio.run(process_empleados_data(
+            request.empleados_data, request.fecha_inicio, request.fecha_fin))
+
+    def asistencia():
+        estado["layout"] = layout_rango(args.fecha_inicio, args.fecha_fin)
+        estado["asistencia"] = list(asistencia_empleados(estado["empleados"], estado["layout"]))
+
+    def filas():
+        layout = estado["layout"]
+        estado["filas"] = [fila_empleado(idx, matriz, i, layout) or list(layout.fila_base)
+                           for idx, matriz, i in estado["asistencia"]]
+
+    def estilos():
+        estado["libro"] = _libro_normal(estado["filas"], estado["layout"])
+
+    def guardado():
+        _guardar_normal(estado["libro"], io.BytesIO(), resolver_compresion(args.compresion))
+
+    def total():
+        estado["tamano"] = len(renderizar_excel(
+            estado["empleados"], args.fecha_inicio, args.fecha_fin, args.modo,
+            None, args.backend, args.compresion))
+
+    return estado, [validacion, procesamiento, asistencia, filas, estilos, guardado, total]
+
+
+def medir(cuerpo, args):
+    """Mide el tiempo de cada etapa (varias repeticiones) y su pico de memoria."""
+    tiempos = {etapa: [] for etapa in ETAPAS}
+    for _ in range(args.repeticiones):
+        estado, funciones = _etapas(cuerpo, args)
+        for etapa, funcion in zip(ETAPAS, funciones):
+            inicio = time.perf_counter()
+            funcion()
+            tiempos[etapa].append(time.perf_counter() - inicio)
+
+    # Una pasada aparte para la memoria: tracemalloc hace más lento el código
+    memoria = {}
+    tracemalloc.start()
+    _, funciones = _etapas(cuerpo, args)
+    for etapa, funcion in zip(ETAPAS, funciones):
+        tracemalloc.reset_peak()
+        base, _ = tracemalloc.get_traced_memory()
+        funcion()
+        _, pico = tracemalloc.get_traced_memory()
+        memoria[etapa] = round((pico - base) / (1024 * 1024), 2)
+    tracemalloc.stop()
+
+    return {
+        etapa: {
+            "segundos": round(min(tiempos[etapa]), 4),
+            "mediana_segundos": round(statistics.median(tiempos[etapa]), 4),
+            "pico_memoria_mb": memoria[etapa]
+        }
+        for etapa in ETAPAS
+    }, estado["tamano"]
+
+
+def comparar(resultados, base, tolerancia, margen_minimo):
+    """Devuelve las etapas más lentas que la base por encima de la tolerancia."""
+    regresiones = []
+    for etapa, medicion in resultados["etapas"].items():
+        anterior = base.get("etapas", {}).get(etapa)
+        if anterior is None:
+            continue
+        limite = anterior["segundos"] * (1 + tolerancia) + margen_minimo
+        if medicion["segundos"] > limite:
+            regresiones.append((etapa, anterior["segundos"], medicion["segundos"], limite))
+    return regresiones
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del pipeline del reporte de marcaciones")
+    parser.add_argument("--empleados", type=int, default=1000)
+    parser.add_argument("--fecha-inicio", default="2025-02-01")
+    parser.add_argument("--fecha-fin", default="2025-02-28")
+    parser.add_argument("--densidad", type=float, default=0.9, help="Probabilidad de marcar en un día laborable")
+    parser.add_argument("--teletrabajo", type=float, default=0.3, help="Fracción de empleados con teletrabajo")
+    parser.add_argument("--nm", type=float, default=0.05, help="Probabilidad de hora de ingreso o salida sin marcar")
+    parser.add_argument("--semilla", type=int, default=1)
+    parser.add_argument("--repeticiones", type=int, default=3)
+    parser.add_argument("--modo", default=None, help="Modo de escritura de la etapa total")
+    parser.add_argument("--backend", default=None, help="Backend de escritura de la etapa total")
+    parser.add_argument("--compresion", default=None, help="Perfil de compresión del guardado")
+    parser.add_argument("--salida", default="benchmark_resultados.json")
+    parser.add_argument("--base", default=None, help="Resultados anteriores contra los que comparar")
+    parser.add_argument("--tolerancia", type=float, default=0.25, help="Aumento relativo tolerado por etapa")
+    parser.add_argument("--margen-minimo", type=float, default=0.02,
+                        help="Segundos tolerados además de la tolerancia (evita falsos positivos en etapas cortas)")
+    args = parser.parse_args()
+
+    print(f"Generando solicitud sintética de {args.empleados} empleados "
+          f"({args.fecha_inicio} a {args.fecha_fin})...")
+    payload = generar_payload(args.empleados, args.fecha_inicio, args.fecha_fin,
+                              args.densidad, args.teletrabajo, args.nm, args.semilla)
+    cuerpo = json.dumps(payload).encode()
+    marcaciones = sum(len(e["marcaciones"]) for e in payload["empleados_data"])
+    print(f"Solicitud de {len(cuerpo) / 1024 / 1024:.2f} MB con {marcaciones} marcaciones")
+
+    etapas, tamano = medir(cuerpo, args)
+    resultados = {
+        "fecha": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "parametros": {clave: valor for clave, valor in vars(args).items()
+                       if clave not in ("salida", "base", "tolerancia", "margen_minimo")},
+        "marcaciones": marcaciones,
+        "tamano_solicitud_bytes": len(cuerpo),
+        "tamano_excel_bytes": tamano,
+        "pico_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "etapas": etapas
+    }
+
+    for etapa, medicion in etapas.items():
+        print(f"  {etapa:<14} {medicion['segundos']:>8.3f} s  "
+              f"(mediana {medicion['mediana_segundos']:.3f} s, pico {medicion['pico_memoria_mb']:.1f} MB)")
+
+    with open(args.salida, "w", encoding="utf-8") as f:
+        json.dump(resultados, f, indent=2, ensure_ascii=False)
+    print(f"✅ Resultados guardados en {args.salida}")
+
+    if args.base:
+        with open(args.base, "r", encoding="utf-8") as f:
+            base = json.load(f)
+        if base.get("parametros") != resultados["parametros"]:
+            print("⚠️ La corrida base usó otros parámetros; la comparación puede no ser válida")
+
+        regresiones = comparar(resultados, base, args.tolerancia, args.margen_minimo)
+        if regresiones:
+            for etapa, anterior, actual, limite in regresiones:
+                print(f"❌ {etapa}: {actual:.3f} s (base {anterior:.3f} s, límite {limite:.3f} s)")
+            return 1
+        print(f"✅ Ninguna etapa superó la tolerancia del {args.tolerancia:.0%}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,147 @@
+import asyncio
+import io
+import sys
+import os
+
+import openpyxl
+
+sys.path.append(os.path.join(os.path.dirname(__file__), 'app'))
+
+from models.schemas import ReporteRequest
+from services.excel_service import BACKEND_NATIVO, BACKEND_OPENPYXL, generate_excel_report
+
+
+def empleado_ejemplo(n):
+    """Empleado con tardanzas, tolerancias, salidas tempranas, NM y teletrabajo."""
+    diferencias = [(-10, 0), (3, 12), (6, -30), (40, None), (0, -1)]
+    marcaciones = []
+    for dia in range(1, 29):
+        if (dia + n) % 7 in (0, 1):
+            continue
+        ingreso, salida = diferencias[(dia + n) % len(diferencias)]
+        marcaciones.append({
+            "fecha": f"2025-02-{dia:02d}T00:00:00.000Z",
+            "hora_ingreso": None if dia % 9 == 0 else "08:35",
+            "hora_salida": None if dia % 11 == 0 else "18:20",
+            "diferencia_ingreso": ingreso,
+            "diferencia_salida": salida,
+            "marco_ingreso": True,
+            "marco_salida": True
+        })
+    return {
+        "emp_code": str(41142212 + n),
+        "first_name": f"Nombre {n}",
+        "last_name": "Apellido  Con Espacios ",
+        "hire_date": "2011-10-01T00:00:00.000Z",
+        "fecha_cese": "2025-02-15T00:00:00.000Z" if n % 10 == 3 else None,
+        "is_unactive": n % 10 == 5,
+        "marcaciones": marcaciones,
+        "position_name": "Analista & <Soporte>",
+        "dept_name": "Arquitectura",
+        "hora_ingreso": "08:30",
+        "hora_salida": "18:30",
+        "dias_labores": "lun-vier",
+        "dias_descanso": "sab-dom",
+        "dias_remoto": ["lun", "vier"] if n % 2 else [],
+        "cantidad_faltas": n % 3
+    }
+
+
+datos_ejemplo = [empleado_ejemplo(n) for n in range(40)]
+
+# Rangos a comparar: el mes por defecto, un rango corto y uno de varias hojas
+casos = [
+    ("rango por defecto", None, None),
+    ("rango corto", "2025-02-08", "2025-02-14"),
+    ("varios meses", "2025-01-20", "2025-03-05"),
+]
+
+
+def generar(backend, fecha_inicio, fecha_fin):
+    request = ReporteRequest(
+        empleados_data=datos_ejemplo,
+        fecha_inicio=fecha_inicio,
+        fecha_fin=fecha_fin
+    )
+    return asyncio.run(generate_excel_report(
+        request.empleados_data, fecha_inicio, fecha_fin, backend=backend))
+
+
+def estilo(celda):
+    """Atributos de formato visibles de una celda."""
+    borde = celda.border
+    return (
+        celda.font.b, celda.font.sz, celda.font.color.rgb if celda.font.color else None,
+        celda.fill.fill_type, celda.fill.fgColor.rgb,
+        celda.alignment.horizontal, celda.alignment.vertical,
+        borde.left.style, borde.right.style, borde.top.style, borde.bottom.style
+    )
+
+
+def comparar(excel_openpyxl, excel_nativo):
+    """Devuelve la lista de diferencias entre los dos archivos."""
+    diferencias = []
+    wb_a = openpyxl.load_workbook(io.BytesIO(excel_openpyxl))
+    wb_b = openpyxl.load_workbook(io.BytesIO(excel_nativo))
+
+    if wb_a.sheetnames != wb_b.sheetnames:
+        return [f"hojas: {wb_a.sheetnames} != {wb_b.sheetnames}"]
+
+    for ws_a, ws_b in zip(wb_a.worksheets, wb_b.worksheets):
+        if ws_a.dimensions != ws_b.dimensions:
+            diferencias.append(f"{ws_a.title}: dimensiones {ws_a.dimensions} != {ws_b.dimensions}")
+        if sorted(map(str, ws_a.merged_cells.ranges)) != sorted(map(str, ws_b.merged_cells.ranges)):
+            diferencias.append(f"{ws_a.title}: rangos combinados distintos")
+
+        anchos_a = {k: d.width for k, d in ws_a.column_dimensions.items()}
+        anchos_b = {k: d.width for k, d in ws_b.column_dimensions.items()}
+        if anchos_a != anchos_b:
+            diferencias.append(f"{ws_a.title}: anchos de columna distintos")
+
+        for fila_a, fila_b in zip(ws_a.iter_rows(), ws_b.iter_rows()):
+            for celda_a, celda_b in zip(fila_a, fila_b):
+                if celda_a.value != celda_b.value:
+                    diferencias.append(
+                        f"{ws_a.title}!{celda_a.coordinate}: {celda_a.value!r} != {celda_b.value!r}")
+                elif estilo(celda_a) != estilo(celda_b):
+                    diferencias.append(
+                        f"{ws_a.title}!{celda_a.coordinate}: estilo {estilo(celda_a)} != {estilo(celda_b)}")
+    return diferencias
+
+
+def comparar_backends():
+    """Compara los backends en cada caso; devuelve los problemas encontrados."""
+    problemas = []
+    for nombre, fecha_inicio, fecha_fin in casos:
+        print(f"Comparando backends ({nombre})...")
+        try:
+            excel_openpyxl = generar(BACKEND_OPENPYXL, fecha_inicio, fecha_fin)
+            excel_nativo = generar(BACKEND_NATIVO, fecha_inicio, fecha_fin)
+        except Exception as e:
+            print(f"❌ Error al generar el Excel: {str(e)}")
+            problemas.append(f"{nombre}: error al generar el Excel: {e}")
+            continue
+
+        diferencias = comparar(excel_openpyxl, excel_nativo)
+        if diferencias:
+            print(f"❌ {len(diferencias)} diferencias, por ejemplo:")
+            for diferencia in diferencias[:10]:
+                print(f"   {diferencia}")
+            problemas.extend(f"{nombre}: {diferencia}" for diferencia in diferencias)
+        else:
+            print(f"✅ Mismos valores y estilos "
+                  f"(openpyxl: {len(excel_openpyxl) / 1024:.2f} KB, nativo: {len(excel_nativo) / 1024:.2f} KB)")
+
+        if generar(BACKEND_NATIVO, fecha_inicio, fecha_fin) != excel_nativo:
+            print("❌ El backend nativo no generó los mismos bytes dos veces")
+            problemas.append(f"{nombre}: el backend nativo no generó los mismos bytes dos veces")
+    return problemas
+
+
+def test_backends():
+    problemas = comparar_backends()
+    assert not problemas, "\n".join(problemas[:20])
+
+
+if __name__ == "__main__":
+    sys.exit(1 if comparar_backends() else 0)
@@ -0,0 +1,93 @@
+import gzip
+import sys
+import os
+
+import pytest
+from fastapi import FastAPI, Request, Response
+from fastapi.testclient import TestClient
+
+sys.path.append(os.path.join(os.path.dirname(__file__), 'app'))
+
+from config import settings
+from services.descompresion import CuerpoSolicitud
+
+app = FastAPI()
+
+
+@app.post("/eco")
+async def eco(req: Request):
+    return Response(content=await CuerpoSolicitud(req).leer())
+
+
+cliente = TestClient(app)
+
+cuerpo = b'{"emp_code": "41142212", "diferencia_ingreso": 5, "marco_salida": true}\n' * 2000
+
+
+def enviar(datos, codificacion):
+    return cliente.post("/eco", content=datos, headers={"Content-Encoding": codificacion})
+
+
+def zstd_comprimir(datos):
+    zstandard = pytest.importorskip("zstandard")
+    return zstandard.ZstdCompressor().compress(datos)
+
+
+def test_sin_comprimir():
+    respuesta = cliente.post("/eco", content=cuerpo)
+    assert respuesta.status_code == 200 and respuesta.content == cuerpo
+
+
+def test_gzip():
+    respuesta = enviar(gzip.compress(cuerpo), "gzip")
+    assert respuesta.status_code == 200 and respuesta.content == cuerpo
+
+
+def test_gzip_varios_miembros():
+    mitad = len(cuerpo) // 2
+    respuesta = enviar(gzip.compress(cuerpo[:mitad]) + gzip.compress(cuerpo[mitad:]), "gzip")
+    assert respuesta.status_code == 200 and respuesta.content == cuerpo
+
+
+def test_gzip_truncado():
+    assert enviar(gzip.compress(cuerpo)[:-20], "gzip").status_code == 400
+    assert enviar(gzip.compress(cuerpo)[:100], "gzip").status_code == 400
+
+
+def test_zstd():
+    respuesta = enviar(zstd_comprimir(cuerpo), "zstd")
+    assert respuesta.status_code == 200 and respuesta.content == cuerpo
+
+
+def test_zstd_varios_frames():
+    mitad = len(cuerpo) // 2
+    respuesta = enviar(zstd_comprimir(cuerpo[:mitad]) + zstd_comprimir(cuerpo[mitad:]), "zstd")
+    assert respuesta.status_code == 200 and respuesta.content == cuerpo
+
+
+def test_zstd_truncado():
+    comprimido = zstd_comprimir(cuerpo)
+    assert enviar(comprimido[:-5], "zstd").status_code == 400
+    assert enviar(comprimido[:len(comprimido) // 2], "zstd").status_code == 400
+    assert enviar(comprimido + comprimido[:10], "zstd").status_code == 400
+
+
+def test_datos_corruptos():
+    assert enviar(b"no es gzip", "gzip").status_code == 400
+
+
+def test_codificacion_no_soportada():
+    assert enviar(gzip.compress(cuerpo), "br").status_code == 415
+
+
+@pytest.mark.parametrize("codificacion", ["gzip", "zstd"])
+def test_limite_descomprimido(monkeypatch, codificacion):
+    comprimir = gzip.compress if codificacion == "gzip" else zstd_comprimir
+    monkeypatch.setattr(settings, "SOLICITUD_MAX_BYTES_DESCOMPRIMIDOS", len(cuerpo))
+    assert enviar(comprimir(cuerpo), codificacion).status_code == 200
+    monkeypatch.setattr(settings, "SOLICITUD_MAX_BYTES_DESCOMPRIMIDOS", len(cuerpo) - 1)
+    assert enviar(comprimir(cuerpo), codificacion).status_code == 413
+
+    # Bomba: 100 MB de espacios en pocos KB
+    monkeypatch.setattr(settings, "SOLICITUD_MAX_BYTES_DESCOMPRIMIDOS", 1024 * 1024)
+    assert enviar(comprimir(b" " * (100 * 1024 * 1024)), codificacion).status_code == 413
@@ -0,0 +1,65 @@
+import asyncio
+import io
+import sys
+import os
+import zipfile
+
+import openpyxl
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), 'app'))
+
+from config import settings
+from models.schemas import ReporteRequest
+from services.excel_service import (
+    BACKEND_OPENPYXL, MODO_STREAMING, generate_excel_report, renderizar_excel
+)
+from test_backends import comparar, datos_ejemplo
+
+# Fragmentos pequeños: los 40 empleados del ejemplo se reparten en 6 por hoja
+EMPLEADOS_POR_FRAGMENTO = 7
+
+# Rangos a comparar: un mes (fragmentado por el modo streaming) y varios meses
+casos = [
+    ("un mes", "2025-02-01", "2025-02-28"),
+    ("varios meses", "2025-01-20", "2025-03-05"),
+]
+
+
+def empleados_ejemplo():
+    return ReporteRequest(empleados_data=datos_ejemplo).empleados_data
+
+
+def numeracion(excel):
+    """Valores de la columna N. de cada hoja, debajo de los encabezados."""
+    wb = openpyxl.load_workbook(io.BytesIO(excel))
+    columnas = []
+    for ws in wb.worksheets:
+        valores = [fila[0] for fila in ws.iter_rows(values_only=True)]
+        inicio = next(i for i, valor in enumerate(valores) if valor == 1)
+        columnas.append(valores[inicio:])
+    return columnas
+
+
+@pytest.mark.parametrize("nombre, fecha_inicio, fecha_fin", casos)
+def test_fragmentos_iguales_al_renderizado_en_un_proceso(monkeypatch, nombre, fecha_inicio, fecha_fin):
+    empleados = empleados_ejemplo()
+
+    # Referencia: todo el reporte en un solo fragmento, en este proceso
+    monkeypatch.setattr(settings, "EXCEL_EMPLEADOS_POR_FRAGMENTO", len(empleados))
+    referencia = renderizar_excel(
+        empleados, fecha_inicio, fecha_fin, MODO_STREAMING, backend=BACKEND_OPENPYXL)
+
+    # Fragmentos renderizados en paralelo en el pool y unidos (Z_SYNC_FLUSH y CRC combinado)
+    monkeypatch.setattr(settings, "EXCEL_EMPLEADOS_POR_FRAGMENTO", EMPLEADOS_POR_FRAGMENTO)
+    fragmentado = asyncio.run(generate_excel_report(
+        empleados, fecha_inicio, fecha_fin, MODO_STREAMING, backend=BACKEND_OPENPYXL))
+
+    with zipfile.ZipFile(io.BytesIO(fragmentado)) as zf:
+        assert zf.testzip() is None
+
+    diferencias = comparar(referencia, fragmentado)
+    assert not diferencias, f"{nombre}: " + "\n".join(diferencias[:20])
+
+    for columna in numeracion(fragmentado):
+        assert columna == list(range(1, len(empleados) + 1))
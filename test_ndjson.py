@@ -0,0 +1,126 @@
+import asyncio
+import io
+import json
+import sys
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from fastapi import HTTPException
+
+sys.path.append(os.path.join(os.path.dirname(__file__), 'app'))
+
+from config import settings
+from models.schemas import EmpleadoMarcaciones
+from services import excel_service
+from services.excel_service import MODO_STREAMING, renderizar_excel
+from services.ndjson_ingesta import generar_excel_desde_ndjson, iterar_lineas_ndjson
+
+
+def empleado_ejemplo(n):
+    return {
+        "emp_code": str(50000000 + n),
+        "first_name": f"Nombre {n}",
+        "last_name": "Apellido",
+        "hire_date": "2020-01-01T00:00:00.000Z",
+        "marcaciones": [{
+            "fecha": f"2025-02-{dia:02d}T00:00:00.000Z",
+            "hora_ingreso": "08:35",
+            "hora_salida": "18:20",
+            "diferencia_ingreso": 5,
+            "diferencia_salida": -10,
+            "marco_ingreso": True,
+            "marco_salida": True
+        } for dia in range(1, 8)],
+        "hora_ingreso": "08:30",
+        "hora_salida": "18:30"
+    }
+
+
+def cuerpo_ndjson(cantidad, fecha_inicio="2025-02-01", fecha_fin="2025-02-07"):
+    lineas = [json.dumps({"fecha_inicio": fecha_inicio, "fecha_fin": fecha_fin})]
+    lineas += [json.dumps(empleado_ejemplo(n)) for n in range(cantidad)]
+    return "\n".join(lineas).encode()
+
+
+async def en_bloques(datos, tamano):
+    for inicio in range(0, len(datos), tamano):
+        # Ceder el loop entre bloques, como al leer de la red
+        await asyncio.sleep(0)
+        yield datos[inicio:inicio + tamano]
+
+
+async def recolectar_lineas(datos, tamano, max_bytes_linea=1024):
+    return [linea async for linea in iterar_lineas_ndjson(en_bloques(datos, tamano), max_bytes_linea)]
+
+
+def test_lineas_independientes_del_tamano_de_bloque():
+    datos = b'{"a": 1}\n\n  {"b": 2}  \r\n{"c": 3}'
+    esperado = [(1, b'{"a": 1}'), (3, b'{"b": 2}'), (4, b'{"c": 3}')]
+    for tamano in (1, 2, 3, 7, len(datos)):
+        assert asyncio.run(recolectar_lineas(datos, tamano)) == esperado
+
+
+def test_linea_demasiado_larga():
+    datos = b'{"a": 1}\n' + b"x" * 2000
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(recolectar_lineas(datos, 100))
+    assert error.value.status_code == 413
+
+
+def test_cargas_concurrentes_con_executor_pequeno(monkeypatch):
+    """Más cargas simultáneas que hilos en el executor no deben bloquearse."""
+    monkeypatch.setattr(settings, "NDJSON_EMPLEADOS_EN_COLA", 2)
+    cuerpo = cuerpo_ndjson(60)
+
+    async def cargas():
+        asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=2))
+        return await asyncio.wait_for(asyncio.gather(*(
+            generar_excel_desde_ndjson(en_bloques(cuerpo, 512)) for _ in range(3)
+        )), timeout=60)
+
+    resultados = asyncio.run(cargas())
+    assert [resultado.empleados_validos for resultado in resultados] == [60, 60, 60]
+    assert all(resultado.excel_bytes.startswith(b"PK") for resultado in resultados)
+
+
+def test_varios_meses_por_fragmentos(monkeypatch):
+    """Con varias hojas, cada fragmento se renderiza antes de recibir los siguientes empleados."""
+    monkeypatch.setattr(settings, "EXCEL_EMPLEADOS_POR_FRAGMENTO", 7)
+    empleados = [EmpleadoMarcaciones.model_validate(empleado_ejemplo(n)) for n in range(40)]
+    entregados = 0
+    renderizados = []
+    renderizar_filas = excel_service._renderizar_filas
+
+    def flujo():
+        nonlocal entregados
+        for empleado in empleados:
+            entregados += 1
+            yield empleado
+
+    def _renderizar_filas(lote, hoja, inicio, *args, **kwargs):
+        renderizados.append((inicio, entregados))
+        return renderizar_filas(lote, hoja, inicio, *args, **kwargs)
+
+    monkeypatch.setattr(excel_service, "_renderizar_filas", _renderizar_filas)
+    salida = io.BytesIO()
+    excel_service.escribir_excel(
+        salida, flujo(), "2025-01-20", "2025-03-05", MODO_STREAMING, backend="openpyxl")
+
+    # 3 hojas por cada uno de los 6 fragmentos, con solo su fragmento recibido
+    assert len(renderizados) == 18
+    assert all(entregados <= inicio + 7 for inicio, entregados in renderizados)
+    monkeypatch.setattr(excel_service, "_renderizar_filas", renderizar_filas)
+    assert salida.getvalue() == renderizar_excel(
+        empleados, "2025-01-20", "2025-03-05", backend="openpyxl")
+
+
+def test_ndjson_varios_meses_igual_al_reporte(monkeypatch):
+    monkeypatch.setattr(settings, "EXCEL_BACKEND", "openpyxl")
+    monkeypatch.setattr(settings, "EXCEL_EMPLEADOS_POR_FRAGMENTO", 7)
+    cuerpo = cuerpo_ndjson(40, "2025-01-20", "2025-03-05")
+    resultado = asyncio.run(generar_excel_desde_ndjson(en_bloques(cuerpo, 300)))
+    empleados = [EmpleadoMarcaciones.model_validate(empleado_ejemplo(n)) for n in range(40)]
+    assert resultado.empleados_validos == 40
+    assert resultado.excel_bytes == renderizar_excel(
+        empleados, "2025-01-20", "2025-03-05", backend="openpyxl")
@@ -0,0 +1,100 @@
+import copy
+import sys
+import os
+
+import pytest
+from fastapi.testclient import TestClient
+
+sys.path.append(os.path.join(os.path.dirname(__file__), 'app'))
+
+from main import app
+from models.schemas import ReporteCambiosRequest, ReporteRequest
+from services.excel_service import BACKEND_NATIVO, renderizar_excel
+from services.reporte_incremental import aplicar_cambios, crear_reporte, emitir_reporte
+from test_backends import comparar, datos_ejemplo
+
+# Rangos a comparar: un mes y uno de varias hojas mensuales
+casos = [
+    ("un mes", "2025-02-01", "2025-02-28"),
+    ("varios meses", "2025-01-20", "2025-03-05"),
+]
+
+
+def marcacion(dia, diferencia_ingreso):
+    return {
+        "fecha": f"2025-02-{dia:02d}T00:00:00.000Z",
+        "hora_ingreso": "09:15",
+        "hora_salida": None,
+        "diferencia_ingreso": diferencia_ingreso,
+        "diferencia_salida": -7,
+        "marco_ingreso": True,
+        "marco_salida": False
+    }
+
+
+def cambios_y_datos_fusionados():
+    """
+    Cambios de prueba y, aplicados a mano sobre el cuerpo completo, los datos
+    con los que un reporte nuevo debe dar el mismo resultado.
+    """
+    datos = copy.deepcopy(datos_ejemplo)
+    cambios = []
+
+    # Marcación corregida (misma fecha) y campo cambiado
+    empleado = datos[3]
+    corregida = marcacion(int(empleado["marcaciones"][2]["fecha"][8:10]), 45)
+    empleado["marcaciones"][2] = corregida
+    empleado["cantidad_faltas"] = 7
+    cambios.append({"emp_code": empleado["emp_code"], "marcaciones": [corregida], "cantidad_faltas": 7})
+
+    # Marcación en un día que no tenía (fin de semana del empleado 0)
+    empleado = datos[0]
+    fechas = {m["fecha"][8:10] for m in empleado["marcaciones"]}
+    dia = next(d for d in range(1, 29) if f"{d:02d}" not in fechas)
+    nueva = marcacion(dia, 12)
+    empleado["marcaciones"].append(nueva)
+    cambios.append({"emp_code": empleado["emp_code"], "marcaciones": [nueva]})
+
+    # Solo un campo, sin marcaciones
+    datos[10]["first_name"] = "Renombrado"
+    cambios.append({"emp_code": datos[10]["emp_code"], "first_name": "Renombrado"})
+
+    # Empleado nuevo: va al final del reporte
+    alta = copy.deepcopy(datos[5])
+    alta["emp_code"] = "99999999"
+    alta["first_name"] = "Nuevo"
+    datos.append(alta)
+    cambios.append(alta)
+
+    return ReporteCambiosRequest.model_validate({"empleados_data": cambios}).empleados_data, datos
+
+
+@pytest.mark.parametrize("nombre, fecha_inicio, fecha_fin", casos)
+def test_actualizacion_igual_al_reporte_completo(nombre, fecha_inicio, fecha_fin):
+    empleados = ReporteRequest(empleados_data=datos_ejemplo).empleados_data
+    reporte = crear_reporte(empleados, fecha_inicio, fecha_fin)
+    inicial = emitir_reporte(reporte)
+    assert inicial == renderizar_excel(
+        empleados, fecha_inicio, fecha_fin, backend=BACKEND_NATIVO)
+
+    cambios, datos = cambios_y_datos_fusionados()
+    assert aplicar_cambios(reporte, cambios) == len(cambios)
+    actualizado = emitir_reporte(reporte)
+
+    completo = renderizar_excel(
+        ReporteRequest(empleados_data=datos).empleados_data, fecha_inicio, fecha_fin,
+        backend=BACKEND_NATIVO)
+    diferencias = comparar(completo, actualizado)
+    assert not diferencias, f"{nombre}: " + "\n".join(diferencias[:20])
+    assert actualizado != inicial
+
+
+def test_emp_code_duplicado():
+    duplicados = datos_ejemplo[:3] + [datos_ejemplo[1]]
+    with pytest.raises(ValueError):
+        crear_reporte(ReporteRequest(empleados_data=duplicados).empleados_data)
+
+    respuesta = TestClient(app).post(
+        "/api/marcaciones-excel/incrementales", json={"empleados_data": duplicados})
+    assert respuesta.status_code == 422
+    assert datos_ejemplo[1]["emp_code"] in respuesta.json()["detail"]
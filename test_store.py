@@ -0,0 +1,64 @@
+import sys
+import os
+
+import pytest
+from sqlalchemy import text
+
+sys.path.append(os.path.join(os.path.dirname(__file__), 'app'))
+
+from config import settings
+from models.schemas import EmpleadoMarcaciones
+from services.marcaciones_store import (
+    _consultas_reporte, cargar_empleados, cerrar_store, guardar_empleados, obtener_motor
+)
+
+
+def empleado_ejemplo(n, dept_name):
+    return EmpleadoMarcaciones.model_validate({
+        "emp_code": str(60000000 + n),
+        "first_name": f"Nombre {n}",
+        "dept_name": dept_name,
+        "gerencia": "Gerencia General",
+        "marcaciones": [{
+            "fecha": f"2025-{mes:02d}-{dia:02d}T00:00:00.000Z",
+            "hora_ingreso": "08:35",
+            "diferencia_ingreso": 5
+        } for mes in (1, 2, 3) for dia in (3, 15, 27)]
+    })
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "STORE_RUTA", str(tmp_path / "marcaciones.db"))
+    cerrar_store()
+    guardar_empleados([empleado_ejemplo(n, "Arquitectura" if n % 2 else "Sistemas") for n in range(6)])
+    yield
+    cerrar_store()
+
+
+def plan(consulta):
+    motor = obtener_motor()
+    sql = str(consulta.compile(motor, compile_kwargs={"literal_binds": True}))
+    with motor.connect() as conexion:
+        return [fila[-1] for fila in conexion.execute(text("EXPLAIN QUERY PLAN " + sql))]
+
+
+@pytest.mark.parametrize("filtros", [
+    {},
+    {"dept_name": "Arquitectura"},
+    {"gerencia": "Gerencia General"},
+    {"emp_codes": ["60000001", "60000002"]},
+])
+def test_marcaciones_del_rango_sin_recorrer_la_tabla(store, filtros):
+    _, consulta_marcaciones = _consultas_reporte("2025-02-01", "2025-02-28", **filtros)
+    pasos = plan(consulta_marcaciones)
+    assert any(paso.startswith("SEARCH marcaciones") for paso in pasos), pasos
+    assert not any(paso.startswith("SCAN marcaciones") for paso in pasos), pasos
+
+
+def test_cargar_empleados_del_rango(store):
+    resultado = cargar_empleados("2025-02-01", "2025-02-28", dept_name="Arquitectura")
+    assert [empleado.emp_code for empleado in resultado] == ["60000001", "60000003", "60000005"]
+    for empleado in resultado:
+        assert [marcacion.fecha_iso for marcacion in empleado.marcaciones] == [
+            "2025-02-03", "2025-02-15", "2025-02-27"]